@@ -0,0 +1,217 @@
+"""
+Account Scheduler Module
+Chọn account tiếp theo cho run_loop theo kết quả các lần chạy trước: account thất
+bại được chạy lại sau một khoảng backoff tăng dần thay vì bị chọn lại ngay vòng
+sau, account vượt quá số lần thử được đánh dấu 'failed' và không chiếm client nữa.
+
+Trạng thái lưu ngay trong account.csv (thêm cột khi cần):
+    state     '' (chưa chạy), 'retry' (chờ chạy lại), 'done', 'failed' (bỏ cuộc)
+              hoặc state của màn hình lỗi ('bad_password', 'banned', ...)
+    attempts  Số lần đã chạy xong (thành công hay thất bại)
+    next_try  Thời điểm sớm nhất được chạy lại (YYYY-MM-DD HH:MM:SS)
+    priority  Tùy chọn, số lớn chạy trước (mặc định 0)
+"""
+
+import csv
+import os
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+# Các state còn được chọn để chạy
+PENDING_STATES = ('', 'retry')
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class AccountScheduler:
+    """Đọc account.csv một lần, chọn account theo ưu tiên/backoff và ghi kết quả lại file."""
+
+    def __init__(self, account_file: str = "data/account.csv", max_attempts: int = 3,
+                 retry_backoff: float = 300.0, max_backoff: float = 6 * 3600.0):
+        """
+        Khởi tạo AccountScheduler.
+
+        Args:
+            account_file: File CSV danh sách account (id, state, user, pass, ...)
+            max_attempts: Số lần thất bại tối đa trước khi đánh dấu 'failed' (0 = không giới hạn)
+            retry_backoff: Thời gian chờ trước lần chạy lại đầu tiên (giây), nhân đôi sau mỗi lần thất bại
+            max_backoff: Thời gian chờ tối đa giữa hai lần chạy lại (giây)
+        """
+        self.account_file = account_file
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.fieldnames: List[str] = []
+        self.accounts: List[dict] = []
+        self._by_id: Dict[str, dict] = {}
+        self._mtime = None
+
+    # ---------------------------------------------------------------- file
+
+    def load(self, force: bool = False) -> bool:
+        """
+        Đọc account.csv (bỏ qua nếu file không đổi từ lần đọc trước).
+
+        Returns:
+            False nếu không đọc được file.
+        """
+        try:
+            mtime = os.path.getmtime(self.account_file)
+        except OSError:
+            print(f"✗ Không tìm thấy file: {self.account_file}")
+            return False
+        if not force and mtime == self._mtime:
+            return True
+        try:
+            with open(self.account_file, 'r', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                self.fieldnames = list(reader.fieldnames or [])
+                self.accounts = list(reader)
+        except Exception as e:
+            print(f"✗ Lỗi khi đọc {self.account_file}: {e}")
+            return False
+        self._by_id = {account.get('id', ''): account for account in self.accounts}
+        self._mtime = mtime
+        return True
+
+    def save(self):
+        """Ghi lại account.csv (ghi file tạm rồi thay thế: không hỏng file khi crash giữa chừng)."""
+        fieldnames = list(self.fieldnames)
+        for column in ('attempts', 'next_try'):
+            if column not in fieldnames and any(account.get(column) for account in self.accounts):
+                fieldnames.append(column)
+        self.fieldnames = fieldnames
+        tmp_path = self.account_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(self.accounts)
+        os.replace(tmp_path, self.account_file)
+        self._mtime = os.path.getmtime(self.account_file)
+
+    # ---------------------------------------------------------------- chọn account
+
+    def get(self, account_id) -> Optional[dict]:
+        """Account theo ID (None nếu không có)."""
+        return self._by_id.get(str(account_id))
+
+    def attempts(self, account: dict) -> int:
+        """Số lần account đã được chạy xong."""
+        return self._int(account, 'attempts')
+
+    @staticmethod
+    def _int(account: dict, column: str) -> int:
+        try:
+            return int(account.get(column) or 0)
+        except ValueError:
+            return 0
+
+    @staticmethod
+    def _next_try(account: dict) -> float:
+        value = (account.get('next_try') or '').strip()
+        if not value:
+            return 0.0
+        try:
+            return time.mktime(time.strptime(value, TIME_FORMAT))
+        except ValueError:
+            return 0.0
+
+    def is_pending(self, account: dict) -> bool:
+        """Account còn cần chạy (chưa xong, chưa bỏ cuộc)."""
+        return (account.get('state') or '').strip() in PENDING_STATES
+
+    def is_eligible(self, account: dict, now: Optional[float] = None) -> bool:
+        """Account còn cần chạy và đã hết thời gian backoff."""
+        now = time.time() if now is None else now
+        return self.is_pending(account) and self._next_try(account) <= now
+
+    def next_account(self, skip: Optional[Callable[[str], bool]] = None) -> Optional[dict]:
+        """
+        Account nên chạy tiếp theo: priority cao trước, rồi account ít lần thử hơn (account mới
+        trước account đang chờ chạy lại), rồi thời điểm được chạy lại sớm hơn, rồi thứ tự trong file.
+
+        Args:
+            skip: Hàm skip(account_id) -> True để bỏ qua account (vd đã xong theo journal)
+
+        Returns:
+            Account, hoặc None nếu không còn account nào đến lượt.
+        """
+        if not self.load():
+            return None
+        now = time.time()
+        best = None
+        best_key = None
+        for index, account in enumerate(self.accounts):
+            if not self.is_eligible(account, now) or (skip and skip(account.get('id', ''))):
+                continue
+            key = (-self._int(account, 'priority'), self._int(account, 'attempts'), self._next_try(account), index)
+            if best_key is None or key < best_key:
+                best, best_key = account, key
+        return best
+
+    def seconds_until_next(self, skip: Optional[Callable[[str], bool]] = None) -> Optional[float]:
+        """Thời gian đến khi account đang chờ backoff sớm nhất đến lượt (None nếu không còn account nào)."""
+        now = time.time()
+        waits = [self._next_try(account) - now for account in self.accounts
+                 if self.is_pending(account) and not (skip and skip(account.get('id', '')))]
+        return max(0.0, min(waits)) if waits else None
+
+    # ---------------------------------------------------------------- kết quả
+
+    def outcome_state(self, account_id, outcome: str) -> str:
+        """
+        State mới của account sau một lần chạy (chưa ghi file).
+
+        Args:
+            outcome: 'done', 'failed' (lỗi tạm thời, có thể chạy lại) hoặc state của màn hình lỗi
+
+        Returns:
+            outcome, trừ 'failed' còn lượt thử thì thành 'retry'.
+        """
+        if outcome != 'failed':
+            return outcome
+        account = self.get(account_id)
+        attempts = (self._int(account, 'attempts') if account else 0) + 1
+        if self.max_attempts and attempts >= self.max_attempts:
+            return 'failed'
+        return 'retry'
+
+    def record(self, account_id, state: str) -> bool:
+        """
+        Ghi state sau một lần chạy: tăng số lần thử, đặt thời điểm chạy lại nếu là 'retry'.
+
+        Returns:
+            False nếu không tìm thấy account.
+        """
+        account = self.get(account_id)
+        if account is None:
+            print(f"✗ Không tìm thấy account với ID: {account_id}")
+            return False
+        attempts = self._int(account, 'attempts') + 1
+        account['attempts'] = str(attempts)
+        account['state'] = state
+        account['next_try'] = ''
+        if state == 'retry':
+            delay = min(self.max_backoff, self.retry_backoff * 2 ** (attempts - 1))
+            delay *= random.uniform(0.9, 1.1)  # Các account lỗi cùng lúc không đến lượt cùng lúc
+            account['next_try'] = time.strftime(TIME_FORMAT, time.localtime(time.time() + delay))
+        self.save()
+        return True
+
+    def set_state(self, account_id, state: str) -> bool:
+        """Đặt state trực tiếp (không tính là một lần chạy)."""
+        account = self.get(account_id)
+        if account is None:
+            print(f"✗ Không tìm thấy account với ID: {account_id}")
+            return False
+        account['state'] = state
+        self.save()
+        return True
+
+    def summary(self) -> Dict[str, int]:
+        """Số account theo state ('' hiển thị là 'pending')."""
+        counts: Dict[str, int] = {}
+        for account in self.accounts:
+            state = (account.get('state') or '').strip() or 'pending'
+            counts[state] = counts.get(state, 0) + 1
+        return counts
@@ -0,0 +1,124 @@
+"""
+Buffer Pool Module
+Tái sử dụng các mảng numpy có kích thước cố định (frame BGR, ảnh grayscale,
+score map float32) giữa các lần poll, thay vì cấp phát mới 20-30 MB mỗi lần ở 1080p.
+Mỗi thread có pool riêng nên không cần lock trên đường nóng.
+
+Lưu ý: mảng lấy từ pool sẽ bị ghi đè ở lần dùng kế tiếp cùng key; cần giữ lâu
+hơn thì .copy().
+"""
+
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Hashable, Tuple
+
+import numpy as np
+
+from metrics import REGISTRY
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class BufferPool:
+    """Các buffer đặt tên theo key, giữ tối đa `max_buffers` cái dùng gần nhất (LRU)."""
+
+    def __init__(self, max_buffers: int = 32):
+        """
+        Args:
+            max_buffers: Số buffer tối đa giữ lại (nhiều kích thước template/vùng tìm kiếm khác nhau)
+        """
+        self.max_buffers = max_buffers
+        self._buffers: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self.stats = {'allocations': 0, 'reuses': 0, 'evictions': 0, 'bytes_allocated': 0}
+
+    def get(self, key: Hashable, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """
+        Lấy buffer cho `key` với đúng shape/dtype (cấp phát nếu chưa có hoặc khác kích thước).
+        Nội dung buffer không được xóa.
+        """
+        dtype = np.dtype(dtype)
+        buffer = self._buffers.get(key)
+        if buffer is not None and buffer.shape == tuple(shape) and buffer.dtype == dtype:
+            self._buffers.move_to_end(key)
+            self.stats['reuses'] += 1
+            return buffer
+
+        buffer = np.empty(shape, dtype)
+        self._buffers[key] = buffer
+        self._buffers.move_to_end(key)
+        self.stats['allocations'] += 1
+        self.stats['bytes_allocated'] += buffer.nbytes
+        while len(self._buffers) > self.max_buffers:
+            self._buffers.popitem(last=False)
+            self.stats['evictions'] += 1
+        return buffer
+
+    @property
+    def resident_bytes(self) -> int:
+        """Tổng dung lượng các buffer đang giữ."""
+        return sum(b.nbytes for b in self._buffers.values())
+
+    def clear(self):
+        """Bỏ toàn bộ buffer (vd: khi đổi độ phân giải màn hình)."""
+        self._buffers.clear()
+
+
+_local = threading.local()
+_pools: "weakref.WeakSet[BufferPool]" = weakref.WeakSet()
+# Thống kê của pool thuộc thread đã kết thúc: giữ lại để các tổng cộng dồn không bị giảm
+_retired = {'allocations': 0, 'reuses': 0, 'evictions': 0, 'bytes_allocated': 0}
+_retired_lock = threading.Lock()
+
+
+def _retire(stats: Dict[str, int]):
+    with _retired_lock:
+        for name in _retired:
+            _retired[name] += stats.get(name, 0)
+
+
+def thread_pool() -> BufferPool:
+    """Pool của thread hiện tại (tạo khi lần đầu cần)."""
+    pool = getattr(_local, 'pool', None)
+    if pool is None:
+        pool = _local.pool = BufferPool()
+        _pools.add(pool)
+        weakref.finalize(pool, _retire, pool.stats)
+    return pool
+
+
+def page_faults() -> Dict[str, int]:
+    """Số page fault của process: {'minor', 'major'} trên POSIX, {'total'} trên Windows."""
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {'minor': usage.ru_minflt, 'major': usage.ru_majflt}
+    try:
+        import psutil
+        return {'total': psutil.Process(os.getpid()).memory_info().num_page_faults}
+    except Exception:
+        return {}
+
+
+def allocation_stats() -> Dict[str, int]:
+    """Thống kê cộng dồn của mọi pool (mọi thread) kèm page fault của process."""
+    pools = list(_pools)  # Giữ tham chiếu trước: pool không thể bị chuyển sang _retired giữa chừng
+    with _retired_lock:
+        totals = dict(_retired, resident_bytes=0)
+    for pool in pools:
+        for name, value in pool.stats.items():
+            totals[name] += value
+        totals['resident_bytes'] += pool.resident_bytes
+    totals.update({f'page_faults_{name}': value for name, value in page_faults().items()})
+    return totals
+
+
+REGISTRY.counter('wwm_buffer_allocations_total', 'So lan cap phat buffer moi (frame/score map)',
+                 func=lambda: allocation_stats()['allocations'])
+REGISTRY.counter('wwm_buffer_allocated_bytes_total', 'Tong so byte buffer da cap phat',
+                 func=lambda: allocation_stats()['bytes_allocated'])
+REGISTRY.counter('wwm_buffer_reuses_total', 'So lan dung lai buffer co san',
+                 func=lambda: allocation_stats()['reuses'])
@@ -0,0 +1,225 @@
+"""
+Client Lifecycle Module
+Quản lý vòng đời game client theo kiểu pipeline: khởi chạy trước (pre-launch)
+client cho account tiếp theo trong khi account hiện tại đang chạy nốt các step
+cuối, để thời gian cold-start của client bị che bởi công việc có ích.
+"""
+
+import os
+import shlex
+import subprocess
+import threading
+import time
+from typing import Callable, List, Optional, Set, Union
+
+from process_utils import ProcessWatcher, terminate_processes, normalize_image_name
+
+
+class _PendingClient:
+    """Một client đang được khởi chạy trước ở thread nền."""
+
+    def __init__(self):
+        self.pid: Optional[int] = None
+        self.ready = threading.Event()
+        self.error: Optional[str] = None
+        self.started_at = time.monotonic()
+        self.ready_at: Optional[float] = None
+        self.known: Set[int] = set()  # Client đã chạy trước khi bắt đầu pre-launch
+
+
+class ClientLifecycleManager:
+    """Khởi chạy, pre-launch và dừng game client theo PID (không kill nhầm client khác)."""
+
+    def __init__(self, launch_command: Union[str, List[str]], process_name: str = "wwm.exe",
+                 max_clients: int = 2, spawn_timeout: float = 120.0, warmup_time: float = 0.0,
+                 ready_check: Optional[Callable[[int], bool]] = None,
+                 watcher: Optional[ProcessWatcher] = None):
+        """
+        Khởi tạo ClientLifecycleManager.
+
+        Args:
+            launch_command: Lệnh khởi chạy client (đường dẫn exe/launcher hoặc list tham số)
+            process_name: Tên image của client cần theo dõi
+            max_clients: Số client tối đa được chạy cùng lúc (gồm cả client đang pre-launch)
+            spawn_timeout: Thời gian chờ tối đa để process client xuất hiện (giây)
+            warmup_time: Thời gian chờ thêm sau khi process xuất hiện để client tải xong (giây)
+            ready_check: Hàm tùy chọn ready_check(pid) -> bool, gọi lặp lại sau warmup
+                         cho đến khi True hoặc hết spawn_timeout
+            watcher: ProcessWatcher dùng chung (None = tạo mới)
+        """
+        if isinstance(launch_command, str) and os.name != 'nt':
+            launch_command = shlex.split(launch_command)
+        self.launch_command = launch_command
+        self.process_name = process_name
+        self.max_clients = max(1, max_clients)
+        self.spawn_timeout = spawn_timeout
+        self.warmup_time = warmup_time
+        self.ready_check = ready_check
+        self.watcher = watcher or ProcessWatcher(process_name)
+        self.current_pid: Optional[int] = None
+        self._pending: Optional[_PendingClient] = None
+        self._lock = threading.Lock()
+        self.stats = {'launches': 0, 'prelaunches': 0, 'prelaunch_ready': 0,
+                      'launch_wait': 0.0, 'failures': 0}
+
+    # ---------------------------------------------------------------- launch
+
+    def _spawn(self) -> Optional[int]:
+        """Chạy lệnh khởi chạy và chờ đến khi process client (đúng tên image) xuất hiện."""
+        known = self.watcher.pids
+        popen = subprocess.Popen(self.launch_command, cwd=self._launch_cwd(),
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.stats['launches'] += 1
+
+        # Lệnh có thể là chính client, hoặc launcher sinh ra client
+        try:
+            import psutil
+            if normalize_image_name(psutil.Process(popen.pid).name()) == normalize_image_name(self.process_name):
+                self.watcher.track(popen.pid)
+                return popen.pid
+        except Exception:
+            pass
+        return self.watcher.wait_for_spawn(timeout=self.spawn_timeout, exclude=known)
+
+    def _launch_cwd(self) -> Optional[str]:
+        """Thư mục làm việc = thư mục chứa file exe (game thường đọc asset theo đường dẫn tương đối)."""
+        exe = self.launch_command[0] if isinstance(self.launch_command, list) else self.launch_command
+        directory = os.path.dirname(exe.strip('"'))
+        return directory if directory and os.path.isdir(directory) else None
+
+    def _warm_up(self, pid: int, deadline: float) -> bool:
+        """Chờ client tải xong: warmup_time cố định, rồi ready_check nếu có."""
+        if self.warmup_time > 0:
+            time.sleep(self.warmup_time)
+        if self.ready_check is None:
+            return True
+        while time.monotonic() < deadline:
+            if self.ready_check(pid):
+                return True
+            time.sleep(0.5)
+        return False
+
+    def _launch_into(self, pending: _PendingClient):
+        """Khởi chạy + warm-up một client (chạy ở thread nền khi pre-launch)."""
+        try:
+            pid = self._spawn()
+            if pid is None:
+                pending.error = f"{self.process_name} không xuất hiện sau {self.spawn_timeout}s"
+            else:
+                pending.pid = pid
+                if not self._warm_up(pid, pending.started_at + self.spawn_timeout):
+                    pending.error = f"{self.process_name} (PID {pid}) chưa sẵn sàng sau {self.spawn_timeout}s"
+        except Exception as e:
+            pending.error = str(e)
+        finally:
+            pending.ready_at = time.monotonic()
+            pending.ready.set()
+
+    def running_clients(self) -> int:
+        """Số client đang chạy theo cache của watcher (cộng client đang pre-launch chưa xuất hiện)."""
+        count = len(self.watcher.pids)
+        if self._pending is not None and self._pending.pid is None:
+            count += 1
+        return count
+
+    def prelaunch(self) -> bool:
+        """
+        Bắt đầu khởi chạy client cho account tiếp theo ở thread nền (không chặn runner).
+
+        Returns:
+            True nếu đã bắt đầu pre-launch, False nếu đã có client chờ sẵn hoặc vượt giới hạn.
+        """
+        with self._lock:
+            if self._pending is not None:
+                return False
+            self.watcher.refresh()
+            if self.running_clients() >= self.max_clients:
+                print(f"⚠ Không pre-launch: đã đạt giới hạn {self.max_clients} client")
+                return False
+            pending = _PendingClient()
+            pending.known = self.watcher.pids
+            self._pending = pending
+        self.stats['prelaunches'] += 1
+        threading.Thread(target=self._launch_into, args=(pending,),
+                         name="ClientPrelaunch", daemon=True).start()
+        print("→ Đang pre-launch client cho account tiếp theo...")
+        return True
+
+    def take_next(self) -> Optional[int]:
+        """
+        Lấy client cho account tiếp theo: dùng client đã pre-launch nếu có,
+        nếu không thì khởi chạy ngay (chặn đến khi sẵn sàng).
+
+        Returns:
+            PID của client, hoặc None nếu khởi chạy thất bại.
+        """
+        start = time.monotonic()
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            pending = _PendingClient()
+            self._launch_into(pending)
+        else:
+            if pending.ready.is_set():
+                self.stats['prelaunch_ready'] += 1
+            pending.ready.wait(self.spawn_timeout + self.warmup_time + 5.0)
+        self.stats['launch_wait'] += time.monotonic() - start
+
+        if pending.error or pending.pid is None:
+            self.stats['failures'] += 1
+            print(f"✗ Khởi chạy client thất bại: {pending.error or 'không rõ lỗi'}")
+            if pending.pid is not None:
+                terminate_processes(pid=pending.pid, grace_timeout=0.0)
+            return None
+
+        self.current_pid = pending.pid
+        return pending.pid
+
+    # ------------------------------------------------------------------- stop
+
+    def retire_current(self) -> Optional[dict]:
+        """Kill client hiện tại (cả cây process) theo PID, không động vào client pre-launch."""
+        pid, self.current_pid = self.current_pid, None
+        if pid is None:
+            return None
+        report = terminate_processes(pid=pid, grace_timeout=0.0)
+        self.watcher.refresh()
+        return report
+
+    def retire_unmanaged(self) -> dict:
+        """
+        Kill client của account hiện tại khi nó không do manager mở (pre-launch thất bại, các step
+        thường đã mở client): theo PID, cả cây process, chừa client đang pre-launch. Khi có pre-launch,
+        chỉ các client đã chạy trước lúc bắt đầu pre-launch bị kill (client pre-launch có thể chưa có PID).
+
+        Returns:
+            dict: 'found', 'alive' (PID, gồm cả con) và 'elapsed' (giây)
+        """
+        start = time.monotonic()
+        with self._lock:
+            pending = self._pending
+        self.watcher.refresh(full_scan=True)
+        pids = self.watcher.pids
+        if pending is not None:
+            pids &= pending.known
+            pids.discard(pending.pid)
+        report = {'found': [], 'alive': [], 'elapsed': 0.0}
+        for pid in sorted(pids):
+            result = terminate_processes(pid=pid, grace_timeout=0.0)
+            report['found'].extend(result['found'])
+            report['alive'].extend(result['alive'])
+        self.watcher.refresh()
+        report['elapsed'] = time.monotonic() - start
+        return report
+
+    def shutdown(self):
+        """Dừng client đang pre-launch (nếu có) khi vòng lặp kết thúc."""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        pending.ready.wait(self.spawn_timeout + self.warmup_time + 5.0)
+        if pending.pid is not None:
+            terminate_processes(pid=pending.pid, grace_timeout=0.0)
+            self.watcher.refresh()
+            print(f"✓ Đã dừng client pre-launch không dùng đến (PID: {pending.pid})")
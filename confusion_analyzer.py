@@ -0,0 +1,254 @@
+"""
+Confusion Analyzer Module
+Kiểm tra template của step này có khớp cao trên màn hình của step khác không (vd một
+nút "OK" chung khớp cả ở step 3 lẫn step 8): runner sẽ click nhầm rồi rơi vào retry
+và mất cả một vòng restart. Tính ma trận score của mọi templates/step*.png trên frame
+của mọi step (song song bằng process pool) và đánh dấu các cặp có biên nhỏ hơn
+khoảng an toàn.
+
+Frame được gán step theo tên file hoặc thư mục cha: frames/step3_001.png, frames/step3/a.png.
+Không có frame thì mỗi template được đặt lên một nền phẳng làm "màn hình" của step đó -
+chỉ bắt được trường hợp template giống nhau, nhưng không cần chụp gì.
+
+Cách dùng:
+    python confusion_analyzer.py --frames screenshots/
+    python confusion_analyzer.py --frames screenshots/ --gap 0.15 --strategy grayscale --json confusion.json
+    python confusion_analyzer.py                        # chỉ so các template với nhau
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from match_strategies import STRATEGIES, TemplateData
+
+FRAME_PATTERNS = ("*.png", "*.jpg", "*.jpeg", "*.bmp")
+_STEP_RE = re.compile(r'step(\d+)', re.IGNORECASE)
+
+
+def _step_of(path: str) -> Optional[int]:
+    """Số step trong tên file, không có thì trong tên thư mục cha."""
+    for part in (os.path.basename(path), os.path.basename(os.path.dirname(path))):
+        match = _STEP_RE.search(part)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def discover_templates(templates_dir: str = "templates") -> List[Tuple[int, str]]:
+    """[(step, đường dẫn)] của templates/step*.png|jpg, theo thứ tự step."""
+    paths = glob.glob(os.path.join(templates_dir, "step*.png")) + glob.glob(os.path.join(templates_dir, "step*.jpg"))
+    items = [(_step_of(path), path) for path in paths]
+    return sorted((step, path) for step, path in items if step is not None)
+
+
+def discover_frames(frames_dir: str) -> List[Tuple[int, str]]:
+    """[(step, đường dẫn)] của các frame trong thư mục (kể cả thư mục con), bỏ qua file không rõ step."""
+    paths = []
+    for pattern in FRAME_PATTERNS:
+        paths.extend(glob.glob(os.path.join(frames_dir, "**", pattern), recursive=True))
+    items = [(_step_of(path), path) for path in sorted(set(paths))]
+    skipped = sum(1 for step, _ in items if step is None)
+    if skipped:
+        print(f"⚠ Bỏ qua {skipped} frame không có 'stepN' trong tên file/thư mục")
+    return [(step, path) for step, path in items if step is not None]
+
+
+def template_frames(templates: Sequence[Tuple[int, str]]) -> List[Tuple[int, str, np.ndarray]]:
+    """Frame thay thế khi không có ảnh chụp: mỗi template trên nền phẳng màu trung bình của nó."""
+    images = [(step, path, cv2.imread(path, cv2.IMREAD_COLOR)) for step, path in templates]
+    images = [(step, path, image) for step, path, image in images if image is not None]
+    if not images:
+        return []
+    pad = max(max(image.shape[:2]) for _, _, image in images)
+    frames = []
+    for step, path, image in images:
+        color = [int(c) for c in image.reshape(-1, 3).mean(axis=0)]
+        frame = cv2.copyMakeBorder(image, pad, pad, pad, pad, cv2.BORDER_CONSTANT, value=color)
+        frames.append((step, f"{path} (nền phẳng)", frame))
+    return frames
+
+
+# ------------------------------------------------------------------ phía worker
+
+_templates: Dict[str, TemplateData] = {}
+_strategy = 'direct'
+_threshold = 0.8
+
+
+def _init_worker(templates: Sequence[Tuple[int, str]], strategy: str, threshold: float, threads: int = 1):
+    """Đọc sẵn mọi template trong worker."""
+    global _strategy, _threshold
+    cv2.setNumThreads(threads)  # Song song theo process; để OpenCV tự chia thread nữa sẽ tranh core
+    _strategy, _threshold = strategy, threshold
+    _templates.clear()
+    for _, path in templates:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is not None:
+            _templates[path] = TemplateData(image)  # Theo đường dẫn: step3.png và step3_alt.png là hai template
+
+
+def _score_frame(step: int, name: str, frame: Optional[np.ndarray]) -> Tuple[int, str, Dict[str, float]]:
+    """Score cao nhất của từng template (theo đường dẫn) trên một frame (frame None = đọc từ file `name`)."""
+    if frame is None:
+        frame = cv2.imread(name, cv2.IMREAD_COLOR)
+        if frame is None:
+            return step, name, {}
+    match = STRATEGIES[_strategy]
+    scores = {}
+    for path, template in _templates.items():
+        score, _ = match(frame, template, _threshold, None)
+        scores[path] = float(score) if np.isfinite(score) else 0.0
+    return step, name, scores
+
+
+# ------------------------------------------------------------------ phân tích
+
+def analyze(templates: Sequence[Tuple[int, str]], frames: Sequence[Tuple[int, str, Optional[np.ndarray]]],
+            threshold: float = 0.8, gap: float = 0.1, strategy: str = 'direct',
+            workers: Optional[int] = None) -> Dict:
+    """
+    Tính ma trận nhầm lẫn và các cặp dễ nhầm.
+
+    Args:
+        templates: [(step, đường dẫn template)]
+        frames: [(step của màn hình, tên/đường dẫn, ảnh hoặc None để đọc từ đường dẫn)]
+        threshold: Threshold của runner
+        gap: Khoảng an toàn yêu cầu giữa score và threshold
+        strategy: Chiến lược matching của runner (score tính đúng như lúc chạy)
+        workers: Số worker process (None = số core, 0 = chạy trong process hiện tại)
+
+    Returns:
+        dict: matrix {template_path: {screen_step: {'score', 'frame', 'frames'}}} - ô chéo là score
+        thấp nhất trên màn hình của chính step đó, ô khác là score cao nhất; flags [{template (step), path,
+        screen, score, margin, kind ('confusion' | 'weak' | 'missing')}] xếp theo biên tăng dần.
+        Matrix theo đường dẫn vì một step có thể có nhiều template (step3.png, step3_alt.png); khi đó
+        mỗi frame của step chỉ tính vào ô chéo của template khớp cao nhất trên frame đó.
+    """
+    jobs = [(step, name, image) for step, name, image in frames]
+    if workers == 0:
+        _init_worker(templates, strategy, threshold, threads=cv2.getNumThreads())
+        results = [_score_frame(*job) for job in jobs]
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=min(workers, max(1, len(jobs))), initializer=_init_worker,
+                                 initargs=(list(templates), strategy, threshold)) as pool:
+            results = list(pool.map(_score_frame, *zip(*jobs))) if jobs else []
+
+    template_steps = {path: step for step, path in templates}
+    screen_steps = sorted({step for step, _, _ in jobs})
+    matrix: Dict[str, Dict[int, Dict]] = {path: {} for path in template_steps}
+    for screen, name, scores in results:
+        # Step có nhiều template: frame của step thuộc về template khớp cao nhất trong số đó
+        own = [path for path in scores if template_steps[path] == screen]
+        owner = max(own, key=scores.get) if own else None
+        for path, score in scores.items():
+            template_step = template_steps[path]
+            if template_step == screen and path != owner:
+                continue
+            cell = matrix[path].get(screen)
+            if cell is None:
+                matrix[path][screen] = {'score': score, 'frame': name, 'frames': 1}
+                continue
+            cell['frames'] += 1
+            # Màn hình của chính step: lấy lần khớp tệ nhất; màn hình khác: lần khớp nhầm cao nhất
+            worse = score < cell['score'] if template_step == screen else score > cell['score']
+            if worse:
+                cell['score'], cell['frame'] = score, name
+
+    flags = []
+    for path, template_step in template_steps.items():
+        for screen, cell in matrix[path].items():
+            if template_step == screen:
+                margin = cell['score'] - threshold
+                kind = 'weak'
+            else:
+                margin = threshold - cell['score']
+                kind = 'confusion'
+            if margin < gap:
+                flags.append({'template': template_step, 'path': path, 'screen': screen,
+                              'score': round(cell['score'], 4), 'margin': round(margin, 4), 'kind': kind,
+                              'frame': cell['frame']})
+        if template_step not in matrix[path]:
+            flags.append({'template': template_step, 'path': path, 'screen': template_step, 'score': None,
+                          'margin': None, 'kind': 'missing', 'frame': None})
+    flags.sort(key=lambda flag: (flag['margin'] is None, flag['margin'] if flag['margin'] is not None else 0.0))
+    return {'threshold': threshold, 'gap': gap, 'strategy': strategy, 'templates': template_steps,
+            'screens': screen_steps, 'frames': len(jobs), 'matrix': matrix, 'flags': flags}
+
+
+def print_report(report: Dict):
+    """In ma trận (hàng: template, cột: màn hình của step) và các cặp bị đánh dấu."""
+    screens = report['screens']
+    flagged = {(flag['path'], flag['screen']) for flag in report['flags']}
+    print(f"Threshold {report['threshold']}, khoảng an toàn {report['gap']}, chiến lược '{report['strategy']}', "
+          f"{report['frames']} frame")
+    print("template \\ màn hình " + "".join(f"{screen:>7}" for screen in screens))
+    for path, row in report['matrix'].items():
+        cells = []
+        for screen in screens:
+            cell = row.get(screen)
+            text = f"{cell['score']:.2f}" if cell else "-"
+            cells.append(f"{text + ('!' if (path, screen) in flagged else ' '):>7}")
+        print(f"{os.path.basename(path):<19}" + "".join(cells))
+
+    if not report['flags']:
+        print("\n✓ Không có cặp nào dưới khoảng an toàn")
+        return
+    print(f"\n⚠ {len(report['flags'])} cặp dưới khoảng an toàn:")
+    for flag in report['flags']:
+        if flag['kind'] == 'confusion':
+            print(f"  ✗ Template {os.path.basename(flag['path'])} khớp {flag['score']:.2f} trên màn hình step "
+                  f"{flag['screen']} (biên {flag['margin']:+.3f}) - {flag['frame']}")
+        elif flag['kind'] == 'weak':
+            print(f"  ✗ Template {os.path.basename(flag['path'])} chỉ khớp {flag['score']:.2f} trên màn hình của "
+                  f"chính nó (biên {flag['margin']:+.3f}) - {flag['frame']}")
+        else:
+            print(f"  ⚠ Không có frame nào của step {flag['template']} ({os.path.basename(flag['path'])})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ma trận nhầm lẫn giữa các template step*.png")
+    parser.add_argument('--templates', default="templates", help="Thư mục templates/step*.png")
+    parser.add_argument('--frames', default=None,
+                        help="Thư mục frame (tên file/thư mục có stepN); bỏ trống = chỉ so các template với nhau")
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--gap', type=float, default=0.1, help="Khoảng an toàn giữa score và threshold")
+    parser.add_argument('--strategy', default='direct', choices=sorted(STRATEGIES))
+    parser.add_argument('--workers', type=int, default=None, help="Số worker process (0 = không dùng pool)")
+    parser.add_argument('--json', default=None, help="Ghi báo cáo ra file JSON")
+    args = parser.parse_args()
+
+    templates = discover_templates(args.templates)
+    if not templates:
+        print(f"✗ Không tìm thấy step*.png trong {args.templates}")
+        sys.exit(2)
+    if args.frames:
+        frames = [(step, path, None) for step, path in discover_frames(args.frames)]
+        if not frames:
+            print(f"✗ Không có frame nào trong {args.frames}")
+            sys.exit(2)
+    else:
+        print("→ Không có --frames: dùng chính các template trên nền phẳng làm màn hình của từng step")
+        frames = template_frames(templates)
+
+    report = analyze(templates, frames, threshold=args.threshold, gap=args.gap, strategy=args.strategy,
+                     workers=args.workers)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nĐã ghi: {args.json}")
+    sys.exit(1 if report['flags'] else 0)
+
+
+if __name__ == "__main__":
+    main()
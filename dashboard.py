@@ -0,0 +1,249 @@
+"""
+Dashboard Module
+Bảng trạng thái trực tiếp trên console cho các lần chạy dài, thay cho việc xóa màn
+hình (os.system('cls')) và in lại banner mỗi vòng lặp. Mỗi runner cập nhật một
+RunnerStatus bằng các phép gán thuộc tính (không khóa, không I/O); một thread nền đọc
+chúng theo chu kỳ giới hạn và chỉ vẽ lại các ô đã thay đổi bằng mã ANSI. Log của
+runner hiện ở phần dưới bảng (các dòng mới nhất).
+
+Ví dụ:
+    board = Dashboard([runner.status])
+    with log_pipeline.capture_prints(), board:
+        runner.run_loop(0)
+"""
+
+import collections
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from typing import Deque, List, Optional, Sequence
+
+import log_pipeline
+
+# Cột của bảng: (tiêu đề, độ rộng)
+COLUMNS = (('Instance', 16), ('Account', 10), ('Step', 5), ('Trong step', 11), ('Retry', 6),
+           ('Xong/Lỗi', 9), ('Acc/h', 7), ('Detect', 9), ('Trạng thái', 0))
+
+_ESC = '\x1b['
+
+
+class RunnerStatus:
+    """Trạng thái của một runner, chỉ được ghi bởi thread của runner đó."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.account = None
+        self.step = None
+        self.step_started: Optional[float] = None
+        self.retries = 0
+        self.phase = 'khởi động'
+        self.done = 0
+        self.failed = 0
+        self.started: Optional[float] = None
+        self.detect_seconds: Optional[float] = None  # Trung bình trượt thời gian một lần detect
+
+    def start_account(self, account_id):
+        if self.started is None:
+            self.started = time.monotonic()
+        self.account = account_id
+        self.step = None
+        self.step_started = None
+        self.phase = 'bắt đầu account'
+
+    def start_step(self, step_num: int, retry_count: int = 0):
+        if retry_count == 0 or self.step != step_num:
+            self.step_started = time.monotonic()
+        self.step = step_num
+        self.retries = retry_count
+        self.phase = 'tìm template'
+
+    def observe_detect(self, seconds: float):
+        previous = self.detect_seconds
+        self.detect_seconds = seconds if previous is None else previous * 0.8 + seconds * 0.2
+
+    def finish_account(self, state: str):
+        if state == 'done':
+            self.done += 1
+        else:
+            self.failed += 1
+        self.step = None
+        self.step_started = None
+        self.phase = f"xong: {state}"
+
+    def accounts_per_hour(self, now: Optional[float] = None) -> Optional[float]:
+        """Số account xong mỗi giờ từ account đầu tiên (None nếu chạy chưa đủ 1 phút)."""
+        if self.started is None:
+            return None
+        elapsed = (time.monotonic() if now is None else now) - self.started
+        return self.done * 3600.0 / elapsed if elapsed >= 60 else None
+
+
+def _duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(int(seconds), 60)
+    if minutes < 60:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{minutes // 60}h{minutes % 60:02d}m"
+
+
+def _enable_ansi(stream):
+    """Bật xử lý mã ANSI cho console Windows (Windows 10+)."""
+    if os.name != 'nt':
+        return
+    try:
+        import ctypes
+        import msvcrt
+        kernel32 = ctypes.windll.kernel32
+        handle = msvcrt.get_osfhandle(stream.fileno())
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except Exception:
+        pass
+
+
+class _TailHandler(logging.Handler):
+    """Giữ các dòng log mới nhất cho phần dưới của dashboard (chạy trên thread listener)."""
+
+    def __init__(self, lines: Deque[str]):
+        super().__init__()
+        self.lines = lines
+        self.setFormatter(log_pipeline.ConsoleFormatter())
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            for line in self.format(record).splitlines():
+                if line.strip():
+                    self.lines.append(line.replace('\t', '    '))
+        except Exception:
+            self.handleError(record)
+
+
+class Dashboard:
+    """Vẽ bảng RunnerStatus lên console, chỉ ghi phần khác với lần vẽ trước."""
+
+    def __init__(self, statuses: Sequence[RunnerStatus], refresh: float = 0.5, stream=None,
+                 title: str = "WWM AUTO RUN", log_lines: int = 200):
+        """
+        Khởi tạo Dashboard.
+
+        Args:
+            statuses: RunnerStatus của các runner cần hiển thị
+            refresh: Khoảng giữa hai lần vẽ (giây) - giới hạn tần suất vẽ lại
+            stream: Console để vẽ (mặc định sys.stdout lúc khởi tạo)
+            title: Dòng tiêu đề
+            log_lines: Số dòng log giữ lại cho phần dưới bảng
+        """
+        self.statuses = list(statuses)
+        self.refresh = refresh
+        self.stream = stream or sys.stdout
+        self.title = title
+        self.log_tail: Deque[str] = collections.deque(maxlen=log_lines)
+        self._frame: List[str] = []
+        self._size = None
+        self._started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._redirect = None
+
+    def log_handler(self) -> logging.Handler:
+        """Handler logging đưa log vào phần dưới bảng."""
+        return _TailHandler(self.log_tail)
+
+    # ---------------------------------------------------------------- vẽ
+
+    def render(self, now: Optional[float] = None) -> List[str]:
+        """Nội dung các dòng của dashboard (chưa cắt theo kích thước console)."""
+        now = time.monotonic() if now is None else now
+        lines = [f"{self.title}  |  {time.strftime('%H:%M:%S')}  |  đã chạy {_duration(now - self._started)}", '']
+        lines.append(''.join(name.ljust(width) if width else name for name, width in COLUMNS))
+        for status in self.statuses:
+            in_step = _duration(now - status.step_started) if status.step_started is not None else '-'
+            rate = status.accounts_per_hour(now)
+            detect = f"{status.detect_seconds * 1000:.1f}ms" if status.detect_seconds is not None else '-'
+            cells = (status.name, status.account, status.step, in_step, status.retries,
+                     f"{status.done}/{status.failed}", f"{rate:.1f}" if rate is not None else '-',
+                     detect, status.phase)
+            lines.append(''.join(
+                (str('-' if value is None else value)[:width - 1].ljust(width) if width else str(value))
+                for value, (_, width) in zip(cells, COLUMNS)))
+        lines.append('-' * 60)
+        return lines
+
+    def draw(self):
+        """Vẽ lại: chỉ ghi các đoạn khác với lần vẽ trước (vẽ toàn bộ khi đổi kích thước console)."""
+        columns, rows = shutil.get_terminal_size((100, 30))
+        width = max(20, columns - 1)  # Chừa cột cuối: tránh console tự xuống dòng
+        lines = self.render()
+        tail_rows = max(0, rows - len(lines) - 1)
+        tail = list(self.log_tail)[-tail_rows:] if tail_rows else []
+        frame = [line[:width].ljust(width) for line in (lines + tail)[:rows - 1]]
+        frame += [' ' * width] * (rows - 1 - len(frame))
+
+        out = []
+        if self._size != (columns, rows):
+            out.append(f"{_ESC}2J")
+            self._frame = []
+            self._size = (columns, rows)
+        for row, line in enumerate(frame):
+            old = self._frame[row] if row < len(self._frame) else None
+            if old == line:
+                continue
+            if old is None:
+                start, end = 0, len(line)
+            else:
+                start = next(i for i in range(width) if old[i] != line[i])
+                end = next(i for i in range(width, 0, -1) if old[i - 1] != line[i - 1])
+            out.append(f"{_ESC}{row + 1};{start + 1}H{line[start:end]}")
+        self._frame = frame
+        if out:
+            self.stream.write(''.join(out))
+            self.stream.flush()
+
+    # ---------------------------------------------------------------- thread nền
+
+    def _run(self):
+        while True:
+            try:
+                self.draw()
+            except Exception:
+                pass  # Console đóng/đổi kích thước giữa chừng: lần sau vẽ lại toàn bộ
+            if self._stop.wait(self.refresh):
+                break
+
+    def start(self):
+        """Bắt đầu vẽ ở thread nền, log console chuyển vào phần dưới bảng."""
+        if self._thread is not None:
+            return
+        _enable_ansi(self.stream)
+        self.stream.write(f"{_ESC}?25l")  # Ẩn con trỏ
+        self._redirect = log_pipeline.redirect_console(self.log_handler())
+        self._redirect.__enter__()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dashboard", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Dừng vẽ, trả console về như cũ (con trỏ xuống dưới bảng)."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._redirect.__exit__(None, None, None)
+        self._redirect = None
+        self.draw()
+        self.stream.write(f"{_ESC}{len(self._frame) + 1};1H{_ESC}?25h\n")
+        self.stream.flush()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
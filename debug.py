@@ -5,6 +5,8 @@ Hiển thị menu để chọn bước và test detect/click cho từng bước
 
 from image_detector import ImageDetector
 from screen_automation import ScreenAutomation
+import match_inspector
+import profiling
 import os
 import time
 import glob
@@ -115,7 +117,9 @@ class StepDebugger:
             print(f"\n✗ File không tồn tại: {filepath}")
             return None
         
+        start = time.perf_counter()
         result = self.detector.find_template(filepath)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
         
         if result:
             x, y, confidence = result
@@ -123,13 +127,44 @@ class StepDebugger:
             print(f"  Tọa độ X: {x}")
             print(f"  Tọa độ Y: {y}")
             print(f"  Confidence: {confidence:.2%}")
+            print(f"  Thời gian (chụp + tìm): {elapsed_ms:.1f}ms")
             return (x, y, confidence)
         else:
             print("\n✗ KHÔNG TÌM THẤY")
+            print(f"  Thời gian (chụp + tìm): {elapsed_ms:.1f}ms")
             print("  - Kiểm tra ảnh mẫu có đang hiển thị trên màn hình không")
             print("  - Thử giảm threshold xuống 0.7 hoặc 0.6")
+            print("  - Dùng menu 6 (heatmap) để xem các vị trí gần khớp")
             return None
     
+    def test_step_heatmap(self, step_num, frame_path=None, region=None, top_k=5):
+        """
+        Lưu heatmap score map của một bước (các đỉnh gần khớp, thời gian chụp/matching).
+        
+        Args:
+            step_num: Số thứ tự bước
+            frame_path: Frame đã lưu (None = chụp màn hình)
+            region: (x, y, width, height) - chỉ tìm trong vùng này
+            top_k: Số đỉnh đánh dấu
+        
+        Returns:
+            Báo cáo của match_inspector.inspect, None nếu lỗi.
+        """
+        step_info = self._get_step_info(step_num)
+        if not step_info:
+            return None
+        
+        step_num, filename, filepath = step_info
+        
+        print("\n" + "=" * 60)
+        print(f"BƯỚC {step_num}: HEATMAP SCORE MAP")
+        print("=" * 60)
+        report = match_inspector.inspect(self.detector, filepath, frame_path=frame_path, region=region,
+                                         top_k=top_k, name=f"step{step_num}_{time.strftime('%Y%m%d_%H%M%S')}")
+        if report:
+            match_inspector.print_report(report)
+        return report
+    
     def test_step_click(self, step_num):
         """Test click cho một bước cụ thể"""
         step_info = self._get_step_info(step_num)
@@ -263,7 +298,8 @@ class StepDebugger:
             print(f"Đang test BƯỚC {step_num}: {filename}")
             print(f"{'='*60}")
             
-            success = self.test_step_both(step_num)
+            with profiling.step(f"step{step_num}"):
+                success = self.test_step_both(step_num)
             results.append((step_num, success))
             
             if not success:
@@ -320,10 +356,11 @@ def main():
         print("3. Test click (một bước)")
         print("4. Test cả 2: Phát hiện + Click (một bước)")
         print("5. Test tất cả các bước liên tiếp")
+        print("6. Heatmap score map + thời gian (một bước)")
         print("0. Thoát")
         print("=" * 60)
         
-        choice = input("\nChọn (0-5): ").strip()
+        choice = input("\nChọn (0-6): ").strip()
         
         if choice == "0":
             print("Tạm biệt!")
@@ -334,27 +371,43 @@ def main():
             step_input = input("Nhập số bước: ").strip()
             try:
                 step_num = int(step_input)
-                debugger.test_step_detect(step_num)
+                with profiling.step(f"step{step_num}_detect"):
+                    debugger.test_step_detect(step_num)
             except ValueError:
                 print("Số bước không hợp lệ!")
         elif choice == "3":
             step_input = input("Nhập số bước: ").strip()
             try:
                 step_num = int(step_input)
-                debugger.test_step_click(step_num)
+                with profiling.step(f"step{step_num}_click"):
+                    debugger.test_step_click(step_num)
             except ValueError:
                 print("Số bước không hợp lệ!")
         elif choice == "4":
             step_input = input("Nhập số bước: ").strip()
             try:
                 step_num = int(step_input)
-                debugger.test_step_both(step_num)
+                with profiling.step(f"step{step_num}"):
+                    debugger.test_step_both(step_num)
             except ValueError:
                 print("Số bước không hợp lệ!")
         elif choice == "5":
             confirm = input("Test tất cả các bước? (y/n): ").strip().lower()
             if confirm == 'y':
                 debugger.test_all_steps()
+        elif choice == "6":
+            step_input = input("Nhập số bước: ").strip()
+            frame_path = input("Frame đã lưu (Enter để chụp màn hình): ").strip().strip('"') or None
+            region_input = input("Vùng tìm kiếm x,y,width,height (Enter = toàn màn hình): ").strip()
+            try:
+                step_num = int(step_input)
+                region = tuple(int(v) for v in region_input.split(',')) if region_input else None
+                if region is not None and len(region) != 4:
+                    raise ValueError
+                with profiling.step(f"step{step_num}_heatmap"):
+                    debugger.test_step_heatmap(step_num, frame_path=frame_path, region=region)
+            except ValueError:
+                print("Số bước hoặc vùng không hợp lệ!")
         else:
             print("Lựa chọn không hợp lệ!")
         
@@ -362,5 +415,9 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    # python debug.py --profile[=thư_mục]: chạy dưới cProfile, ghi profile theo step
+    if profiling.profile_from_argv():
+        profiling.run_profiled(main)
+    else:
+        main()
 
@@ -0,0 +1,220 @@
+"""
+Detection Farm Module
+Chia việc template matching cho một pool worker process để nhiều game client
+trên cùng máy không phải xếp hàng chờ một interpreter. Mỗi worker giữ sẵn một
+ImageDetector với toàn bộ template đã đọc; job gửi sang gồm frame (hoặc tham
+chiếu frame trong frame bus) + template, kết quả trả về qua Future.
+
+Ví dụ:
+    farm = DetectionFarm(glob.glob("templates/*.png"), workers=4)
+    future = farm.submit("templates/step3.png", frame)
+    result = future.result()   # (x, y, confidence) hoặc None
+    farm.shutdown()
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics import REGISTRY
+
+FARM_LATENCY = REGISTRY.histogram('wwm_farm_job_seconds', 'Thoi gian job cua detection farm theo giai doan',
+                                  ('phase',), buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                                                       0.1, 0.25, 0.5, 1.0))
+
+# ------------------------------------------------------------------ phía worker
+
+_detector = None
+_buses: Dict[str, object] = {}
+
+
+def _init_worker(template_paths: Sequence[str], threshold: float, strategy: str,
+                 template_modes: Optional[Dict[str, str]]):
+    """Khởi tạo worker: một ImageDetector với template (và descriptor keypoint) đọc sẵn."""
+    global _detector
+    import cv2
+    cv2.setNumThreads(1)  # Song song theo process; để OpenCV tự chia thread nữa sẽ tranh core
+    from image_detector import ImageDetector
+    _detector = ImageDetector(threshold=threshold, strategy=strategy, use_signatures=False)
+    for path in template_paths:
+        _detector._load_template(path)
+    for path, mode in (template_modes or {}).items():
+        _detector.set_template_mode(path, mode)
+
+
+def _bus_frame(bus_name: str, seq: Optional[int]):
+    """Frame từ frame bus (gắn vào bus một lần cho mỗi worker)."""
+    bus = _buses.get(bus_name)
+    if bus is None:
+        from frame_bus import FrameBusConsumer
+        bus = _buses[bus_name] = FrameBusConsumer(bus_name)
+    ref = bus.read(seq) if seq is not None else bus.read_latest()
+    return ref
+
+
+def _run_job(template_path: str, frame: Optional[np.ndarray], region: Optional[Tuple[int, int, int, int]],
+             bus_name: Optional[str], bus_seq: Optional[int], submitted_at: float):
+    """
+    Chạy một job trong worker.
+
+    Returns:
+        (kết quả, thời gian chờ trong hàng đợi, thời gian xử lý, pid worker)
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    result = None
+    if bus_name is not None:
+        ref = _bus_frame(bus_name, bus_seq)
+        bus = _buses[bus_name]
+        box = bus.local_box(region)  # Vùng theo tọa độ màn hình -> tọa độ trong frame của bus
+        if ref is not None and box is not None:
+            x, y, w, h = box
+            frame = ref.frame[y:y + h, x:x + w]
+            result = _detector.find_in_frame(template_path, frame, region or bus.region)
+            if not ref.valid():
+                result = None  # Producer đã ghi đè frame trong lúc đang match
+    elif frame is not None:
+        result = _detector.find_in_frame(template_path, frame, region)
+    return result, max(0.0, started_at - submitted_at), time.perf_counter() - start, os.getpid()
+
+
+# ------------------------------------------------------------------ phía runner
+
+class DetectionFarm:
+    """Pool worker process cho template matching, có hàng đợi giới hạn (backpressure)."""
+
+    def __init__(self, template_paths: Sequence[str], workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, threshold: float = 0.8, strategy: str = 'direct',
+                 template_modes: Optional[Dict[str, str]] = None):
+        """
+        Khởi tạo DetectionFarm.
+
+        Args:
+            template_paths: Các template đọc sẵn trong mỗi worker
+            workers: Số worker process (None = số core - 1, tối thiểu 1)
+            max_pending: Số job tối đa đang chờ/chạy; submit() chặn khi đầy
+                         (None = 2 job mỗi worker)
+            threshold: Ngưỡng confidence
+            strategy: Chiến lược matching của ImageDetector trong worker
+            template_modes: {template_path: mode} như ImageDetector
+        """
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_pending = max_pending or self.workers * 2
+        self.template_paths = list(template_paths)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker,
+            initargs=(self.template_paths, threshold, strategy, template_modes))
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0,
+                      'blocked_time': 0.0, 'queue_time': 0.0, 'work_time': 0.0, 'total_time': 0.0,
+                      'max_total_time': 0.0}
+        self.jobs_per_worker: Dict[int, int] = {}
+
+    def submit(self, template_path: str, frame: Optional[np.ndarray] = None,
+               region: Optional[Tuple[int, int, int, int]] = None, bus_name: Optional[str] = None,
+               bus_seq: Optional[int] = None, timeout: Optional[float] = None) -> Future:
+        """
+        Gửi một job tìm template.
+
+        Args:
+            template_path: Template cần tìm (nên nằm trong template_paths để worker đã đọc sẵn)
+            frame: Ảnh BGR (vùng tìm kiếm). Bỏ qua khi dùng bus_name
+            region: (x, y, width, height) - vị trí của frame trên màn hình; với bus_name
+                    là vùng (tọa độ màn hình) cần cắt từ frame của bus
+            bus_name: Đọc frame từ frame bus thay vì gửi frame (tránh copy frame giữa process)
+            bus_seq: Số thứ tự frame trong bus (None = frame mới nhất lúc worker nhận job)
+            timeout: Thời gian chờ tối đa khi hàng đợi đầy (None = chờ đến khi có chỗ)
+
+        Returns:
+            Future trả về (x, y, confidence) theo tọa độ màn hình hoặc None.
+
+        Raises:
+            TimeoutError: Hàng đợi vẫn đầy sau `timeout` giây.
+        """
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self.stats['rejected'] += 1
+            raise TimeoutError(f"Detection farm đầy ({self.max_pending} job đang chờ)")
+        blocked = time.perf_counter() - start
+
+        with self._lock:
+            self.stats['submitted'] += 1
+            self.stats['blocked_time'] += blocked
+        submitted_at = time.time()
+        try:
+            inner = self._executor.submit(_run_job, template_path, frame, region, bus_name, bus_seq, submitted_at)
+        except Exception:
+            self._slots.release()
+            with self._lock:
+                self.stats['submitted'] -= 1
+            raise
+
+        outer: Future = Future()
+        inner.add_done_callback(lambda f: self._on_done(f, outer, start))
+        return outer
+
+    def _on_done(self, inner: Future, outer: Future, start: float):
+        """Giải phóng chỗ trong hàng đợi, ghi latency và chuyển kết quả sang Future của caller."""
+        self._slots.release()
+        total = time.perf_counter() - start
+        error = inner.exception()
+        if error is not None:
+            with self._lock:
+                self.stats['failed'] += 1
+            outer.set_exception(error)
+            return
+        result, queue_time, work_time, pid = inner.result()
+        with self._lock:
+            self.stats['completed'] += 1
+            self.stats['queue_time'] += queue_time
+            self.stats['work_time'] += work_time
+            self.stats['total_time'] += total
+            self.stats['max_total_time'] = max(self.stats['max_total_time'], total)
+            self.jobs_per_worker[pid] = self.jobs_per_worker.get(pid, 0) + 1
+        FARM_LATENCY.observe(queue_time, phase='queue')
+        FARM_LATENCY.observe(work_time, phase='work')
+        FARM_LATENCY.observe(total, phase='total')
+        outer.set_result(result)
+
+    def find_many(self, template_paths: Sequence[str], frame: Optional[np.ndarray] = None,
+                  region: Optional[Tuple[int, int, int, int]] = None,
+                  bus_name: Optional[str] = None) -> List[Optional[Tuple[int, int, float]]]:
+        """Tìm nhiều template trên cùng một frame song song, trả về kết quả theo thứ tự."""
+        futures = [self.submit(path, frame, region, bus_name) for path in template_paths]
+        return [future.result() for future in futures]
+
+    @property
+    def pending(self) -> int:
+        """Số job đang chờ hoặc đang chạy."""
+        with self._lock:
+            return self.stats['submitted'] - self.stats['completed'] - self.stats['failed']
+
+    def latency_summary(self) -> Dict[str, float]:
+        """Latency trung bình (ms) theo giai đoạn: chờ chỗ, chờ worker, xử lý, tổng."""
+        with self._lock:
+            done = self.stats['completed'] or 1
+            submitted = self.stats['submitted'] or 1
+            return {
+                'blocked_ms': self.stats['blocked_time'] / submitted * 1000.0,
+                'queue_ms': self.stats['queue_time'] / done * 1000.0,
+                'work_ms': self.stats['work_time'] / done * 1000.0,
+                'total_ms': self.stats['total_time'] / done * 1000.0,
+                'max_total_ms': self.stats['max_total_time'] * 1000.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Dừng các worker."""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        return False
@@ -0,0 +1,107 @@
+"""
+Feature Matcher Module
+Phát hiện template bằng keypoint (ORB/SIFT) thay vì TM_CCOEFF_NORMED.
+Chịu được UI bị scale, bị che một phần hoặc đổi skin nhẹ. Descriptor của template
+được tính một lần và cache lại; mỗi lần tìm chỉ tính keypoint của frame/ROI.
+"""
+
+import cv2
+import numpy as np
+import logging
+from typing import Optional, Tuple
+
+from match_strategies import TemplateData, to_gray
+
+logger = logging.getLogger(__name__)
+
+
+class FeatureMatcher:
+    """Tìm template trong frame bằng keypoint + RANSAC (biến đổi similarity)."""
+
+    def __init__(self, method: str = 'orb', ratio: float = 0.75, min_inliers: int = 8,
+                 min_inlier_ratio: float = 0.5, frame_features: int = 5000):
+        """
+        Khởi tạo FeatureMatcher.
+
+        Args:
+            method: 'orb' (nhanh, mặc định) hoặc 'sift' (chính xác hơn với scale, chậm hơn)
+            ratio: Ngưỡng Lowe ratio test khi ghép descriptor
+            min_inliers: Số cặp điểm inlier tối thiểu để chấp nhận kết quả
+            min_inlier_ratio: Tỉ lệ inlier / cặp ghép tối thiểu để chấp nhận kết quả
+            frame_features: Số keypoint tối đa lấy trên frame (ORB)
+        """
+        self.method = method
+        self.ratio = ratio
+        self.min_inliers = min_inliers
+        self.min_inlier_ratio = min_inlier_ratio
+        if method == 'sift':
+            self._template_extractor = cv2.SIFT_create()
+            self._frame_extractor = cv2.SIFT_create()
+            self._matcher = cv2.BFMatcher(cv2.NORM_L2)
+        else:
+            # patchSize/edgeThreshold nhỏ để template nhỏ (nút ~50px) vẫn có keypoint
+            self._template_extractor = cv2.ORB_create(nfeatures=500, edgeThreshold=15, patchSize=15,
+                                                      fastThreshold=10)
+            self._frame_extractor = cv2.ORB_create(nfeatures=frame_features, edgeThreshold=15,
+                                                   patchSize=15, fastThreshold=10)
+            self._matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+
+    def template_features(self, template: TemplateData) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Keypoint (tọa độ Nx2) và descriptor của template, tính một lần rồi cache
+        ngay trên TemplateData (tự mất khi template được đọc lại).
+
+        Returns:
+            (points, descriptors). descriptors = None nếu template không có keypoint nào.
+        """
+        cached = template.features.get(self.method)
+        if cached is None:
+            keypoints, descriptors = self._template_extractor.detectAndCompute(template.gray, None)
+            points = np.float32([kp.pt for kp in keypoints]).reshape(-1, 2)
+            cached = (points, descriptors)
+            template.features[self.method] = cached
+            if len(points) < self.min_inliers:
+                logger.warning("Template chỉ có %s keypoint, feature matching sẽ kém tin cậy", len(points))
+        return cached
+
+    def match(self, frame: np.ndarray, template: TemplateData) -> Optional[Tuple[int, int, float]]:
+        """
+        Tìm template trong frame.
+
+        Args:
+            frame: Ảnh BGR (hoặc grayscale) vùng tìm kiếm
+            template: Template đã đọc sẵn
+
+        Returns:
+            (x, y, confidence) - tâm template trong tọa độ frame và tỉ lệ inlier,
+            hoặc None nếu không đủ bằng chứng.
+        """
+        tpl_points, tpl_desc = self.template_features(template)
+        if tpl_desc is None or len(tpl_points) < self.min_inliers:
+            return None
+
+        keypoints, frame_desc = self._frame_extractor.detectAndCompute(to_gray(frame), None)
+        if frame_desc is None or len(keypoints) < self.min_inliers:
+            return None
+
+        good = []
+        for pair in self._matcher.knnMatch(tpl_desc, frame_desc, k=2):
+            if len(pair) == 2 and pair[0].distance < self.ratio * pair[1].distance:
+                good.append(pair[0])
+        if len(good) < self.min_inliers:
+            return None
+
+        src = tpl_points[[m.queryIdx for m in good]].reshape(-1, 1, 2)
+        dst = np.float32([keypoints[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+        M, mask = cv2.estimateAffinePartial2D(src, dst, method=cv2.RANSAC, ransacReprojThreshold=5.0)
+        if M is None or mask is None:
+            return None
+
+        inliers = int(mask.sum())
+        confidence = inliers / float(len(good))
+        if inliers < self.min_inliers or confidence < self.min_inlier_ratio:
+            return None
+
+        center = np.float32([[template.w / 2.0, template.h / 2.0, 1.0]]).T
+        cx, cy = (M @ center).ravel()
+        return (int(round(cx)), int(round(cy)), confidence)
@@ -0,0 +1,401 @@
+"""
+Frame Bus Module
+Một producer chụp màn hình mỗi tick và ghi frame vào ring buffer trong shared
+memory; mọi consumer (runner nhiều instance, debug tool, recorder, watchdog) ở
+các process khác gắn vào và đọc frame mới nhất hoặc một frame cụ thể theo số
+thứ tự mà không copy. Chi phí chụp màn hình giữ nguyên dù có bao nhiêu consumer.
+
+Mỗi slot có bộ đếm kiểu seqlock: producer đặt số lẻ trước khi ghi và số chẵn
+sau khi ghi xong, nên consumer biết frame đang đọc có bị ghi đè giữa chừng không.
+grab() (dùng cho ImageDetector) chép frame ra buffer riêng rồi mới kiểm tra: một lần
+match toàn màn hình lâu hơn `slots` tick, view zero-copy sẽ bị ghi đè giữa chừng.
+
+Chạy producer:
+    python frame_bus.py --name wwm_frames --fps 10
+
+Dùng trong code:
+    bus = FrameBusConsumer("wwm_frames")
+    detector = ImageDetector(frame_source=bus)
+"""
+
+import argparse
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+
+from buffer_pool import thread_pool
+
+MAGIC = 0x5757_4D46_4255_5332  # "WWMFBUS2"
+HEADER_FIELDS = 10              # magic, slots, height, width, channels, latest, closed, has_region, origin_x, origin_y
+SLOT_FIELDS = 4                 # seq, timestamp_ns, height, width
+ALIGN = 64
+
+H_MAGIC, H_SLOTS, H_HEIGHT, H_WIDTH, H_CHANNELS, H_LATEST, H_CLOSED, H_HAS_REGION, H_ORIGIN_X, H_ORIGIN_Y = range(10)
+S_SEQ, S_TS, S_HEIGHT, S_WIDTH = range(SLOT_FIELDS)
+
+
+def _layout(slots: int, height: int, width: int, channels: int) -> Tuple[int, int, int]:
+    """(kích thước header, kích thước mỗi slot, tổng kích thước) tính theo byte."""
+    header = (HEADER_FIELDS + slots * SLOT_FIELDS) * 8
+    header = (header + ALIGN - 1) // ALIGN * ALIGN
+    slot = (height * width * channels + ALIGN - 1) // ALIGN * ALIGN
+    return header, slot, header + slot * slots
+
+
+# Tên shared memory do producer trong process này tạo (resource_tracker của process đang giữ)
+_created: Set[str] = set()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Gắn vào shared memory có sẵn mà không để resource_tracker xóa nó khi consumer thoát."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        # Producer cùng process: tracker chỉ giữ một bản ghi cho tên này, để producer unlink như bình thường
+        if sys.platform != 'win32' and name not in _created:
+            from multiprocessing import resource_tracker
+            try:
+                resource_tracker.unregister(shm._name, 'shared_memory')
+            except Exception:
+                pass
+        return shm
+
+
+class _FrameRing:
+    """View numpy lên header, bảng slot và dữ liệu frame trong một khối shared memory."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int, height: int, width: int, channels: int):
+        self.shm = shm
+        self.slots = slots
+        self.shape = (height, width, channels)
+        header_size, slot_size, _ = _layout(slots, height, width, channels)
+        self.header = np.ndarray((HEADER_FIELDS,), np.uint64, shm.buf, 0)
+        self.table = np.ndarray((slots, SLOT_FIELDS), np.uint64, shm.buf, HEADER_FIELDS * 8)
+        self.frames = [
+            np.ndarray(self.shape, np.uint8, shm.buf, header_size + i * slot_size)
+            for i in range(slots)
+        ]
+
+    def release(self):
+        # Bỏ view trước khi đóng, nếu không SharedMemory.close() báo lỗi buffer đang được dùng
+        self.header = self.table = None
+        self.frames = []
+
+
+class FrameRef:
+    """Frame đọc từ bus (view zero-copy). Gọi valid() sau khi dùng để chắc chắn chưa bị ghi đè."""
+
+    def __init__(self, ring: _FrameRing, seq: int, timestamp: float, frame: np.ndarray):
+        self._ring = ring
+        self.seq = seq
+        self.timestamp = timestamp
+        self.frame = frame
+
+    @property
+    def age(self) -> float:
+        """Tuổi frame (giây)."""
+        return time.time() - self.timestamp
+
+    def valid(self) -> bool:
+        """Slot vẫn chứa đúng frame này (producer chưa ghi đè)."""
+        ring = self._ring
+        return ring.table is not None and int(ring.table[self.seq % ring.slots, S_SEQ]) == 2 * self.seq + 2
+
+
+class FrameBusProducer:
+    """Chụp màn hình theo nhịp cố định và ghi vào ring buffer."""
+
+    def __init__(self, name: str = "wwm_frames", fps: float = 10.0, slots: int = 4,
+                 region: Optional[Tuple[int, int, int, int]] = None,
+                 capture: Optional[Callable[[], np.ndarray]] = None):
+        """
+        Khởi tạo FrameBusProducer (tạo shared memory theo kích thước frame đầu tiên).
+
+        Args:
+            name: Tên shared memory
+            fps: Số frame chụp mỗi giây
+            slots: Số slot của ring buffer (frame cũ nhất bị ghi đè sau `slots` tick)
+            region: (x, y, width, height) vùng chụp. None = toàn màn hình
+            capture: Hàm chụp trả về ảnh RGB (None = pyautogui.screenshot)
+        """
+        self.name = name
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.region = region
+        self._capture = capture or self._screenshot
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'frames': 0, 'capture_time': 0.0, 'overruns': 0}
+
+        first = self._capture()
+        height, width = first.shape[:2]
+        channels = 3
+        _, _, size = _layout(slots, height, width, channels)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Bus cũ còn sót lại từ producer bị kill: thay bằng bus mới (mở có track để unlink() cân bằng tracker)
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created.add(name)
+        self.ring = _FrameRing(self.shm, slots, height, width, channels)
+        self.ring.table[:] = 0
+        header = self.ring.header
+        header[H_SLOTS], header[H_HEIGHT], header[H_WIDTH], header[H_CHANNELS] = slots, height, width, channels
+        header[H_LATEST] = 0
+        header[H_CLOSED] = 0
+        # Gốc tọa độ của frame trên màn hình: consumer đổi vùng tìm kiếm/kết quả theo nó
+        header[H_HAS_REGION] = 1 if region else 0
+        header[H_ORIGIN_X], header[H_ORIGIN_Y] = (region[0], region[1]) if region else (0, 0)
+        header[H_MAGIC] = MAGIC  # Ghi cuối cùng: consumer chỉ gắn vào khi header đã đầy đủ
+        self._next_seq = 1
+        self.publish(first)
+
+    def _screenshot(self) -> np.ndarray:
+        import pyautogui
+        image = pyautogui.screenshot(region=self.region) if self.region else pyautogui.screenshot()
+        return np.asarray(image)
+
+    def publish(self, rgb: np.ndarray) -> int:
+        """
+        Ghi một frame RGB vào slot kế tiếp (chuyển sang BGR ngay trong shared memory).
+
+        Returns:
+            Số thứ tự của frame.
+        """
+        ring = self.ring
+        seq = self._next_seq
+        slot = seq % ring.slots
+        height, width = rgb.shape[:2]
+        if (height, width) != ring.shape[:2]:
+            raise ValueError(f"Kích thước frame thay đổi: {width}x{height} != {ring.shape[1]}x{ring.shape[0]}")
+        ring.table[slot, S_SEQ] = 2 * seq + 1   # Đang ghi
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=ring.frames[slot])
+        ring.table[slot, S_TS] = time.time_ns()
+        ring.table[slot, S_HEIGHT], ring.table[slot, S_WIDTH] = height, width
+        ring.table[slot, S_SEQ] = 2 * seq + 2   # Ghi xong
+        ring.header[H_LATEST] = seq
+        self._next_seq = seq + 1
+        self.stats['frames'] += 1
+        return seq
+
+    def tick(self) -> int:
+        """Chụp và ghi một frame."""
+        start = time.perf_counter()
+        rgb = self._capture()
+        self.stats['capture_time'] += time.perf_counter() - start
+        return self.publish(rgb)
+
+    def _run(self):
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            self.tick()
+            next_time += self.interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # Chụp chậm hơn nhịp yêu cầu: không cố bắt kịp, tính lại từ bây giờ
+                self.stats['overruns'] += 1
+                next_time = time.monotonic()
+
+    def start(self):
+        """Chạy vòng chụp ở thread nền."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="FrameBusProducer", daemon=True)
+            self._thread.start()
+
+    def run_forever(self):
+        """Chạy vòng chụp ở thread hiện tại (Ctrl+C để dừng)."""
+        try:
+            self._run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """Dừng, đánh dấu bus đã đóng và xóa shared memory."""
+        self.stop()
+        if self.ring.header is not None:
+            self.ring.header[H_CLOSED] = 1
+        self.ring.release()
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        _created.discard(self.name)
+
+
+class FrameBusConsumer:
+    """Đọc frame từ bus của producer ở process khác (zero-copy)."""
+
+    def __init__(self, name: str = "wwm_frames", max_age: float = 1.0, attach_timeout: float = 10.0):
+        """
+        Gắn vào bus.
+
+        Args:
+            name: Tên shared memory của producer
+            max_age: Tuổi tối đa (giây) của frame mà grab() chấp nhận
+            attach_timeout: Thời gian chờ producer tạo bus (giây)
+        """
+        self.name = name
+        self.max_age = max_age
+        deadline = time.monotonic() + attach_timeout
+        while True:
+            try:
+                self.shm = _attach(name)
+                header = np.ndarray((HEADER_FIELDS,), np.uint64, self.shm.buf, 0)
+                if int(header[H_MAGIC]) == MAGIC:
+                    break
+                del header
+                self.shm.close()
+            except FileNotFoundError:
+                pass
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Không tìm thấy frame bus '{name}' sau {attach_timeout}s")
+            time.sleep(0.1)
+        slots, height, width, channels = (int(header[i]) for i in (H_SLOTS, H_HEIGHT, H_WIDTH, H_CHANNELS))
+        origin_x, origin_y = int(header[H_ORIGIN_X]), int(header[H_ORIGIN_Y])
+        # Vùng producer chụp theo tọa độ màn hình (None = toàn màn hình)
+        self.region = (origin_x, origin_y, width, height) if int(header[H_HAS_REGION]) else None
+        del header
+        self.ring = _FrameRing(self.shm, slots, height, width, channels)
+        self.stats = {'reads': 0, 'torn': 0, 'stale': 0}
+
+    @property
+    def latest_seq(self) -> int:
+        return int(self.ring.header[H_LATEST])
+
+    @property
+    def closed(self) -> bool:
+        return bool(self.ring.header[H_CLOSED])
+
+    def read(self, seq: int) -> Optional[FrameRef]:
+        """Frame có số thứ tự `seq`, hoặc None nếu đã bị ghi đè / đang được ghi."""
+        ring = self.ring
+        slot = seq % ring.slots
+        if int(ring.table[slot, S_SEQ]) != 2 * seq + 2:
+            return None
+        timestamp = int(ring.table[slot, S_TS]) / 1e9
+        ref = FrameRef(ring, seq, timestamp, ring.frames[slot])
+        # Đọc lại seq: producer có thể đã bắt đầu ghi slot này giữa hai lần đọc
+        if not ref.valid():
+            return None
+        self.stats['reads'] += 1
+        return ref
+
+    def read_latest(self) -> Optional[FrameRef]:
+        """Frame mới nhất đã ghi xong."""
+        for _ in range(self.ring.slots):
+            seq = self.latest_seq
+            if seq == 0:
+                return None
+            ref = self.read(seq)
+            if ref is not None:
+                return ref
+            self.stats['torn'] += 1
+        return None
+
+    def wait_for_new(self, after_seq: int, timeout: float = 1.0) -> Optional[FrameRef]:
+        """Chờ frame có số thứ tự > after_seq."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.latest_seq > after_seq:
+                ref = self.read_latest()
+                if ref is not None:
+                    return ref
+            time.sleep(0.002)
+        return None
+
+    def local_box(self, region: Optional[Tuple[int, int, int, int]] = None) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Đổi vùng (x, y, width, height) theo tọa độ màn hình sang tọa độ trong frame của bus
+        (region None = toàn bộ frame).
+
+        Returns:
+            Vùng trong frame, hoặc None nếu vùng nằm ngoài vùng producer chụp.
+        """
+        height, width = self.ring.shape[:2]
+        if region is None:
+            return (0, 0, width, height)
+        origin_x, origin_y = self.region[:2] if self.region else (0, 0)
+        x, y, w, h = region
+        x, y = x - origin_x, y - origin_y
+        if x < 0 or y < 0 or x + w > width or y + h > height:
+            return None
+        return (x, y, w, h)
+
+    def grab(self, region: Optional[Tuple[int, int, int, int]] = None, copy: bool = True) -> Optional[np.ndarray]:
+        """
+        Frame BGR mới nhất (hoặc một vùng), dùng làm frame_source của ImageDetector.
+
+        Args:
+            region: (x, y, width, height) theo tọa độ màn hình. None = toàn bộ vùng producer chụp
+                    (tọa độ màn hình của góc trên-trái là self.region, nếu có)
+            copy: True = chép ra buffer dùng lại của thread và chỉ trả về khi slot chưa bị ghi đè
+                  trong lúc chép. False = view zero-copy: chỉ hợp lệ đến khi producer quay vòng hết
+                  `slots` tick, người gọi phải tự kiểm tra (read_latest() + FrameRef.valid()).
+
+        Returns:
+            Ảnh BGR, hoặc None nếu bus chưa có frame đủ mới hoặc vùng nằm ngoài vùng producer chụp.
+        """
+        box = self.local_box(region)
+        if box is None:
+            return None
+        x, y, width, height = box
+        for _ in range(self.ring.slots):
+            ref = self.read_latest()
+            if ref is None:
+                return None
+            if ref.age > self.max_age:
+                self.stats['stale'] += 1
+                return None
+            view = ref.frame[y:y + height, x:x + width]
+            if not copy:
+                return view
+            frame = thread_pool().get(('bus', view.shape), view.shape, np.uint8)
+            np.copyto(frame, view)
+            if ref.valid():
+                return frame
+            self.stats['torn'] += 1  # Producer ghi đè slot trong lúc chép: lấy frame mới hơn
+        return None
+
+    def close(self):
+        self.ring.release()
+        self.shm.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Producer chụp màn hình vào frame bus (shared memory)")
+    parser.add_argument('--name', default="wwm_frames", help="Tên shared memory")
+    parser.add_argument('--fps', type=float, default=10.0, help="Số frame mỗi giây")
+    parser.add_argument('--slots', type=int, default=4, help="Số slot của ring buffer")
+    parser.add_argument('--region', default=None, help="Vùng chụp x,y,width,height (mặc định toàn màn hình)")
+    args = parser.parse_args()
+
+    region = tuple(int(v) for v in args.region.split(',')) if args.region else None
+    producer = FrameBusProducer(args.name, fps=args.fps, slots=args.slots, region=region)
+    height, width = producer.ring.shape[:2]
+    print(f"✓ Frame bus '{args.name}': {width}x{height}, {args.slots} slot, {args.fps} fps (Ctrl+C để dừng)")
+    producer.run_forever()
+    print(f"✓ Đã dừng sau {producer.stats['frames']} frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,15 @@ Sử dụng OpenCV để phát hiện ảnh mẫu trên màn hình bằng templa
 
 import cv2
 import numpy as np
-import pyautogui
-from typing import Optional, Tuple
+import os
+import time
+from typing import Dict, Optional, Sequence, Tuple
 import logging
 
+from buffer_pool import allocation_stats, thread_pool
+from match_strategies import STRATEGIES, TemplateData, load_click_offset, score_map, sidecar_path
+from metrics import CAPTURES, CAPTURE_LATENCY, MATCH_LATENCY
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -16,16 +21,251 @@ logger = logging.getLogger(__name__)
 class ImageDetector:
     """Class để phát hiện ảnh mẫu trên màn hình sử dụng template matching."""
     
-    def __init__(self, threshold: float = 0.8):
+    def __init__(self, threshold: float = 0.8, strategy: str = 'direct', cost_model=None,
+                 use_signatures: bool = True, template_modes: Optional[Dict[str, str]] = None,
+                 reuse_buffers: bool = True, frame_source=None):
         """
         Khởi tạo ImageDetector.
         
         Args:
             threshold: Ngưỡng confidence (0.0 - 1.0) để chấp nhận kết quả matching.
                       Giá trị cao hơn = chính xác hơn nhưng khó tìm thấy hơn.
+            strategy: Chiến lược matching: 'direct', 'grayscale', 'pyramid', 'fft', 'roi'
+                      hoặc 'auto' (tự chọn theo cost model cho từng template/vùng tìm kiếm).
+            cost_model: MatcherCostModel dùng cho 'auto'. None = tạo mới; với 'auto' mô hình
+                        được đọc cache hoặc hiệu chỉnh ngay tại đây, không phải ở lần match đầu.
+            use_signatures: Kiểm tra chữ ký pixel tại vị trí trúng lần trước trước khi
+                            chạy template matching đầy đủ (nhanh cho các nút cố định).
+            template_modes: {template_path: mode} với mode là 'template' (mặc định),
+                            'feature' (keypoint, chịu scale/che khuất) hoặc 'hybrid'
+                            (template matching trước, trượt thì thử keypoint).
+            reuse_buffers: Chụp/chuyển màu vào buffer dùng lại theo độ phân giải thay vì
+                           cấp phát frame mới mỗi lần poll (frame bị ghi đè ở lần chụp sau).
+            frame_source: Nguồn frame dùng chung thay cho pyautogui.screenshot, vd
+                          frame_bus.FrameBusConsumer. Cần có grab(region) -> ảnh BGR thuộc riêng
+                          detector (không bị ghi đè trong lúc match) hoặc None (chưa có frame đủ mới /
+                          vùng ngoài nguồn: detector tự chụp màn hình). Thuộc tính `region` của nguồn
+                          (nếu có) là vùng nó chụp, dùng làm vùng tìm kiếm khi không truyền region.
+        
+        Raises:
+            ValueError: strategy không phải 'auto' hay một tên trong match_strategies.STRATEGIES.
         """
+        if strategy != 'auto' and strategy not in STRATEGIES:
+            raise ValueError(f"Chiến lược matching không hợp lệ: {strategy!r} "
+                             f"(chọn 'auto' hoặc {', '.join(sorted(STRATEGIES))})")
         self.threshold = threshold
-        pyautogui.FAILSAFE = True  # Bật failsafe để dừng khi di chuột vào góc màn hình
+        self.strategy = strategy
+        self.cost_model = cost_model
+        self._templates: Dict[str, Tuple[tuple, TemplateData]] = {}
+        self._last_hits: Dict[str, Tuple[int, int]] = {}  # Góc trên-trái (tọa độ màn hình) lần trúng trước
+        self._roi_stats: Dict[str, Tuple[int, int]] = {}  # (số lần thử roi, số lần trúng)
+        self._choices: Dict[Tuple[str, int, int, bool], Tuple[int, str]] = {}
+        self.use_signatures = use_signatures
+        self.signature_stats = {'hits': 0, 'misses': 0}
+        self.template_modes: Dict[str, str] = dict(template_modes or {})
+        self._feature_matcher = None
+        self.reuse_buffers = reuse_buffers
+        self.frame_source = frame_source
+        if strategy == 'auto':
+            self._ensure_cost_model()
+    
+    def _load_template(self, template_path: str) -> Optional[TemplateData]:
+        """Đọc template và click_offset đi kèm (có cache, tự đọc lại nếu một trong hai file bị sửa)."""
+        mtime = []
+        for path in (template_path, sidecar_path(template_path)):
+            try:
+                mtime.append(os.path.getmtime(path))
+            except OSError:
+                mtime.append(None)
+        mtime = tuple(mtime)
+        cached = self._templates.get(template_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        template = cv2.imread(template_path, cv2.IMREAD_COLOR)
+        if template is None:
+            logger.error("Không thể đọc file template: %s", template_path)
+            return None
+        data = TemplateData(template)
+        if mtime[1] is not None:
+            data.click_offset = load_click_offset(template_path)
+        self._templates[template_path] = (mtime, data)
+        return data
+    
+    def _search_region(self, region: Optional[Tuple[int, int, int, int]]) -> Optional[Tuple[int, int, int, int]]:
+        """Vùng tìm kiếm thực tế: frame source chỉ chụp một vùng thì "toàn màn hình" là vùng đó."""
+        if region is None and self.frame_source is not None:
+            return getattr(self.frame_source, 'region', None)
+        return region
+    
+    def _capture(self, region: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+        """
+        Chụp màn hình (hoặc một vùng) và trả về ảnh BGR.
+        Khi reuse_buffers bật, ảnh nằm trong buffer dùng lại: hợp lệ đến lần chụp kế tiếp cùng kích thước.
+        """
+        if self.frame_source is not None:
+            frame = self.frame_source.grab(region)
+            if frame is not None:
+                return frame
+            logger.debug("Frame source chưa có frame mới, chụp màn hình trực tiếp")
+        
+        import pyautogui  # Import khi chụp thật: cần display, frame_source/simulator không cần
+        start = time.perf_counter()
+        if region:
+            x, y, width, height = region
+            screenshot = pyautogui.screenshot(region=(x, y, width, height))
+        else:
+            screenshot = pyautogui.screenshot()
+        
+        # Chuyển đổi sang numpy array và OpenCV format
+        screenshot_np = np.asarray(screenshot)
+        if self.reuse_buffers:
+            shape = screenshot_np.shape[:2] + (3,)
+            frame = thread_pool().get(('frame', shape), shape, np.uint8)
+            cv2.cvtColor(screenshot_np, cv2.COLOR_RGB2BGR, dst=frame)
+        else:
+            frame = cv2.cvtColor(screenshot_np, cv2.COLOR_RGB2BGR)
+        CAPTURES.inc()
+        CAPTURE_LATENCY.observe(time.perf_counter() - start)
+        return frame
+    
+    def _ensure_cost_model(self):
+        """Tạo cost model nếu chưa có và đọc cache / hiệu chỉnh (micro-benchmark vài giây) nếu chưa có hệ số."""
+        if self.cost_model is None:
+            from matcher_cost_model import MatcherCostModel
+            self.cost_model = MatcherCostModel()
+        if not self.cost_model.coefficients:
+            self.cost_model.load_or_calibrate()
+    
+    def maintain_cost_model(self):
+        """Kiểm tra lại / hiệu chỉnh cost model nếu cần (benchmark) - gọi giữa hai account, không trong lúc poll."""
+        if self.strategy == 'auto' and self.cost_model is not None:
+            self.cost_model.maybe_revalidate()
+    
+    def _select_strategy(self, template_path: str, template: TemplateData, frame: np.ndarray) -> str:
+        """Chọn chiến lược cho template và kích thước vùng tìm kiếm hiện tại."""
+        if self.strategy != 'auto':
+            return self.strategy
+        self._ensure_cost_model()
+        
+        fh, fw = frame.shape[:2]
+        has_hint = template_path in self._last_hits
+        key = (template_path, fw, fh, has_hint)
+        # Kiểm tra lại cost model chạy ngoài lúc match (maintain_cost_model); hiệu chỉnh lại đổi version
+        cached = self._choices.get(key)
+        if cached is not None and cached[0] == self.cost_model.version:
+            return cached[1]
+        
+        roi_hit_rate = None
+        if has_hint:
+            tries, hits = self._roi_stats.get(template_path, (0, 0))
+            roi_hit_rate = (hits + 1) / (tries + 2)  # Laplace: chưa có dữ liệu thì coi như 50%
+        choice = self.cost_model.choose(fw, fh, template.w, template.h, roi_hit_rate=roi_hit_rate)
+        self._choices[key] = (self.cost_model.version, choice)
+        logger.debug("Chiến lược cho %s (%sx%s): %s", template_path, fw, fh, choice)
+        return choice
+    
+    def _match(self, template_path: str, template: TemplateData, frame: np.ndarray,
+               region: Optional[Tuple[int, int, int, int]]) -> Tuple[float, Tuple[int, int]]:
+        """Chạy chiến lược đã chọn, trả về (score, góc trên-trái trong frame)."""
+        offset_x, offset_y = (region[0], region[1]) if region else (0, 0)
+        hint = None
+        last = self._last_hits.get(template_path)
+        if last is not None:
+            hint = (last[0] - offset_x, last[1] - offset_y)
+        
+        strategy = self._select_strategy(template_path, template, frame)
+        start = time.perf_counter()
+        max_val, max_loc = STRATEGIES[strategy](frame, template, self.threshold, hint)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        MATCH_LATENCY.observe(elapsed_ms / 1000.0, strategy=strategy)
+        
+        if strategy == 'roi' and hint is not None:
+            tries, hits = self._roi_stats.get(template_path, (0, 0))
+            hit = max_val >= self.threshold and abs(max_loc[0] - hint[0]) <= template.w and abs(max_loc[1] - hint[1]) <= template.h
+            self._roi_stats[template_path] = (tries + 1, hits + int(hit))
+        if self.cost_model is not None:
+            fh, fw = frame.shape[:2]
+            self.cost_model.observe(strategy, fw, fh, template.w, template.h, elapsed_ms)
+        
+        if max_val >= self.threshold:
+            self._last_hits[template_path] = (max_loc[0] + offset_x, max_loc[1] + offset_y)
+        return max_val, max_loc
+    
+    def _check_signature(self, template_path: str, template: TemplateData,
+                         region: Optional[Tuple[int, int, int, int]]) -> Optional[Tuple[int, int, float]]:
+        """
+        Fast path: chỉ chụp đúng ô template tại vị trí trúng lần trước và so chữ ký pixel.
+        
+        Returns:
+            (x, y, confidence) nếu chữ ký khớp, None nếu phải chạy matching đầy đủ.
+        """
+        last = self._last_hits.get(template_path)
+        if not self.use_signatures or last is None:
+            return None
+        x, y = last
+        if region:
+            rx, ry, rw, rh = region
+            if x < rx or y < ry or x + template.w > rx + rw or y + template.h > ry + rh:
+                return None
+        
+        try:
+            patch = self._capture((x, y, template.w, template.h))
+            score = template.signature.compare(patch)
+        except Exception as e:
+            # Fast path lỗi (vd vị trí cũ ra ngoài màn hình sau khi đổi độ phân giải): coi như trượt
+            logger.debug("Lỗi khi kiểm tra chữ ký pixel %s: %s", template_path, e)
+            score = None
+        if score is None:
+            self.signature_stats['misses'] += 1
+            return None
+        
+        self.signature_stats['hits'] += 1
+        center_x, center_y = template.click_point(x, y)
+        logger.debug("Chữ ký pixel khớp tại (%s, %s), độ tương đồng: %.2f", center_x, center_y, score)
+        return (center_x, center_y, score)
+    
+    def _get_feature_matcher(self):
+        """FeatureMatcher dùng chung (tạo khi lần đầu cần)."""
+        if self._feature_matcher is None:
+            from feature_matcher import FeatureMatcher
+            self._feature_matcher = FeatureMatcher()
+        return self._feature_matcher
+    
+    def _find_by_features(self, template_path: str, template: TemplateData, frame: np.ndarray,
+                          region: Optional[Tuple[int, int, int, int]]) -> Optional[Tuple[int, int, float]]:
+        """Tìm bằng keypoint: thử vùng quanh vị trí trúng lần trước, rồi toàn frame."""
+        matcher = self._get_feature_matcher()
+        offset_x, offset_y = (region[0], region[1]) if region else (0, 0)
+        
+        windows = []
+        last = self._last_hits.get(template_path)
+        if last is not None:
+            # Cửa sổ đủ rộng để chứa template phóng to ~2 lần
+            pad = max(template.w, template.h)
+            fh, fw = frame.shape[:2]
+            x0 = max(0, last[0] - offset_x - pad)
+            y0 = max(0, last[1] - offset_y - pad)
+            x1 = min(fw, last[0] - offset_x + template.w + pad)
+            y1 = min(fh, last[1] - offset_y + template.h + pad)
+            if x1 > x0 and y1 > y0:
+                windows.append((x0, y0, frame[y0:y1, x0:x1]))
+        windows.append((0, 0, frame))
+        
+        for wx, wy, window in windows:
+            result = matcher.match(window, template)
+            if result is None:
+                continue
+            # Tâm template theo homography, offset click cộng thêm (bỏ qua tỉ lệ phóng to)
+            dx, dy = template.click_offset
+            center_x = result[0] + wx + offset_x + dx
+            center_y = result[1] + wy + offset_y + dy
+            self._last_hits[template_path] = (center_x - dx - template.w // 2, center_y - dy - template.h // 2)
+            logger.info("Tìm thấy template (keypoint) tại (%s, %s) với confidence: %.2f", center_x, center_y, result[2])
+            return (center_x, center_y, result[2])
+        
+        logger.debug("Không tìm thấy template bằng keypoint: %s", template_path)
+        return None
     
     def find_template(self, template_path: str, region: Optional[Tuple[int, int, int, int]] = None) -> Optional[Tuple[int, int, float]]:
         """
@@ -40,48 +280,105 @@ class ImageDetector:
             x, y là tọa độ trung tâm của ảnh mẫu trên màn hình.
         """
         try:
+            region = self._search_region(region)
             # Đọc template image
-            template = cv2.imread(template_path, cv2.IMREAD_COLOR)
+            template = self._load_template(template_path)
             if template is None:
-                logger.error(f"Không thể đọc file template: {template_path}")
                 return None
             
-            # Chụp màn hình
-            if region:
-                x, y, width, height = region
-                screenshot = pyautogui.screenshot(region=(x, y, width, height))
-            else:
-                screenshot = pyautogui.screenshot()
-            
-            # Chuyển đổi sang numpy array và OpenCV format
-            screenshot_np = np.array(screenshot)
-            screenshot_cv = cv2.cvtColor(screenshot_np, cv2.COLOR_RGB2BGR)
+            # Nút không di chuyển: xác nhận bằng chữ ký pixel, không cần matchTemplate
+            fast = self._check_signature(template_path, template, region)
+            if fast is not None:
+                return fast
             
-            # Template matching
-            result = cv2.matchTemplate(screenshot_cv, template, cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+            # Chụp màn hình
+            screenshot_cv = self._capture(region)
+            return self._find_in(template_path, template, screenshot_cv, region)
+                
+        except Exception as e:
+            logger.error("Lỗi khi tìm template: %s", e)
+            return None
+    
+    def find_first(self, template_paths: Sequence[str],
+                   region: Optional[Tuple[int, int, int, int]] = None) -> Optional[Tuple[str, Tuple[int, int, float]]]:
+        """
+        Tìm lần lượt nhiều ảnh mẫu trên cùng một lần chụp màn hình, dừng ở ảnh đầu tiên tìm thấy.
+        
+        Args:
+            template_paths: Các ảnh mẫu theo thứ tự ưu tiên
+            region: (x, y, width, height) - Khu vực tìm kiếm. None = toàn màn hình.
+        
+        Returns:
+            (template_path, (x, y, confidence)) của ảnh đầu tiên tìm thấy, None nếu không thấy ảnh nào.
+        """
+        frame = None
+        region = self._search_region(region)
+        for template_path in template_paths:
+            try:
+                template = self._load_template(template_path)
+                if template is None:
+                    continue
+                result = self._check_signature(template_path, template, region)
+                if result is None:
+                    if frame is None:
+                        frame = self._capture(region)
+                    result = self._find_in(template_path, template, frame, region)
+                if result is not None:
+                    return template_path, result
+            except Exception as e:
+                logger.error("Lỗi khi tìm template %s: %s", template_path, e)
+        return None
+    
+    def find_in_frame(self, template_path: str, frame: np.ndarray,
+                      region: Optional[Tuple[int, int, int, int]] = None) -> Optional[Tuple[int, int, float]]:
+        """
+        Tìm ảnh mẫu trong một frame có sẵn (không chụp màn hình), vd frame từ frame bus
+        hoặc frame gửi sang worker của DetectionFarm.
+        
+        Args:
+            template_path: Đường dẫn đến file ảnh mẫu
+            frame: Ảnh BGR
+            region: (x, y, width, height) - vị trí của frame trên màn hình (để quy đổi tọa độ)
+        
+        Returns:
+            Tuple (x, y, confidence) theo tọa độ màn hình, None nếu không tìm thấy.
+        """
+        try:
+            template = self._load_template(template_path)
+            if template is None:
+                return None
+            return self._find_in(template_path, template, frame, region)
+        except Exception as e:
+            logger.error("Lỗi khi tìm template: %s", e)
+            return None
+    
+    def _find_in(self, template_path: str, template: TemplateData, screenshot_cv: np.ndarray,
+                 region: Optional[Tuple[int, int, int, int]]) -> Optional[Tuple[int, int, float]]:
+        """Template matching (và keypoint theo mode) trên frame đã chụp."""
+        mode = self.template_modes.get(template_path, 'template')
+        
+        # Template matching
+        if mode != 'feature':
+            max_val, max_loc = self._match(template_path, template, screenshot_cv, region)
             
             # Kiểm tra confidence
             if max_val >= self.threshold:
-                # Tính tọa độ trung tâm của template
-                template_h, template_w = template.shape[:2]
-                center_x = max_loc[0] + template_w // 2
-                center_y = max_loc[1] + template_h // 2
+                # Tọa độ click: tâm template (+ click_offset nếu template đã thu nhỏ)
+                center_x, center_y = template.click_point(*max_loc)
                 
                 # Điều chỉnh tọa độ nếu có region
                 if region:
                     center_x += region[0]
                     center_y += region[1]
                 
-                logger.info(f"Tìm thấy template tại ({center_x}, {center_y}) với confidence: {max_val:.2f}")
+                logger.info("Tìm thấy template tại (%s, %s) với confidence: %.2f", center_x, center_y, max_val)
                 return (center_x, center_y, max_val)
-            else:
-                logger.debug(f"Không tìm thấy template. Confidence cao nhất: {max_val:.2f} < {self.threshold}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Lỗi khi tìm template: {str(e)}")
-            return None
+            logger.debug("Không tìm thấy template. Confidence cao nhất: %.2f < %s", max_val, self.threshold)
+        
+        # Keypoint matching (template bị scale/che khuất/đổi skin)
+        if mode in ('feature', 'hybrid'):
+            return self._find_by_features(template_path, template, screenshot_cv, region)
+        return None
     
     def find_all_templates(self, template_path: str, region: Optional[Tuple[int, int, int, int]] = None) -> list:
         """
@@ -95,25 +392,19 @@ class ImageDetector:
             List các tuple (x, y, confidence) của tất cả các vị trí tìm thấy.
         """
         try:
+            region = self._search_region(region)
             # Đọc template image
-            template = cv2.imread(template_path, cv2.IMREAD_COLOR)
-            if template is None:
-                logger.error(f"Không thể đọc file template: {template_path}")
+            template_data = self._load_template(template_path)
+            if template_data is None:
                 return []
+            template = template_data.bgr
+            offset_x, offset_y = template_data.click_offset
             
             # Chụp màn hình
-            if region:
-                x, y, width, height = region
-                screenshot = pyautogui.screenshot(region=(x, y, width, height))
-            else:
-                screenshot = pyautogui.screenshot()
-            
-            # Chuyển đổi sang numpy array và OpenCV format
-            screenshot_np = np.array(screenshot)
-            screenshot_cv = cv2.cvtColor(screenshot_np, cv2.COLOR_RGB2BGR)
+            screenshot_cv = self._capture(region)
             
-            # Template matching
-            result = cv2.matchTemplate(screenshot_cv, template, cv2.TM_CCOEFF_NORMED)
+            # Template matching (cần toàn bộ score map nên luôn dùng direct)
+            result = score_map(screenshot_cv, template)
             
             # Tìm tất cả các vị trí có confidence >= threshold
             locations = np.where(result >= self.threshold)
@@ -123,8 +414,8 @@ class ImageDetector:
             
             for pt in zip(*locations[::-1]):  # Switch x and y coordinates
                 confidence = result[pt[1], pt[0]]
-                center_x = pt[0] + template_w // 2
-                center_y = pt[1] + template_h // 2
+                center_x = pt[0] + template_w // 2 + offset_x
+                center_y = pt[1] + template_h // 2 + offset_y
                 
                 # Điều chỉnh tọa độ nếu có region
                 if region:
@@ -136,11 +427,11 @@ class ImageDetector:
             # Loại bỏ các match quá gần nhau (non-maximum suppression đơn giản)
             filtered_matches = self._filter_nearby_matches(matches, template_w, template_h)
             
-            logger.info(f"Tìm thấy {len(filtered_matches)} vị trí khớp với template")
+            logger.info("Tìm thấy %s vị trí khớp với template", len(filtered_matches))
             return filtered_matches
                 
         except Exception as e:
-            logger.error(f"Lỗi khi tìm template: {str(e)}")
+            logger.error("Lỗi khi tìm template: %s", e)
             return []
     
     def _filter_nearby_matches(self, matches: list, template_w: int, template_h: int, min_distance: int = 10) -> list:
@@ -179,11 +470,41 @@ class ImageDetector:
         
         return filtered
     
+    def allocation_stats(self) -> Dict[str, int]:
+        """
+        Thống kê cấp phát buffer (số lần cấp phát/dùng lại, số byte, dung lượng đang giữ)
+        và số page fault của process, để theo dõi memory churn khi chạy nhiều instance.
+        """
+        return allocation_stats()
+    
     def set_threshold(self, threshold: float):
         """Thay đổi threshold cho template matching."""
         if 0.0 <= threshold <= 1.0:
             self.threshold = threshold
-            logger.info(f"Đã đặt threshold mới: {threshold}")
+            logger.info("Đã đặt threshold mới: %s", threshold)
         else:
-            logger.warning(f"Threshold phải trong khoảng [0.0, 1.0]. Giữ nguyên: {self.threshold}")
-
+            logger.warning("Threshold phải trong khoảng [0.0, 1.0]. Giữ nguyên: %s", self.threshold)
+    
+    def set_strategy(self, strategy: str):
+        """Thay đổi chiến lược matching ('auto' hoặc một tên trong match_strategies.STRATEGIES)."""
+        if strategy == 'auto' or strategy in STRATEGIES:
+            self.strategy = strategy
+            self._choices.clear()
+            if strategy == 'auto':
+                self._ensure_cost_model()
+            logger.info("Đã đặt chiến lược matching: %s", strategy)
+        else:
+            logger.warning("Chiến lược không hợp lệ: %s. Giữ nguyên: %s", strategy, self.strategy)
+    
+    def set_template_mode(self, template_path: str, mode: str):
+        """Chọn cách phát hiện cho một template: 'template', 'feature' hoặc 'hybrid'."""
+        if mode not in ('template', 'feature', 'hybrid'):
+            logger.warning("Mode không hợp lệ: %s. Giữ nguyên cho %s", mode, template_path)
+            return
+        self.template_modes[template_path] = mode
+        if mode != 'template':
+            # Tính sẵn descriptor để lần tìm đầu tiên không phải trả chi phí này
+            template = self._load_template(template_path)
+            if template is not None:
+                self._get_feature_matcher().template_features(template)
+        logger.info("Đã đặt mode '%s' cho template: %s", mode, template_path)
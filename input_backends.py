@@ -0,0 +1,322 @@
+"""
+Input Backends Module
+Các cách gửi input tới game, cùng một interface và được dựng một lần khi khởi động:
+PostMessage (thẳng vào cửa sổ, không cần focus), SendInput (cấu trúc ctypes và
+kích thước màn hình chuẩn bị sẵn), pyautogui, và FakeInputBackend chỉ ghi lại
+thao tác để chạy thử trên Linux / trong simulator.
+
+ScreenAutomation chọn backend một lần cho mỗi cửa sổ (select_backend) thay vì
+thử lần lượt PostMessage → SendInput → mouse_event → pyautogui ở mỗi lần click.
+"""
+
+import logging
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import win32api
+    import win32con
+    import win32gui
+    WIN32_AVAILABLE = True
+except ImportError:
+    WIN32_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Thời gian giữ nút chuột (game thường bỏ qua click quá nhanh)
+PRESS_HOLD = 0.05
+
+_pyautogui = None
+
+
+def load_pyautogui():
+    """
+    pyautogui, import ở lần dùng đầu tiên: import cần display (Linux không có X báo
+    KeyError 'DISPLAY') nên simulator và FakeInputBackend chạy được mà không cần nó.
+    """
+    global _pyautogui
+    if _pyautogui is None:
+        import pyautogui
+        pyautogui.FAILSAFE = True  # Dừng khi di chuột vào góc màn hình
+        pyautogui.PAUSE = 0.1  # Pause ngắn giữa các action
+        _pyautogui = pyautogui
+    return _pyautogui
+
+# ---------------------------------------------------------------- ctypes SendInput
+# Định nghĩa một lần khi import, không dựng lại ở mỗi lần click
+
+if sys.platform == 'win32':
+    import ctypes
+    from ctypes import wintypes
+
+    class MOUSEINPUT(ctypes.Structure):
+        _fields_ = [
+            ("dx", wintypes.LONG),
+            ("dy", wintypes.LONG),
+            ("mouseData", wintypes.DWORD),
+            ("dwFlags", wintypes.DWORD),
+            ("time", wintypes.DWORD),
+            ("dwExtraInfo", ctypes.POINTER(wintypes.ULONG))
+        ]
+
+    class INPUT(ctypes.Structure):
+        class _INPUT(ctypes.Union):
+            _fields_ = [("mi", MOUSEINPUT)]
+        _anonymous_ = ("_input",)
+        _fields_ = [
+            ("type", wintypes.DWORD),
+            ("_input", _INPUT)
+        ]
+
+    INPUT_SIZE = ctypes.sizeof(INPUT)
+    INPUT_MOUSE = 0
+    MOUSEEVENTF_MOVE = 0x0001
+    MOUSEEVENTF_ABSOLUTE = 0x8000
+    BUTTON_FLAGS = {
+        'left': (0x0002, 0x0004),
+        'right': (0x0008, 0x0010),
+        'middle': (0x0020, 0x0040),
+    }
+
+
+def find_window(window_title: str) -> int:
+    """Tìm hwnd theo tiêu đề (khớp chính xác trước, rồi khớp một phần). 0 nếu không thấy."""
+    if not WIN32_AVAILABLE:
+        return 0
+    hwnd = win32gui.FindWindow(None, window_title)
+    if hwnd == 0:
+        # Thử tìm theo partial match
+        def callback(hwnd, windows):
+            if win32gui.IsWindowVisible(hwnd):
+                title = win32gui.GetWindowText(hwnd)
+                if window_title.lower() in title.lower():
+                    windows.append(hwnd)
+            return True
+        windows = []
+        win32gui.EnumWindows(callback, windows)
+        if windows:
+            hwnd = windows[0]
+    return hwnd
+
+
+class InputBackend:
+    """
+    Interface chung. click() báo lỗi bằng exception; thao tác bàn phím mặc định dùng
+    pyautogui (trên Windows pyautogui cũng gửi bằng SendInput).
+    """
+
+    name = 'base'
+    # Các thao tác không cần cửa sổ ở foreground (chạy song song được qua InputDispatcher)
+    focus_free_ops: Tuple[str, ...] = ()
+
+    def available(self, window_title: Optional[str] = None) -> bool:
+        """Backend dùng được cho cửa sổ này không (kiểm tra một lần khi chọn backend)."""
+        return True
+
+    def needs_focus(self, op: str) -> bool:
+        return op not in self.focus_free_ops
+
+    def click(self, x: int, y: int, button: str = 'left', clicks: int = 1, interval: float = 0.0):
+        raise NotImplementedError
+
+    def press(self, key: str):
+        load_pyautogui().press(key)
+
+    def hotkey(self, *keys: str):
+        load_pyautogui().hotkey(*keys)
+
+    def write(self, text: str, interval: float = 0.01):
+        load_pyautogui().write(text, interval=interval)
+
+
+class PyAutoGUIBackend(InputBackend):
+    """Di chuột rồi mouseDown/mouseUp bằng pyautogui (chạy mọi nền tảng)."""
+
+    name = 'pyautogui'
+
+    def click(self, x: int, y: int, button: str = 'left', clicks: int = 1, interval: float = 0.0):
+        pyautogui = load_pyautogui()
+        pyautogui.moveTo(x, y, duration=0.1)
+        time.sleep(0.05)
+
+        # Click bằng mouseDown/mouseUp
+        for i in range(clicks):
+            pyautogui.mouseDown(button=button)
+            time.sleep(PRESS_HOLD)
+            pyautogui.mouseUp(button=button)
+            # Chờ interval giữa các lần click (nếu có nhiều clicks)
+            if interval > 0 and i < clicks - 1:
+                time.sleep(interval)
+
+
+class SendInputBackend(InputBackend):
+    """SendInput với INPUT dựng sẵn; kích thước màn hình đọc một lần (refresh_metrics khi đổi độ phân giải)."""
+
+    name = 'sendinput'
+
+    def __init__(self):
+        self._user32 = ctypes.windll.user32 if sys.platform == 'win32' else None
+        self._move = INPUT(type=INPUT_MOUSE) if sys.platform == 'win32' else None
+        self._button = INPUT(type=INPUT_MOUSE) if sys.platform == 'win32' else None
+        self.screen_width = self.screen_height = 0
+        if self._user32 is not None:
+            self.refresh_metrics()
+
+    def available(self, window_title: Optional[str] = None) -> bool:
+        return self._user32 is not None
+
+    def refresh_metrics(self):
+        """Đọc lại kích thước màn hình chính."""
+        self.screen_width = self._user32.GetSystemMetrics(0)
+        self.screen_height = self._user32.GetSystemMetrics(1)
+
+    def _send(self, event: "INPUT", flags: int, abs_x: int, abs_y: int):
+        event.mi.dx = abs_x
+        event.mi.dy = abs_y
+        event.mi.dwFlags = MOUSEEVENTF_ABSOLUTE | flags
+        if self._user32.SendInput(1, ctypes.byref(event), INPUT_SIZE) != 1:
+            raise OSError(f"SendInput bị chặn (lỗi {ctypes.GetLastError()})")
+
+    def click(self, x: int, y: int, button: str = 'left', clicks: int = 1, interval: float = 0.0):
+        # Chuyển đổi tọa độ sang hệ 0..65535
+        abs_x = int((x * 65535) / self.screen_width)
+        abs_y = int((y * 65535) / self.screen_height)
+        down_flag, up_flag = BUTTON_FLAGS.get(button, BUTTON_FLAGS['left'])
+
+        self._send(self._move, MOUSEEVENTF_MOVE, abs_x, abs_y)
+        time.sleep(0.05)
+        for i in range(clicks):
+            self._send(self._button, down_flag, abs_x, abs_y)
+            time.sleep(PRESS_HOLD)
+            self._send(self._button, up_flag, abs_x, abs_y)
+            if interval > 0 and i < clicks - 1:
+                time.sleep(interval)
+
+
+class PostMessageBackend(InputBackend):
+    """
+    Click bằng PostMessage thẳng vào cửa sổ game. Với background=True click không cần
+    focus (chạy song song giữa các client); bàn phím vẫn đi qua pyautogui nên cần focus.
+    """
+
+    name = 'postmessage'
+    MESSAGES = {
+        'left': ('WM_LBUTTONDOWN', 'WM_LBUTTONUP', 'MK_LBUTTON'),
+        'right': ('WM_RBUTTONDOWN', 'WM_RBUTTONUP', 'MK_RBUTTON'),
+        'middle': ('WM_MBUTTONDOWN', 'WM_MBUTTONUP', 'MK_MBUTTON'),
+    }
+
+    def __init__(self, window_title: str, background: bool = False):
+        self.window_title = window_title
+        self.background = background
+        self.focus_free_ops = ('click',) if background else ()
+        self.hwnd = 0
+
+    def available(self, window_title: Optional[str] = None) -> bool:
+        if not (sys.platform == 'win32' and WIN32_AVAILABLE and self.window_title):
+            return False
+        self.hwnd = find_window(self.window_title)
+        return self.hwnd != 0
+
+    def click(self, x: int, y: int, button: str = 'left', clicks: int = 1, interval: float = 0.0):
+        if not win32gui.IsWindow(self.hwnd):
+            # Client được mở lại: tìm lại cửa sổ
+            self.hwnd = find_window(self.window_title)
+            if self.hwnd == 0:
+                raise OSError(f"Không tìm thấy cửa sổ {self.window_title}")
+        # Chuyển đổi tọa độ màn hình sang tọa độ cửa sổ
+        left, top, _, _ = win32gui.GetWindowRect(self.hwnd)
+        lparam = win32api.MAKELONG(x - left, y - top)
+        down, up, mk = (getattr(win32con, n) for n in self.MESSAGES.get(button, self.MESSAGES['left']))
+        for i in range(clicks):
+            win32gui.PostMessage(self.hwnd, down, mk, lparam)
+            time.sleep(PRESS_HOLD)
+            win32gui.PostMessage(self.hwnd, up, 0, lparam)
+            if interval > 0 and i < clicks - 1:
+                time.sleep(interval)
+
+
+class FakeInputBackend(InputBackend):
+    """Không gửi input thật, chỉ ghi lại (test trên Linux, simulator). Không cần focus."""
+
+    name = 'fake'
+    focus_free_ops = ('click', 'press', 'hotkey', 'write')
+
+    def __init__(self, listener=None):
+        """
+        Args:
+            listener: Hàm listener(event) tùy chọn, gọi với mỗi thao tác
+                      (vd simulator phản ứng với click)
+        """
+        self.events: List[dict] = []
+        self.listener = listener
+
+    def _record(self, op: str, **fields):
+        event = {'op': op, 't': time.monotonic()}
+        event.update(fields)
+        self.events.append(event)
+        if self.listener is not None:
+            self.listener(event)
+
+    def click(self, x: int, y: int, button: str = 'left', clicks: int = 1, interval: float = 0.0):
+        self._record('click', x=x, y=y, button=button, clicks=clicks)
+
+    def press(self, key: str):
+        self._record('press', key=key)
+
+    def hotkey(self, *keys: str):
+        self._record('hotkey', keys=keys)
+
+    def write(self, text: str, interval: float = 0.01):
+        self._record('write', text=text)
+
+    def clear(self):
+        self.events.clear()
+
+
+# Thứ tự ưu tiên mặc định khi chọn backend cho một cửa sổ
+DEFAULT_PREFERENCE = ('postmessage', 'sendinput', 'pyautogui')
+
+_shared: Dict[str, InputBackend] = {}
+
+
+def _shared_backend(name: str) -> InputBackend:
+    """Backend không gắn cửa sổ (dựng một lần cho cả process)."""
+    backend = _shared.get(name)
+    if backend is None:
+        backend = _shared[name] = {'sendinput': SendInputBackend, 'pyautogui': PyAutoGUIBackend,
+                                   'fake': FakeInputBackend}[name]()
+    return backend
+
+
+def select_backend(window_title: Optional[str], preference: Sequence[str] = DEFAULT_PREFERENCE,
+                   background: bool = False, exclude: Sequence[str] = ()) -> InputBackend:
+    """
+    Chọn backend đầu tiên dùng được cho cửa sổ theo thứ tự ưu tiên.
+
+    Args:
+        window_title: Cửa sổ đích (None = input toàn cục, bỏ qua PostMessage)
+        preference: Tên backend theo thứ tự ưu tiên: 'postmessage', 'sendinput', 'pyautogui', 'fake'
+        background: PostMessage không focus cửa sổ
+        exclude: Các backend đã hỏng với cửa sổ này
+
+    Returns:
+        Backend được chọn (pyautogui nếu không có backend nào khác dùng được).
+    """
+    for name in preference:
+        if name in exclude:
+            continue
+        if name == 'postmessage':
+            if not window_title:
+                continue
+            backend = PostMessageBackend(window_title, background=background)
+        else:
+            backend = _shared_backend(name)
+        try:
+            if backend.available(window_title):
+                logger.info("Backend input cho %s: %s", window_title or 'toàn màn hình', backend.name)
+                return backend
+        except Exception as e:
+            logger.warning("Backend %s không dùng được: %s", name, e)
+    return _shared_backend('pyautogui')
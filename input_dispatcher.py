@@ -0,0 +1,191 @@
+"""
+Input Dispatcher Module
+Hàng đợi thao tác input (click, nhấn phím, paste) theo từng cửa sổ đích. Mỗi cửa
+sổ có một thread xử lý riêng nên thao tác của cùng một client luôn đúng thứ tự;
+thao tác cần foreground (focus cửa sổ, SendInput, pyautogui) giữ một khóa focus
+chung để hai client không giành focus/con trỏ của nhau, còn thao tác không cần
+focus (PostMessage vào cửa sổ) chạy song song giữa các cửa sổ.
+
+Ví dụ:
+    dispatcher = InputDispatcher(focus=automation.focus_window)
+    future = dispatcher.submit("Client 1", do_click, x, y, needs_focus=True, name="click")
+    future.result()           # chờ xong
+    dispatcher.latency()      # latency trung bình theo cửa sổ
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+INPUT_LATENCY = REGISTRY.histogram('wwm_input_seconds', 'Thoi gian thao tac input theo giai doan',
+                                   ('phase',), buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1,
+                                                        0.25, 0.5, 1.0, 2.5, 5.0))
+
+_STOP = object()
+
+
+class _Action:
+    """Một thao tác trong hàng đợi."""
+
+    __slots__ = ('name', 'fn', 'args', 'kwargs', 'needs_focus', 'future', 'submitted_at')
+
+    def __init__(self, name, fn, args, kwargs, needs_focus):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.needs_focus = needs_focus
+        self.future: Future = Future()
+        self.submitted_at = time.perf_counter()
+
+
+class InputDispatcher:
+    """Điều phối input theo cửa sổ: tuần tự trong một cửa sổ, chỉ tuần tự hóa thao tác cần focus."""
+
+    def __init__(self, focus: Optional[Callable[[str], bool]] = None, refocus_every: bool = False):
+        """
+        Khởi tạo InputDispatcher.
+
+        Args:
+            focus: Hàm focus(window) -> bool đưa cửa sổ lên foreground (gọi khi giữ khóa focus)
+            refocus_every: True để focus lại trước mọi thao tác cần focus; False chỉ focus
+                           khi thao tác trước đó giữ focus là của cửa sổ khác
+        """
+        self.focus = focus
+        self.refocus_every = refocus_every
+        self.focus_lock = threading.Lock()
+        self._focused: Optional[str] = None
+        self._queues: Dict[Optional[str], queue.Queue] = {}
+        self._threads: Dict[Optional[str], threading.Thread] = {}
+        self._lock = threading.Lock()
+        self.stats: Dict[Optional[str], dict] = {}
+
+    def submit(self, window: Optional[str], fn: Callable, *args, needs_focus: bool = True,
+               name: Optional[str] = None, **kwargs) -> Future:
+        """
+        Đưa một thao tác vào hàng đợi của cửa sổ.
+
+        Args:
+            window: Cửa sổ đích (None = không gắn cửa sổ, vd input toàn cục)
+            fn: Hàm thực hiện thao tác, gọi fn(*args, **kwargs) ở thread của cửa sổ
+            needs_focus: True nếu thao tác cần cửa sổ ở foreground (giữ khóa focus khi chạy)
+            name: Tên thao tác cho thống kê (mặc định tên hàm)
+
+        Returns:
+            Future trả về giá trị của fn (hoặc exception của fn).
+        """
+        action = _Action(name or getattr(fn, '__name__', 'action'), fn, args, kwargs, needs_focus)
+        self._queue_for(window).put(action)
+        return action.future
+
+    def _queue_for(self, window: Optional[str]) -> queue.Queue:
+        with self._lock:
+            q = self._queues.get(window)
+            if q is None:
+                q = self._queues[window] = queue.Queue()
+                self.stats[window] = {'actions': 0, 'failed': 0, 'focus_actions': 0, 'refocus': 0,
+                                      'queue_time': 0.0, 'focus_wait': 0.0, 'run_time': 0.0}
+                thread = threading.Thread(target=self._worker, args=(window, q),
+                                          name=f"Input[{window or '*'}]", daemon=True)
+                self._threads[window] = thread
+                thread.start()
+            return q
+
+    def _worker(self, window: Optional[str], q: queue.Queue):
+        """Xử lý tuần tự các thao tác của một cửa sổ."""
+        stats = self.stats[window]
+        while True:
+            action = q.get()
+            if action is _STOP:
+                return
+            if not action.future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            queue_time = started - action.submitted_at
+            focus_wait = 0.0
+            try:
+                if action.needs_focus:
+                    self.focus_lock.acquire()
+                    focus_wait = time.perf_counter() - started
+                    try:
+                        self._ensure_focus(window)
+                        result = action.fn(*action.args, **action.kwargs)
+                    finally:
+                        self.focus_lock.release()
+                else:
+                    result = action.fn(*action.args, **action.kwargs)
+                action.future.set_result(result)
+            except BaseException as e:
+                stats['failed'] += 1
+                logger.warning("Thao tác '%s' trên cửa sổ %r lỗi: %s", action.name, window, e)
+                action.future.set_exception(e)
+            run_time = time.perf_counter() - started - focus_wait
+
+            stats['actions'] += 1
+            stats['focus_actions'] += int(action.needs_focus)
+            stats['queue_time'] += queue_time
+            stats['focus_wait'] += focus_wait
+            stats['run_time'] += run_time
+            INPUT_LATENCY.observe(queue_time, phase='queue')
+            INPUT_LATENCY.observe(focus_wait, phase='focus_wait')
+            INPUT_LATENCY.observe(run_time, phase='run')
+
+    def _ensure_focus(self, window: Optional[str]):
+        """Đưa cửa sổ lên foreground nếu cần (đang giữ khóa focus)."""
+        if window is None or self.focus is None:
+            return
+        if self.refocus_every or self._focused != window:
+            self.stats[window]['refocus'] += 1
+            self.focus(window)
+            self._focused = window
+
+    def invalidate_focus(self):
+        """Báo rằng focus có thể đã bị đổi từ bên ngoài (lần sau sẽ focus lại)."""
+        self._focused = None
+
+    def latency(self) -> Dict[Optional[str], dict]:
+        """Latency trung bình (ms) theo cửa sổ: chờ hàng đợi, chờ khóa focus, thực hiện."""
+        summary = {}
+        for window, stats in list(self.stats.items()):
+            n = stats['actions'] or 1
+            summary[window] = {
+                'actions': stats['actions'],
+                'queue_ms': stats['queue_time'] / n * 1000.0,
+                'focus_wait_ms': stats['focus_wait'] / n * 1000.0,
+                'run_ms': stats['run_time'] / n * 1000.0,
+            }
+        return summary
+
+    def shutdown(self, wait: bool = True):
+        """Dừng các thread sau khi xử lý hết thao tác đã nhận."""
+        with self._lock:
+            threads = list(self._threads.values())
+            for q in self._queues.values():
+                q.put(_STOP)
+            self._queues.clear()
+            self._threads.clear()
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+_default: Optional[InputDispatcher] = None
+_default_lock = threading.Lock()
+
+
+def default_dispatcher(focus: Optional[Callable[[str], bool]] = None) -> InputDispatcher:
+    """Dispatcher dùng chung trong process (mọi ScreenAutomation cùng tranh một khóa focus)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = InputDispatcher(focus=focus)
+        elif _default.focus is None:
+            _default.focus = focus
+        return _default
@@ -0,0 +1,314 @@
+"""
+Log Pipeline Module
+Logging không chặn cho vòng lặp chính: thread đang chụp/click chỉ tạo LogRecord và
+đẩy vào queue, còn việc ghép chuỗi (%-format), ghi console/file/JSON lines do một
+thread nền làm. Các dòng lặp lại giống hệt (vd cùng một dòng retry) bị gộp lại trong
+một khoảng thời gian thay vì in ra hàng trăm lần.
+
+Cách dùng:
+    python run.py --log-file=logs/run.log --log-json=logs/run.jsonl --log-level=DEBUG
+
+Trong code:
+    import log_pipeline
+    log_pipeline.setup(json_file="logs/run.jsonl")
+    with log_pipeline.capture_prints():   # print() của runner cũng đi qua queue
+        runner.run_loop(0)
+    log_pipeline.shutdown()
+"""
+
+import atexit
+import contextlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import List, Optional, Sequence
+
+# Logger nhận các dòng print() khi capture_prints() đang bật
+CONSOLE_LOGGER = 'console'
+
+LIBRARY_FORMAT = '%(levelname)s:%(name)s:%(message)s'  # Giống logging.basicConfig
+FILE_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler không format record ở thread gọi log (để thread listener làm)."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Queue trong cùng process nên không cần pickle: giữ nguyên msg/args/exc_info
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Thread ghi log không theo kịp: bỏ record thay vì chặn vòng lặp chính
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Gộp các record giống hệt nhau (cùng logger, level, msg, args): trong mỗi khoảng
+    `interval` giây chỉ cho qua `burst` record đầu tiên, số record bị bỏ được ghi vào
+    record.suppressed của record tiếp theo được cho qua.
+    """
+
+    def __init__(self, interval: float = 10.0, burst: int = 3, exempt: Sequence[str] = (CONSOLE_LOGGER,),
+                 max_keys: int = 2048):
+        """
+        Khởi tạo RateLimitFilter.
+
+        Args:
+            interval: Độ dài khoảng gộp (giây)
+            burst: Số record giống nhau được cho qua trong mỗi khoảng
+            exempt: Tên logger không giới hạn (mặc định các dòng print: banner, dòng trống lặp lại là
+                    bình thường). Dòng lặp lại của runner (retry, poll trượt) đi qua logger của module
+                    với tham số %-style nên được gộp
+            max_keys: Số loại record nhớ tối đa (quá thì xóa các loại đã hết khoảng)
+        """
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.exempt = frozenset(exempt)
+        self.max_keys = max_keys
+        self._seen = {}  # key -> [bắt đầu khoảng, số record trong khoảng, số record bị bỏ]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.name in self.exempt:
+            return True
+        key = (record.name, record.levelno, record.msg, record.args)
+        try:
+            hash(key)
+        except TypeError:
+            return True  # args không hash được (list, ndarray, ...): không giới hạn
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is None or now - entry[0] >= self.interval:
+                if entry is not None and entry[2]:
+                    record.suppressed = entry[2]
+                self._seen[key] = [now, 1, 0]
+                if len(self._seen) > self.max_keys:
+                    self._prune(now)
+                return True
+            entry[1] += 1
+            if entry[1] <= self.burst:
+                return True
+            entry[2] += 1
+            return False
+
+    def _prune(self, now: float):
+        for key in [key for key, entry in self._seen.items() if now - entry[0] >= self.interval]:
+            del self._seen[key]
+        if len(self._seen) > self.max_keys // 2:
+            # Toàn record khác nhau (vd tọa độ thay đổi): quên hết, tránh quét lại ở mỗi record
+            self._seen.clear()
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Dòng print giữ nguyên, log của thư viện theo định dạng basicConfig; ghi chú số dòng đã gộp."""
+
+    def __init__(self, fmt: str = LIBRARY_FORMAT):
+        super().__init__(fmt)
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = record.getMessage() if record.name == CONSOLE_LOGGER else super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            text += f" (đã gộp {suppressed} dòng giống hệt)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Mỗi record một dòng JSON: ts, level, logger, msg (+ suppressed, exc nếu có)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {'ts': round(record.created, 3), 'level': record.levelname,
+                 'logger': record.name, 'msg': record.getMessage()}
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _PrintToLog:
+    """sys.stdout thay thế: mỗi dòng print() thành một record của logger 'console'."""
+
+    def __init__(self, original):
+        self._original = original
+        self._logger = logging.getLogger(CONSOLE_LOGGER)
+        self._buffer = ''
+        self.encoding = getattr(original, 'encoding', 'utf-8')
+
+    def write(self, text: str) -> int:
+        self._buffer += text
+        if '\n' in self._buffer:
+            *lines, self._buffer = self._buffer.split('\n')
+            for line in lines:
+                self._logger.info(line)
+        return len(text)
+
+    def flush(self):
+        pass  # Dòng chưa xong chờ '\n'; thread listener tự flush console
+
+    def close_line(self):
+        if self._buffer:
+            self._logger.info(self._buffer)
+            self._buffer = ''
+
+    def isatty(self) -> bool:
+        return False
+
+    def fileno(self) -> int:
+        return self._original.fileno()
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DeferredQueueHandler] = None
+_handlers: List[logging.Handler] = []
+_console_handlers: List[logging.Handler] = []
+_stdout = None  # sys.stdout thật (khi capture_prints đang bật)
+
+
+def setup(level: int = logging.INFO, log_file: Optional[str] = None, json_file: Optional[str] = None,
+          console: bool = True, rate_interval: float = 10.0, rate_burst: int = 3,
+          queue_size: int = 10000) -> logging.handlers.QueueListener:
+    """
+    Chuyển root logger sang queue + thread ghi nền (thay handler của basicConfig).
+
+    Args:
+        level: Level của root logger
+        log_file: File log dạng text (None = không ghi)
+        json_file: File log JSON lines (None = không ghi)
+        console: Ghi ra console (print -> stdout, log thư viện -> stderr như trước)
+        rate_interval: Khoảng gộp dòng lặp lại (giây, 0 = không gộp)
+        rate_burst: Số dòng giống hệt được in trong mỗi khoảng
+        queue_size: Số record chờ tối đa; quá thì bỏ record mới thay vì chặn
+
+    Returns:
+        QueueListener đang chạy.
+    """
+    global _listener, _queue_handler, _handlers, _console_handlers
+    shutdown()
+
+    handlers: List[logging.Handler] = []
+    if console:
+        out = logging.StreamHandler(sys.stdout)
+        out.addFilter(lambda record: record.name == CONSOLE_LOGGER)
+        out.setFormatter(ConsoleFormatter())
+        err = logging.StreamHandler(sys.stderr)
+        err.addFilter(lambda record: record.name != CONSOLE_LOGGER)
+        err.setFormatter(ConsoleFormatter())
+        handlers += [out, err]
+    console_handlers = list(handlers)
+    for path, formatter in ((log_file, ConsoleFormatter(FILE_FORMAT)), (json_file, JsonFormatter())):
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = logging.FileHandler(path, encoding='utf-8')
+            handler.setFormatter(formatter)
+            handlers.append(handler)
+
+    log_queue: queue.Queue = queue.Queue(queue_size)
+    _queue_handler = DeferredQueueHandler(log_queue)
+    if rate_interval > 0:
+        _queue_handler.addFilter(RateLimitFilter(rate_interval, rate_burst))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    logging.getLogger(CONSOLE_LOGGER).setLevel(logging.INFO)  # Dòng print luôn hiện dù level cao hơn
+
+    _handlers, _console_handlers = handlers, console_handlers
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+    return _listener
+
+
+def setup_from_argv(argv: Optional[List[str]] = None) -> logging.handlers.QueueListener:
+    """
+    Gỡ các cờ --log-file=, --log-json=, --log-level= khỏi argv rồi gọi setup().
+    Các tham số còn lại giữ nguyên vị trí cho script.
+    """
+    argv = sys.argv if argv is None else argv
+    options = {}
+    for arg in list(argv[1:]):
+        name, _, value = arg.partition('=')
+        if name in ('--log-file', '--log-json', '--log-level') and value:
+            options[name] = value
+            argv.remove(arg)
+    level = options.get('--log-level', 'INFO').upper()
+    return setup(level=getattr(logging, level, logging.INFO), log_file=options.get('--log-file'),
+                 json_file=options.get('--log-json'))
+
+
+@contextlib.contextmanager
+def redirect_console(handler: logging.Handler):
+    """
+    Tạm thay phần ghi console bằng handler khác trong khối with (vd vùng log của dashboard),
+    các sink file/JSON lines giữ nguyên. Không tác dụng khi chưa setup().
+    """
+    if _listener is None:
+        yield
+        return
+    previous = _listener.handlers
+    # Gán cả tuple một lần: thread listener đọc handlers ở mỗi record, không cần khóa
+    _listener.handlers = tuple(h for h in previous if h not in _console_handlers) + (handler,)
+    try:
+        yield
+    finally:
+        _listener.handlers = previous
+
+
+@contextlib.contextmanager
+def capture_prints():
+    """
+    Cho print() đi qua queue trong khối with (không tác dụng khi chưa setup()).
+    Chỉ bật quanh vòng lặp chính: input() cần stdout thật để hiện câu hỏi.
+    """
+    global _stdout
+    if _listener is None or _stdout is not None:
+        yield
+        return
+    _stdout = sys.stdout
+    writer = _PrintToLog(_stdout)
+    sys.stdout = writer
+    try:
+        yield
+    finally:
+        writer.close_line()
+        sys.stdout, _stdout = _stdout, None
+
+
+def shutdown():
+    """Ghi hết các record đang chờ, dừng thread nền và gỡ queue handler khỏi root logger."""
+    global _listener, _queue_handler, _handlers, _console_handlers, _stdout
+    if _stdout is not None:
+        sys.stdout, _stdout = _stdout, None
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    dropped = _queue_handler.dropped
+    for handler in _handlers:
+        handler.close()
+    _listener, _queue_handler, _handlers, _console_handlers = None, None, [], []
+    if dropped:
+        print(f"⚠ Đã bỏ {dropped} dòng log vì queue đầy", file=sys.stderr)
@@ -0,0 +1,206 @@
+"""
+Match Inspector Module
+Xem template matching "từ bên trong" để chỉnh ROI, threshold và cách cắt template:
+lưu score map (matchTemplate) thành heatmap phủ lên frame, đánh dấu k đỉnh cao nhất
+kèm confidence và khoảng cách tới threshold, đo thời gian chụp màn hình và matching
+(cả score map đầy đủ lẫn chiến lược đang dùng). Chạy được trên màn hình thật hoặc
+trên frame đã lưu.
+
+Cách dùng:
+    python match_inspector.py templates/step5.png                   # chụp màn hình
+    python match_inspector.py templates/step5.png --frame shot.png  # frame đã lưu
+    python match_inspector.py templates/step5.png --region 0,0,800,600 --top 8
+
+Trong code:
+    report = inspect(detector, "templates/step5.png", frame_path="shot.png")
+    print(report['peaks'][0], report['timings'])
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from match_strategies import STRATEGIES, score_map
+
+OUTPUT_DIR = os.path.join("debug", "heatmaps")
+
+
+def find_peaks(scores: np.ndarray, template_w: int, template_h: int, top_k: int = 5) -> List[Tuple[float, int, int]]:
+    """
+    k đỉnh cao nhất của score map, mỗi đỉnh là một vị trí không chồng lên đỉnh cao hơn
+    (non-maximum suppression theo kích thước template).
+
+    Returns:
+        List (score, x, y) với (x, y) là góc trên-trái trong score map, giảm dần theo score.
+    """
+    scores = scores.copy()
+    peaks = []
+    for _ in range(top_k):
+        _, max_val, _, (x, y) = cv2.minMaxLoc(scores)
+        if not np.isfinite(max_val) or max_val <= 0.0:  # Tương quan <= 0: không còn gì giống template
+            break
+        peaks.append((float(max_val), int(x), int(y)))
+        scores[max(0, y - template_h + 1):y + template_h, max(0, x - template_w + 1):x + template_w] = -1.0
+    return peaks
+
+
+def render_heatmap(frame: np.ndarray, scores: np.ndarray, template_w: int, template_h: int,
+                   peaks: List[Tuple[float, int, int]], threshold: float, alpha: float = 0.55) -> np.ndarray:
+    """
+    Phủ heatmap của score map lên frame (mỗi điểm tô tại tâm template ứng với nó)
+    và vẽ khung + nhãn "#hạng confidence (chênh lệch với threshold)" cho các đỉnh.
+    """
+    heat = np.clip(scores, 0.0, 1.0)
+    heat = cv2.applyColorMap((heat * 255).astype(np.uint8), cv2.COLORMAP_JET)
+    canvas = np.zeros_like(frame)
+    y0, x0 = template_h // 2, template_w // 2
+    canvas[y0:y0 + heat.shape[0], x0:x0 + heat.shape[1]] = heat
+    overlay = cv2.addWeighted(frame, 1.0 - alpha, canvas, alpha, 0)
+
+    for rank, (score, x, y) in reversed(list(enumerate(peaks, 1))):
+        color = (0, 220, 0) if score >= threshold else (0, 165, 255) if score >= threshold - 0.1 else (0, 0, 255)
+        cv2.rectangle(overlay, (x, y), (x + template_w, y + template_h), color, 2 if rank == 1 else 1)
+        label = f"#{rank} {score:.3f} ({score - threshold:+.3f})"
+        text_y = y - 6 if y >= 16 else y + template_h + 14
+        cv2.putText(overlay, label, (x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 3, cv2.LINE_AA)
+        cv2.putText(overlay, label, (x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1, cv2.LINE_AA)
+    return overlay
+
+
+def inspect(detector, template_path: str, frame_path: Optional[str] = None,
+            region: Optional[Tuple[int, int, int, int]] = None, top_k: int = 5,
+            output_dir: Optional[str] = OUTPUT_DIR, name: Optional[str] = None) -> Optional[Dict]:
+    """
+    Chụp (hoặc đọc) frame, tính score map của template và lưu heatmap + báo cáo JSON.
+
+    Args:
+        detector: ImageDetector (dùng threshold, chiến lược, cách chụp và cache template của nó)
+        template_path: Đường dẫn ảnh mẫu
+        frame_path: Frame đã lưu (None = chụp màn hình / frame source của detector)
+        region: (x, y, width, height) - chỉ tìm trong vùng này (thử ROI)
+        top_k: Số đỉnh đánh dấu
+        output_dir: Thư mục lưu heatmap (None = không lưu)
+        name: Tên file kết quả (mặc định <tên template>_<thời gian>)
+
+    Returns:
+        dict: template, frame, region, threshold, strategy, peaks [{rank, x, y, confidence, margin}],
+        separation (đỉnh 1 - đỉnh 2), timings (ms), heatmap (đường dẫn); None nếu không đọc được ảnh.
+    """
+    template = detector._load_template(template_path)
+    if template is None:
+        return None
+
+    start = time.perf_counter()
+    if frame_path:
+        frame = cv2.imread(frame_path, cv2.IMREAD_COLOR)
+        if frame is None:
+            print(f"✗ Không đọc được frame: {frame_path}")
+            return None
+        if region:
+            x, y, w, h = region
+            frame = frame[y:y + h, x:x + w]
+    else:
+        frame = detector._capture(region)
+    frame = np.ascontiguousarray(frame).copy()  # Frame có thể nằm trong buffer dùng lại
+    capture_ms = (time.perf_counter() - start) * 1000.0
+
+    if frame.shape[0] < template.h or frame.shape[1] < template.w:
+        print(f"✗ Frame {frame.shape[1]}x{frame.shape[0]} nhỏ hơn template {template.w}x{template.h}")
+        return None
+
+    start = time.perf_counter()
+    scores = score_map(frame, template.bgr).copy()
+    score_map_ms = (time.perf_counter() - start) * 1000.0
+    np.nan_to_num(scores, copy=False, nan=0.0, posinf=0.0, neginf=0.0)  # Vùng màu phẳng cho NaN/inf
+
+    # Chiến lược thật của runner (không có hint: trường hợp xấu nhất của 'roi')
+    strategy = detector.strategy if detector.strategy in STRATEGIES else 'direct'
+    start = time.perf_counter()
+    STRATEGIES[strategy](frame, template, detector.threshold, None)
+    strategy_ms = (time.perf_counter() - start) * 1000.0
+
+    peaks = find_peaks(scores, template.w, template.h, top_k)
+    offset_x, offset_y = (region[0], region[1]) if region else (0, 0)
+    report = {
+        'template': template_path,
+        'frame': frame_path or 'live',
+        'frame_size': [frame.shape[1], frame.shape[0]],
+        'template_size': [template.w, template.h],
+        'region': list(region) if region else None,
+        'threshold': detector.threshold,
+        'strategy': strategy,
+        'peaks': [{'rank': rank, 'x': template.click_point(x, y)[0] + offset_x,
+                   'y': template.click_point(x, y)[1] + offset_y,
+                   'confidence': round(score, 4), 'margin': round(score - detector.threshold, 4)}
+                  for rank, (score, x, y) in enumerate(peaks, 1)],
+        'separation': round(peaks[0][0] - peaks[1][0], 4) if len(peaks) > 1 else None,
+        'timings': {'capture_ms': round(capture_ms, 2), 'score_map_ms': round(score_map_ms, 2),
+                    'strategy_ms': round(strategy_ms, 2)},
+        'heatmap': None,
+    }
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        if name is None:
+            name = f"{os.path.splitext(os.path.basename(template_path))[0]}_{time.strftime('%Y%m%d_%H%M%S')}"
+        heatmap_path = os.path.join(output_dir, name + ".png")
+        cv2.imwrite(heatmap_path, render_heatmap(frame, scores, template.w, template.h, peaks, detector.threshold))
+        report['heatmap'] = heatmap_path
+        with open(os.path.join(output_dir, name + ".json"), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def print_report(report: Dict):
+    """In báo cáo của inspect()."""
+    timings = report['timings']
+    print(f"Template: {report['template']} ({report['template_size'][0]}x{report['template_size'][1]})")
+    print(f"Frame: {report['frame']} ({report['frame_size'][0]}x{report['frame_size'][1]})"
+          + (f", vùng {tuple(report['region'])}" if report['region'] else ""))
+    print(f"Thời gian: chụp/đọc {timings['capture_ms']:.1f}ms, score map {timings['score_map_ms']:.1f}ms, "
+          f"chiến lược '{report['strategy']}' {timings['strategy_ms']:.1f}ms")
+    print(f"Threshold: {report['threshold']}")
+    for peak in report['peaks']:
+        mark = "✓" if peak['margin'] >= 0 else "✗"
+        print(f"  {mark} #{peak['rank']} ({peak['x']}, {peak['y']}) confidence {peak['confidence']:.3f} "
+              f"({peak['margin']:+.3f})")
+    if report['separation'] is not None:
+        print(f"Khoảng cách đỉnh 1 - đỉnh 2: {report['separation']:.3f}"
+              + (" ⚠ dễ nhầm vị trí" if report['separation'] < 0.05 else ""))
+    if report['heatmap']:
+        print(f"Heatmap: {report['heatmap']}")
+
+
+def _parse_region(text: str) -> Tuple[int, int, int, int]:
+    values = tuple(int(v) for v in text.split(','))
+    if len(values) != 4:
+        raise argparse.ArgumentTypeError("Vùng phải có dạng x,y,width,height")
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Heatmap score map và thời gian matching của một template")
+    parser.add_argument('template', help="Đường dẫn ảnh mẫu")
+    parser.add_argument('--frame', default=None, help="Frame đã lưu (mặc định chụp màn hình)")
+    parser.add_argument('--region', type=_parse_region, default=None, help="Vùng tìm kiếm x,y,width,height")
+    parser.add_argument('--top', type=int, default=5, help="Số đỉnh đánh dấu")
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--strategy', default='direct', choices=sorted(STRATEGIES))
+    parser.add_argument('--out', default=OUTPUT_DIR, help="Thư mục lưu heatmap")
+    args = parser.parse_args()
+
+    from image_detector import ImageDetector
+    detector = ImageDetector(threshold=args.threshold, strategy=args.strategy)
+    report = inspect(detector, args.template, frame_path=args.frame, region=args.region,
+                     top_k=args.top, output_dir=args.out)
+    if report:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
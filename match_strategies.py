@@ -0,0 +1,248 @@
+"""
+Match Strategies Module
+Các chiến lược template matching có thể hoán đổi cho ImageDetector:
+direct (màu), grayscale, pyramid (thô → tinh), fft (tương quan qua FFT) và
+roi (tìm quanh vị trí trúng lần trước rồi mới tìm toàn khung hình).
+
+Mọi chiến lược có cùng chữ ký:
+    fn(frame, template, threshold, hint) -> (score, (x, y))
+trong đó (x, y) là góc trên-trái của vị trí khớp nhất trong frame.
+
+Ảnh grayscale trung gian và score map được ghi vào buffer dùng lại (buffer_pool)
+nên không cấp phát mới mỗi lần poll.
+"""
+
+import json
+import os
+
+import cv2
+import numpy as np
+from typing import Callable, Dict, Optional, Tuple
+
+from buffer_pool import thread_pool
+from pixel_signature import PixelSignature
+
+
+class TemplateData:
+    """Ảnh mẫu đã đọc sẵn, kèm các biến thể (grayscale, thu nhỏ) tính lười."""
+
+    def __init__(self, bgr: np.ndarray):
+        """
+        Args:
+            bgr: Ảnh mẫu ở định dạng BGR (như cv2.imread trả về)
+        """
+        self.bgr = bgr
+        self.h, self.w = bgr.shape[:2]
+        self._gray = None
+        self._scaled = {}
+        self._signature = None
+        self.features = {}  # Keypoint/descriptor theo phương pháp (FeatureMatcher)
+        # Điểm click = tâm template + offset (template đã thu nhỏ giữ nguyên điểm click cũ)
+        self.click_offset = (0, 0)
+
+    def click_point(self, x: int, y: int) -> Tuple[int, int]:
+        """Điểm click khi template khớp với góc trên-trái tại (x, y)."""
+        return x + self.w // 2 + self.click_offset[0], y + self.h // 2 + self.click_offset[1]
+
+    @property
+    def gray(self) -> np.ndarray:
+        """Ảnh mẫu grayscale (tính một lần)."""
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def signature(self) -> PixelSignature:
+        """Chữ ký pixel của template (tính một lần)."""
+        if self._signature is None:
+            self._signature = PixelSignature(self.bgr)
+        return self._signature
+
+    def scaled_gray(self, scale: float) -> np.ndarray:
+        """Ảnh mẫu grayscale thu nhỏ theo tỉ lệ `scale` (có cache)."""
+        if scale not in self._scaled:
+            w = max(1, int(round(self.w * scale)))
+            h = max(1, int(round(self.h * scale)))
+            self._scaled[scale] = cv2.resize(self.gray, (w, h), interpolation=cv2.INTER_AREA)
+        return self._scaled[scale]
+
+
+def sidecar_path(template_path: str) -> str:
+    """File JSON đi kèm template (vd click_offset của template đã thu nhỏ): step1.png -> step1.json."""
+    return os.path.splitext(template_path)[0] + '.json'
+
+
+def load_click_offset(template_path: str) -> Tuple[int, int]:
+    """click_offset trong file đi kèm template ((0, 0) nếu không có hoặc file hỏng)."""
+    try:
+        with open(sidecar_path(template_path), 'r', encoding='utf-8') as f:
+            dx, dy = json.load(f).get('click_offset', (0, 0))
+        return int(dx), int(dy)
+    except (OSError, ValueError, TypeError):
+        return 0, 0
+
+
+def score_map(image: np.ndarray, templ: np.ndarray) -> np.ndarray:
+    """matchTemplate TM_CCOEFF_NORMED ghi vào score map float32 dùng lại theo kích thước."""
+    shape = (image.shape[0] - templ.shape[0] + 1, image.shape[1] - templ.shape[1] + 1)
+    result = thread_pool().get(('score', shape), shape, np.float32)
+    return cv2.matchTemplate(image, templ, cv2.TM_CCOEFF_NORMED, result=result)
+
+
+def _best(result: np.ndarray) -> Tuple[float, Tuple[int, int]]:
+    """Lấy (score, vị trí) lớn nhất từ score map."""
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return float(max_val), (int(max_loc[0]), int(max_loc[1]))
+
+
+def _fits(frame: np.ndarray, template: TemplateData) -> bool:
+    """Frame có đủ lớn để chứa template không."""
+    return frame.shape[0] >= template.h and frame.shape[1] >= template.w
+
+
+def to_gray(frame: np.ndarray) -> np.ndarray:
+    """Chuyển frame BGR sang grayscale (giữ nguyên nếu đã là 1 kênh)."""
+    if frame.ndim == 2:
+        return frame
+    shape = frame.shape[:2]
+    gray = thread_pool().get(('gray', shape), shape, np.uint8)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+
+
+def match_direct(frame: np.ndarray, template: TemplateData, threshold: float = 0.8,
+                 hint: Optional[Tuple[int, int]] = None) -> Tuple[float, Tuple[int, int]]:
+    """TM_CCOEFF_NORMED trên ảnh màu - hành vi gốc của ImageDetector."""
+    if not _fits(frame, template):
+        return 0.0, (0, 0)
+    return _best(score_map(frame, template.bgr))
+
+
+def match_grayscale(frame: np.ndarray, template: TemplateData, threshold: float = 0.8,
+                    hint: Optional[Tuple[int, int]] = None) -> Tuple[float, Tuple[int, int]]:
+    """TM_CCOEFF_NORMED trên ảnh grayscale (ít hơn 3 lần dữ liệu so với ảnh màu)."""
+    if not _fits(frame, template):
+        return 0.0, (0, 0)
+    return _best(score_map(to_gray(frame), template.gray))
+
+
+def pyramid_scale(template: TemplateData, min_side: int = 12) -> float:
+    """Chọn tỉ lệ thu nhỏ lớn nhất (0.25 hoặc 0.5) mà template vẫn còn >= min_side pixel."""
+    return pyramid_scale_for(template.w, template.h, min_side)
+
+
+def pyramid_scale_for(w: int, h: int, min_side: int = 12) -> float:
+    """pyramid_scale theo kích thước template; 1.0 = quá nhỏ để thu nhỏ, match_pyramid chạy direct."""
+    for scale in (0.25, 0.5):
+        if min(w, h) * scale >= min_side:
+            return scale
+    return 1.0
+
+
+def match_pyramid(frame: np.ndarray, template: TemplateData, threshold: float = 0.8,
+                  hint: Optional[Tuple[int, int]] = None) -> Tuple[float, Tuple[int, int]]:
+    """
+    Tìm thô trên ảnh thu nhỏ rồi tinh chỉnh bằng direct trong cửa sổ nhỏ quanh điểm tìm được.
+    Score trả về là score màu của bước tinh chỉnh nên so sánh được với threshold gốc.
+    """
+    if not _fits(frame, template):
+        return 0.0, (0, 0)
+    scale = pyramid_scale(template)
+    if scale >= 1.0:
+        return match_direct(frame, template, threshold, hint)
+
+    gray = to_gray(frame)
+    small_shape = (max(1, int(round(gray.shape[0] * scale))), max(1, int(round(gray.shape[1] * scale))))
+    small = thread_pool().get(('small', small_shape), small_shape, np.uint8)
+    cv2.resize(gray, (small_shape[1], small_shape[0]), dst=small, interpolation=cv2.INTER_AREA)
+    small_tpl = template.scaled_gray(scale)
+    if small.shape[0] < small_tpl.shape[0] or small.shape[1] < small_tpl.shape[1]:
+        return match_direct(frame, template, threshold, hint)
+    _, (sx, sy) = _best(score_map(small, small_tpl))
+
+    # Tinh chỉnh trên ảnh gốc quanh vị trí thô
+    pad = int(np.ceil(1.0 / scale)) + 2
+    return _match_window(frame, template, int(sx / scale), int(sy / scale), pad)
+
+
+def _integral_window_sums(image: np.ndarray, w: int, h: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Tổng và tổng bình phương của mọi cửa sổ w x h (qua integral image)."""
+    s, sq = cv2.integral2(image, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+    win_sum = s[h:, w:] - s[:-h, w:] - s[h:, :-w] + s[:-h, :-w]
+    win_sq = sq[h:, w:] - sq[:-h, w:] - sq[h:, :-w] + sq[:-h, :-w]
+    return win_sum, win_sq
+
+
+def match_fft(frame: np.ndarray, template: TemplateData, threshold: float = 0.8,
+              hint: Optional[Tuple[int, int]] = None) -> Tuple[float, Tuple[int, int]]:
+    """
+    TM_CCOEFF_NORMED grayscale tính bằng tương quan trong miền tần số.
+    Chi phí ~ O(N log N) theo diện tích frame, gần như không phụ thuộc kích thước template,
+    nên có lợi với template lớn trên vùng tìm kiếm lớn.
+    """
+    if not _fits(frame, template):
+        return 0.0, (0, 0)
+    image = to_gray(frame).astype(np.float64)
+    tpl = template.gray.astype(np.float64)
+    H, W = image.shape
+    h, w = tpl.shape
+    n = float(w * h)
+
+    tpl0 = tpl - tpl.mean()
+    tpl_norm = np.sqrt(np.sum(tpl0 * tpl0))
+    if tpl_norm < 1e-9:
+        return 0.0, (0, 0)
+
+    fh = cv2.getOptimalDFTSize(H + h - 1)
+    fw = cv2.getOptimalDFTSize(W + w - 1)
+    spectrum = np.fft.rfft2(image, s=(fh, fw)) * np.fft.rfft2(tpl0[::-1, ::-1], s=(fh, fw))
+    numerator = np.fft.irfft2(spectrum, s=(fh, fw))[h - 1:H, w - 1:W]
+
+    win_sum, win_sq = _integral_window_sums(image, w, h)
+    variance = np.maximum(win_sq - win_sum * win_sum / n, 0.0)
+    denominator = np.sqrt(variance) * tpl_norm
+    result = np.where(denominator > 1e-6, numerator / np.maximum(denominator, 1e-6), 0.0)
+
+    y, x = np.unravel_index(int(np.argmax(result)), result.shape)
+    return float(result[y, x]), (int(x), int(y))
+
+
+def _match_window(frame: np.ndarray, template: TemplateData, x: int, y: int,
+                  pad: int) -> Tuple[float, Tuple[int, int]]:
+    """Match direct trong cửa sổ template mở rộng `pad` pixel quanh (x, y)."""
+    fh, fw = frame.shape[:2]
+    x0 = max(0, x - pad)
+    y0 = max(0, y - pad)
+    x1 = min(fw, x + template.w + pad)
+    y1 = min(fh, y + template.h + pad)
+    window = frame[y0:y1, x0:x1]
+    if not _fits(window, template):
+        return 0.0, (x, y)
+    score, (wx, wy) = _best(score_map(window, template.bgr))
+    return score, (x0 + wx, y0 + wy)
+
+
+def roi_pad(template: TemplateData) -> int:
+    """Biên mở rộng quanh vị trí cũ cho chiến lược roi."""
+    return max(16, max(template.w, template.h) // 2)
+
+
+def match_roi_first(frame: np.ndarray, template: TemplateData, threshold: float = 0.8,
+                    hint: Optional[Tuple[int, int]] = None) -> Tuple[float, Tuple[int, int]]:
+    """
+    Tìm trước trong vùng nhỏ quanh `hint` (vị trí trúng lần trước, tọa độ trong frame).
+    Chỉ khi không đạt threshold mới tìm lại toàn frame bằng direct.
+    """
+    if hint is not None:
+        score, loc = _match_window(frame, template, hint[0], hint[1], roi_pad(template))
+        if score >= threshold:
+            return score, loc
+    return match_direct(frame, template, threshold, hint)
+
+
+STRATEGIES: Dict[str, Callable] = {
+    'direct': match_direct,
+    'grayscale': match_grayscale,
+    'pyramid': match_pyramid,
+    'fft': match_fft,
+    'roi': match_roi_first,
+}
@@ -0,0 +1,336 @@
+"""
+Matcher Cost Model Module
+Mô hình chi phí để ImageDetector tự chọn chiến lược matching theo kích thước
+template và vùng tìm kiếm. Hệ số được hiệu chỉnh bằng micro-benchmark ngắn
+trên chính máy đang chạy, lưu vào file cache và được kiểm tra lại định kỳ.
+
+Hiệu chỉnh chạy lúc khởi động (load_or_calibrate, vd trong ImageDetector với strategy
+'auto'). Việc kiểm tra lại (maybe_revalidate) không chạy trong lúc match: runner gọi nó
+rồi save_if_dirty() giữa hai account. Khi điểm benchmark vẫn đúng nhưng số đo thực tế
+lệch (kích thước frame thật nằm ngoài lưới, vd 1920x1080), kích thước đó được thêm vào
+lưới hiệu chỉnh và lưu cùng hệ số.
+"""
+
+import json
+import logging
+import math
+import os
+import platform
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from match_strategies import STRATEGIES, TemplateData, pyramid_scale_for, roi_pad
+
+logger = logging.getLogger(__name__)
+
+# Các chiến lược được benchmark trực tiếp ('roi' được suy ra từ 'direct')
+BENCHMARKED = ('direct', 'grayscale', 'pyramid', 'fft')
+
+# Lưới kích thước (frame, template) dùng khi hiệu chỉnh
+CALIBRATION_FRAMES = ((320, 240), (800, 600), (1280, 720))
+CALIBRATION_TEMPLATES = ((40, 24), (120, 48), (240, 110))
+
+CACHE_VERSION = 1
+
+# Số lần đo thực tế tối thiểu trước khi tin vào độ lệch EWMA
+MIN_DRIFT_SAMPLES = 20
+
+# Số điểm (frame, template) lấy từ số đo thực tế được thêm vào lưới hiệu chỉnh
+MAX_EXTRA_POINTS = 4
+
+
+def _features(fw: int, fh: int, tw: int, th: int) -> List[float]:
+    """Đặc trưng tuyến tính của chi phí: hằng số, diện tích, N log N, tương quan trực tiếp."""
+    area = float(fw * fh)
+    out_area = float(max(1, fw - tw + 1) * max(1, fh - th + 1))
+    return [1.0, area, area * math.log2(max(area, 2.0)), out_area * tw * th]
+
+
+def _fit_nonnegative(rows: List[List[float]], costs: List[float]) -> List[float]:
+    """Least squares với hệ số không âm (bỏ dần đặc trưng có hệ số âm)."""
+    X = np.asarray(rows, dtype=np.float64)
+    y = np.asarray(costs, dtype=np.float64)
+    # Chuẩn hóa cột để lstsq ổn định số học
+    scale = np.maximum(np.abs(X).max(axis=0), 1e-12)
+    active = list(range(X.shape[1]))
+    coef = np.zeros(X.shape[1])
+    while active:
+        sol, *_ = np.linalg.lstsq(X[:, active] / scale[active], y, rcond=None)
+        if np.all(sol >= 0):
+            coef[active] = sol / scale[active]
+            break
+        active.pop(int(np.argmin(sol)))
+    return coef.tolist()
+
+
+def host_fingerprint() -> str:
+    """Định danh máy + phiên bản thư viện; cache chỉ hợp lệ khi khớp định danh này."""
+    return '|'.join([
+        platform.node(),
+        platform.machine(),
+        platform.processor() or '',
+        str(os.cpu_count()),
+        cv2.__version__,
+        np.__version__,
+    ])
+
+
+class MatcherCostModel:
+    """Dự đoán thời gian (ms) của từng chiến lược matching và chọn chiến lược rẻ nhất."""
+
+    def __init__(self, cache_path: str = "data/matcher_cost_model.json",
+                 revalidate_interval: float = 3600.0, drift_tolerance: float = 2.0,
+                 repeats: int = 2):
+        """
+        Khởi tạo MatcherCostModel.
+
+        Args:
+            cache_path: File JSON lưu hệ số đã hiệu chỉnh
+            revalidate_interval: Chu kỳ kiểm tra lại mô hình (giây)
+            drift_tolerance: Tỉ lệ lệch thực tế/dự đoán tối đa trước khi hiệu chỉnh lại
+            repeats: Số lần đo cho mỗi điểm benchmark (lấy giá trị nhỏ nhất)
+        """
+        self.cache_path = cache_path
+        self.revalidate_interval = revalidate_interval
+        self.drift_tolerance = drift_tolerance
+        self.repeats = repeats
+        self.coefficients: Dict[str, List[float]] = {}
+        self.calibrated_at = 0.0
+        self.validated_at = 0.0
+        self.version = 0  # Tăng mỗi lần hệ số thay đổi để detector bỏ cache lựa chọn
+        self.dirty = False  # Có thay đổi chưa ghi vào cache
+        # Điểm (fw, fh, tw, th) thêm vào lưới khi số đo thực tế lệch ở kích thước ngoài lưới
+        self.extra_points: List[Tuple[int, int, int, int]] = []
+        self._drift: Dict[str, float] = {}
+        self._drift_samples: Dict[str, int] = {}
+        self._observed_sizes: Dict[str, Dict[Tuple[int, int, int, int], int]] = {}
+
+    # ------------------------------------------------------------------ cache
+
+    def load(self) -> bool:
+        """Đọc hệ số từ cache. Trả về False nếu không có hoặc không khớp máy này."""
+        if not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Không đọc được cache cost model %s: %s", self.cache_path, e)
+            return False
+
+        if data.get('version') != CACHE_VERSION or data.get('host') != host_fingerprint():
+            logger.info("Cache cost model không khớp máy hiện tại, sẽ hiệu chỉnh lại")
+            return False
+        coefficients = data.get('coefficients', {})
+        if not all(name in coefficients for name in BENCHMARKED):
+            return False
+
+        self.coefficients = coefficients
+        self.calibrated_at = float(data.get('calibrated_at', 0.0))
+        self.validated_at = float(data.get('validated_at', self.calibrated_at))
+        self.extra_points = [tuple(int(v) for v in point) for point in data.get('extra_points', [])]
+        self.version += 1
+        return True
+
+    def save(self):
+        """Ghi hệ số hiện tại vào cache."""
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            'version': CACHE_VERSION,
+            'host': host_fingerprint(),
+            'calibrated_at': self.calibrated_at,
+            'validated_at': self.validated_at,
+            'extra_points': [list(point) for point in self.extra_points],
+            'coefficients': self.coefficients,
+        }
+        tmp_path = self.cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.cache_path)
+            self.dirty = False
+        except OSError as e:
+            logger.warning("Không ghi được cache cost model %s: %s", self.cache_path, e)
+
+    def save_if_dirty(self):
+        """Ghi cache nếu hệ số/thời điểm kiểm tra đã đổi (gọi ngoài đường nóng, vd giữa hai account)."""
+        if self.dirty:
+            self.save()
+
+    def load_or_calibrate(self):
+        """Dùng cache nếu hợp lệ, nếu không thì chạy benchmark và lưu lại (gọi lúc khởi động)."""
+        if not self.load():
+            self.calibrate()
+            self.save()
+
+    # -------------------------------------------------------------- benchmark
+
+    def _time_strategy(self, name: str, frame: np.ndarray, template: TemplateData) -> float:
+        """Đo thời gian (ms) của một chiến lược, lấy min qua `repeats` lần."""
+        fn = STRATEGIES[name]
+        best = float('inf')
+        for _ in range(self.repeats):
+            start = time.perf_counter()
+            fn(frame, template, 1.0, None)
+            best = min(best, (time.perf_counter() - start) * 1000.0)
+        return best
+
+    @staticmethod
+    def _synthetic_case(fw: int, fh: int, tw: int, th: int, rng) -> Tuple[np.ndarray, TemplateData]:
+        """Frame ngẫu nhiên (làm mượt để giống ảnh UI) và template cắt ra từ nó."""
+        frame = rng.integers(0, 256, size=(fh, fw, 3), dtype=np.uint8)
+        frame = cv2.GaussianBlur(frame, (5, 5), 0)
+        x = (fw - tw) // 2
+        y = (fh - th) // 2
+        return frame, TemplateData(frame[y:y + th, x:x + tw].copy())
+
+    def calibrate(self):
+        """Chạy micro-benchmark trên lưới kích thước (cộng extra_points) và fit hệ số cho từng chiến lược."""
+        start = time.perf_counter()
+        rng = np.random.default_rng(1234)
+        rows: List[List[float]] = []
+        costs: Dict[str, List[float]] = {name: [] for name in BENCHMARKED}
+
+        points = [(fw, fh, tw, th) for fw, fh in CALIBRATION_FRAMES for tw, th in CALIBRATION_TEMPLATES]
+        for fw, fh, tw, th in points + list(self.extra_points):
+            if tw >= fw or th >= fh:
+                continue
+            frame, template = self._synthetic_case(fw, fh, tw, th, rng)
+            rows.append(_features(fw, fh, tw, th))
+            for name in BENCHMARKED:
+                costs[name].append(self._time_strategy(name, frame, template))
+
+        self.coefficients = {name: _fit_nonnegative(rows, costs[name]) for name in BENCHMARKED}
+        self.calibrated_at = self.validated_at = time.time()
+        self._drift.clear()
+        self._drift_samples.clear()
+        self._observed_sizes.clear()
+        self.version += 1
+        self.dirty = True
+        logger.info("Đã hiệu chỉnh cost model trong %.2fs", time.perf_counter() - start)
+
+    def revalidate(self) -> bool:
+        """
+        Đo lại một điểm benchmark cỡ trung bình và so với dự đoán.
+        Hiệu chỉnh lại toàn bộ nếu lệch quá drift_tolerance.
+
+        Returns:
+            True nếu mô hình vẫn còn đúng, False nếu đã phải hiệu chỉnh lại.
+        """
+        fw, fh = CALIBRATION_FRAMES[1]
+        tw, th = CALIBRATION_TEMPLATES[1]
+        frame, template = self._synthetic_case(fw, fh, tw, th, np.random.default_rng(99))
+        for name in BENCHMARKED:
+            ratio = self._time_strategy(name, frame, template) / max(self.predict(name, fw, fh, tw, th), 1e-3)
+            if not (1.0 / self.drift_tolerance <= ratio <= self.drift_tolerance):
+                logger.info("Cost model lệch (%s: thực tế/dự đoán = %.2f), hiệu chỉnh lại", name, ratio)
+                self.calibrate()
+                return False
+        self.validated_at = time.time()
+        self._drift.clear()
+        self._drift_samples.clear()
+        self.dirty = True
+        return True
+
+    def drifted(self) -> List[str]:
+        """Các chiến lược có số đo thực tế lệch khỏi dự đoán quá drift_tolerance (đủ mẫu)."""
+        return [name for name, ratio in self._drift.items()
+                if self._drift_samples.get(name, 0) >= MIN_DRIFT_SAMPLES
+                and not (1.0 / self.drift_tolerance <= ratio <= self.drift_tolerance)]
+
+    def _add_observed_points(self, names: List[str]) -> bool:
+        """Thêm kích thước đo nhiều nhất của các chiến lược bị lệch vào lưới hiệu chỉnh."""
+        added = False
+        for name in names:
+            sizes = self._observed_sizes.get(name)
+            if not sizes:
+                continue
+            point = max(sizes, key=sizes.get)
+            fw, fh, tw, th = point
+            on_grid = (fw, fh) in CALIBRATION_FRAMES and (tw, th) in CALIBRATION_TEMPLATES
+            if on_grid or point in self.extra_points:
+                continue
+            self.extra_points = (self.extra_points + [point])[-MAX_EXTRA_POINTS:]
+            added = True
+        return added
+
+    def maybe_revalidate(self) -> bool:
+        """
+        Kiểm tra lại nếu đã quá chu kỳ hoặc số đo thực tế lệch nhiều so với dự đoán.
+        Benchmark vài trăm ms đến vài giây: gọi ngoài đường nóng (vd giữa hai account), không trong lúc match.
+
+        Returns:
+            True nếu hệ số đã thay đổi (đã hiệu chỉnh lại).
+        """
+        if not self.coefficients:
+            self.load_or_calibrate()
+            return True
+        drifted = self.drifted()
+        if not drifted and time.time() - self.validated_at < self.revalidate_interval:
+            return False
+        if not self.revalidate():
+            return True
+        if drifted and self._add_observed_points(drifted):
+            # Điểm benchmark vẫn khớp nhưng số đo thực tế lệch: lưới không phủ kích thước thật
+            logger.info("Cost model lệch ở kích thước ngoài lưới (%s), thêm %s vào lưới và hiệu chỉnh lại",
+                        ', '.join(drifted), self.extra_points[-1])
+            self.calibrate()
+            return True
+        return False
+
+    # -------------------------------------------------------------- dự đoán
+
+    def predict(self, name: str, fw: int, fh: int, tw: int, th: int) -> float:
+        """Thời gian dự đoán (ms) của chiến lược `name` cho frame fw x fh và template tw x th."""
+        if name == 'pyramid' and pyramid_scale_for(tw, th) >= 1.0:
+            name = 'direct'  # Template quá nhỏ để thu nhỏ: match_pyramid chạy direct (lưới hiệu chỉnh không có cỡ này)
+        coef = self.coefficients[name]
+        return max(1e-3, sum(c * f for c, f in zip(coef, _features(fw, fh, tw, th))))
+
+    def predict_roi(self, fw: int, fh: int, tw: int, th: int, hit_rate: float) -> float:
+        """Chi phí kỳ vọng của 'roi': tìm trong cửa sổ nhỏ, trượt thì tìm lại toàn frame."""
+        pad = roi_pad(TemplateData(np.zeros((th, tw, 3), dtype=np.uint8)))
+        ww = min(fw, tw + 2 * pad)
+        wh = min(fh, th + 2 * pad)
+        return self.predict('direct', ww, wh, tw, th) + (1.0 - hit_rate) * self.predict('direct', fw, fh, tw, th)
+
+    def choose(self, fw: int, fh: int, tw: int, th: int,
+               allowed: Optional[Tuple[str, ...]] = None,
+               roi_hit_rate: Optional[float] = None) -> str:
+        """
+        Chọn chiến lược có chi phí dự đoán thấp nhất.
+
+        Args:
+            fw, fh: Kích thước vùng tìm kiếm
+            tw, th: Kích thước template
+            allowed: Giới hạn tập chiến lược được chọn (None = tất cả)
+            roi_hit_rate: Tỉ lệ trúng của 'roi' cho template này (None = chưa có vị trí cũ)
+
+        Returns:
+            Tên chiến lược trong match_strategies.STRATEGIES.
+        """
+        if not self.coefficients:
+            self.load_or_calibrate()
+        candidates = {name: self.predict(name, fw, fh, tw, th)
+                      for name in BENCHMARKED if allowed is None or name in allowed}
+        if roi_hit_rate is not None and (allowed is None or 'roi' in allowed):
+            candidates['roi'] = self.predict_roi(fw, fh, tw, th, roi_hit_rate)
+        if not candidates:
+            return 'direct'
+        return min(candidates, key=candidates.get)
+
+    def observe(self, name: str, fw: int, fh: int, tw: int, th: int, elapsed_ms: float):
+        """Ghi nhận thời gian thực tế để phát hiện mô hình bị lệch (EWMA tỉ lệ thực tế/dự đoán)."""
+        if name not in self.coefficients:
+            return
+        ratio = elapsed_ms / self.predict(name, fw, fh, tw, th)
+        previous = self._drift.get(name)
+        self._drift[name] = ratio if previous is None else 0.9 * previous + 0.1 * ratio
+        self._drift_samples[name] = self._drift_samples.get(name, 0) + 1
+        sizes = self._observed_sizes.setdefault(name, {})
+        sizes[(fw, fh, tw, th)] = sizes.get((fw, fh, tw, th), 0) + 1
@@ -0,0 +1,325 @@
+"""
+Metrics Module
+Counter/Gauge/Histogram gọn nhẹ và HTTP endpoint nhúng trả về định dạng text
+tương thích Prometheus. Ghi số liệu chỉ là vài phép cộng dưới một lock nên gần
+như không tốn gì trong vòng lặp chính; việc định dạng chỉ xảy ra khi có request.
+
+Ví dụ:
+    from metrics import REGISTRY, start_metrics_server
+    start_metrics_server(9108)
+    # curl http://127.0.0.1:9108/metrics
+"""
+
+import bisect
+import collections
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# Bucket mặc định (giây) cho latency từ vài ms đến vài chục giây
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    """Định dạng nhãn {a="x",b="y"} theo chuẩn Prometheus."""
+    parts = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+        parts.append(f'{name}="{value}"')
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    """Cơ sở chung: tên, mô tả, nhãn và lock."""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        """Các dòng text của metric (gồm HELP/TYPE)."""
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng; có thể gắn hàm đọc một tổng cộng dồn có sẵn lúc scrape (vd thời gian CPU)."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (),
+                 func: Optional[Callable[[], float]] = None):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._func = func
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        if self._func is not None:
+            return float(self._func())
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        if self._func is not None:
+            try:
+                return [f'{self.name} {float(self._func())}']
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, k)} {v}' for k, v in items]
+
+
+class Gauge(_Metric):
+    """Giá trị tức thời; có thể gắn hàm lấy giá trị lúc scrape."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (),
+                 func: Optional[Callable[[], float]] = None):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._func = func
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        if self._func is not None:
+            return float(self._func())
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        if self._func is not None:
+            try:
+                return [f'{self.name} {float(self._func())}']
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, k)} {v}' for k, v in items]
+
+
+class Histogram(_Metric):
+    """Histogram theo bucket cố định (đơn vị giây cho latency)."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}  # key -> [counts per bucket, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        """Context manager đo thời gian một đoạn code."""
+        return _Timer(self, labels)
+
+    def snapshot(self, **labels) -> Tuple[float, int]:
+        """(tổng, số mẫu) của một series."""
+        series = self._series.get(self._key(labels))
+        return (series[1], series[2]) if series else (0.0, 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in self._series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{labels} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class _Timer:
+    """Context manager của Histogram.time()."""
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry:
+    """Tập các metric; render() ghép text của tất cả."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = (),
+                func: Optional[Callable[[], float]] = None) -> Counter:
+        return self._get_or_create(Counter, name, description, labelnames, func)
+
+    def gauge(self, name: str, description: str, labelnames: Sequence[str] = (),
+              func: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._get_or_create(Gauge, name, description, labelnames, func)
+
+    def histogram(self, name: str, description: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, description, labelnames, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# ---------------------------------------------------------------- metric chung
+
+ACCOUNTS = REGISTRY.counter('wwm_accounts_total', 'So account da xu ly theo ket qua', ('result',))
+STEP_LATENCY = REGISTRY.histogram('wwm_step_seconds', 'Thoi gian tu luc bat dau step den khi xong', ('step',))
+STEP_RETRIES = REGISTRY.counter('wwm_step_retries_total', 'So lan retry theo step', ('step',))
+RESTARTS = REGISTRY.counter('wwm_restarts_total', 'So lan kill client va chay lai tu step 1')
+CAPTURES = REGISTRY.counter('wwm_captures_total', 'So lan chup man hinh')
+CAPTURE_LATENCY = REGISTRY.histogram('wwm_capture_seconds', 'Thoi gian chup man hinh',
+                                     buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+MATCH_LATENCY = REGISTRY.histogram('wwm_match_seconds', 'Thoi gian template matching', ('strategy',),
+                                   buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5))
+
+
+class _CaptureRate:
+    """
+    fps chụp màn hình trong `window` giây gần nhất, từ các mốc (thời điểm, CAPTURES) lấy
+    tối đa mỗi `resolution` giây. Không phụ thuộc số scraper hay nhịp scrape: scrape chỉ
+    thêm mốc khi mốc cuối đã cũ, không đặt lại điểm gốc (không tốn gì ở hot loop).
+    """
+
+    def __init__(self, window: float = 10.0, resolution: float = 1.0):
+        self.window = window
+        self.resolution = resolution
+        self._samples: Deque[Tuple[float, float]] = collections.deque([(time.monotonic(), CAPTURES.value())])
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        now = time.monotonic()
+        count = CAPTURES.value()
+        with self._lock:
+            samples = self._samples
+            if now - samples[-1][0] >= self.resolution:
+                samples.append((now, count))
+            # Giữ một mốc cũ hơn cửa sổ để luôn đo được trên đủ `window` giây
+            while len(samples) > 2 and now - samples[1][0] >= self.window:
+                samples.popleft()
+            start_time, start_count = samples[0]
+        return (count - start_count) / (now - start_time) if now > start_time else 0.0
+
+
+REGISTRY.gauge('wwm_capture_fps', 'Toc do chup man hinh trung binh trong 10 giay gan nhat', func=_CaptureRate())
+
+if PSUTIL_AVAILABLE:
+    _PROCESS = psutil.Process(os.getpid())
+    REGISTRY.counter('process_cpu_seconds_total', 'Tong thoi gian CPU cua process',
+                     func=lambda: sum(_PROCESS.cpu_times()[:2]))
+    REGISTRY.gauge('process_resident_memory_bytes', 'Bo nho RSS cua process',
+                   func=lambda: _PROCESS.memory_info().rss)
+
+
+# ---------------------------------------------------------------- HTTP server
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Không ghi log mỗi lần scrape
+
+
+def start_metrics_server(port: int = 9108, host: str = '127.0.0.1',
+                         registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    Chạy HTTP endpoint /metrics ở thread nền (daemon).
+
+    Args:
+        port: Cổng lắng nghe (0 = chọn cổng trống)
+        host: Địa chỉ lắng nghe (mặc định chỉ localhost)
+        registry: Registry cần xuất
+
+    Returns:
+        Server đang chạy (server.server_address để biết cổng thực tế, server.shutdown() để dừng).
+
+    Raises:
+        OSError: Không mở được cổng (vd đã có process khác dùng).
+    """
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+    return server
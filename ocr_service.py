@@ -0,0 +1,276 @@
+"""
+OCR Service Module
+Đọc chữ trên màn hình (thông báo lỗi, id account, ...) bằng một worker process sống
+suốt phiên chạy: model EasyOCR (hoặc Tesseract) được nạp một lần khi khởi động chứ
+không phải ở lần đọc đầu tiên trong hot path. Kết quả được cache theo hash của vùng
+ảnh nên đọc lại cùng một thông báo không tốn gì. Worker chết (crash trong engine, bị
+kill) thì pool được tạo lại và model nạp lại ở nền.
+
+Ví dụ:
+    ocr = OCRService(languages=('en', 'vi'))
+    ocr.start()                        # nạp model ở nền ngay khi khởi động
+    text = ocr.read(crop, timeout=0.5)  # None nếu quá ngân sách thời gian
+    ocr.shutdown()
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+OCR_LATENCY = REGISTRY.histogram('wwm_ocr_seconds', 'Thoi gian doc chu theo nguon ket qua', ('source',),
+                                 buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+
+ENGINES = ('easyocr', 'tesseract')
+
+# ------------------------------------------------------------------ phía worker
+
+_reader = None
+_engine = None
+
+
+def _init_worker(engine: str, languages: Sequence[str]):
+    """Nạp engine OCR một lần cho cả đời worker."""
+    global _reader, _engine
+    import cv2
+    cv2.setNumThreads(1)
+    candidates = ENGINES if engine == 'auto' else (engine,)
+    errors = []
+    for name in candidates:
+        try:
+            if name == 'easyocr':
+                import easyocr
+                _reader = easyocr.Reader(list(languages), gpu=False, verbose=False)
+            elif name == 'tesseract':
+                import pytesseract
+                pytesseract.get_tesseract_version()  # Báo lỗi ngay nếu chưa cài binary tesseract
+                _reader = pytesseract
+            else:
+                raise ValueError(f"Engine OCR không hợp lệ: {name}")
+            _engine = name
+            return
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+    _engine = None
+    _reader = "; ".join(errors)  # Giữ lý do để báo lại ở mỗi job
+
+
+def _run_ocr(crop: Optional[np.ndarray], languages: Sequence[str]) -> str:
+    """Đọc chữ trong ảnh BGR (None = chỉ kiểm tra worker đã sẵn sàng)."""
+    if _engine is None:
+        raise RuntimeError(f"Không nạp được engine OCR ({_reader})")
+    if crop is None:
+        return _engine
+    import cv2
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    if gray.shape[0] < 32:
+        # Chữ nhỏ trong game: phóng to giúp cả hai engine đọc đúng hơn
+        scale = 32.0 / gray.shape[0]
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    if _engine == 'easyocr':
+        return " ".join(_reader.readtext(gray, detail=0, paragraph=True)).strip()
+    lang = "+".join({'en': 'eng', 'vi': 'vie'}.get(code, code) for code in languages)
+    return _reader.image_to_string(gray, lang=lang, config='--psm 6').strip()
+
+
+# ------------------------------------------------------------------ phía runner
+
+class OCRService:
+    """Worker OCR dùng chung, có cache theo hash vùng ảnh và ngân sách thời gian cho mỗi lần đọc."""
+
+    def __init__(self, engine: str = 'auto', languages: Sequence[str] = ('en',), cache_size: int = 256):
+        """
+        Khởi tạo OCRService (chưa chạy worker, gọi start() lúc khởi động).
+
+        Args:
+            engine: 'easyocr', 'tesseract' hoặc 'auto' (EasyOCR, không có thì Tesseract)
+            languages: Mã ngôn ngữ kiểu EasyOCR ('en', 'vi', ...)
+            cache_size: Số kết quả giữ trong cache (LRU)
+        """
+        if engine != 'auto' and engine not in ENGINES:
+            raise ValueError(f"Engine OCR không hợp lệ: {engine} (chọn: auto, {', '.join(ENGINES)})")
+        self.engine = engine
+        self.languages = tuple(languages)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._ready: Optional[Future] = None
+        self.stats = {'reads': 0, 'cache_hits': 0, 'timeouts': 0, 'errors': 0, 'restarts': 0, 'work_time': 0.0}
+
+    def start(self) -> Future:
+        """
+        Chạy worker và nạp model ở nền (không chặn).
+
+        Returns:
+            Future trả về tên engine khi worker sẵn sàng (exception nếu không nạp được).
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=1, initializer=_init_worker,
+                                                     initargs=(self.engine, self.languages))
+                self._ready = self._executor.submit(_run_ocr, None, self.languages)
+                self._ready.add_done_callback(self._on_ready)
+            return self._ready
+
+    def _restart(self, executor: Optional[ProcessPoolExecutor]):
+        """Bỏ pool đã hỏng (worker chết) và chạy pool mới; không làm gì nếu pool đã được thay."""
+        with self._lock:
+            if executor is None or self._executor is not executor:
+                return
+            self._executor, self._ready = None, None
+            self._inflight.clear()
+            self.stats['restarts'] += 1
+        logger.warning("Worker OCR đã chết, khởi động lại")
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def _on_ready(self, future: Future):
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            return  # Worker chết trong lúc nạp: read() tự khởi động lại
+        if error is not None:
+            logger.warning("OCR không dùng được: %s", error)
+        else:
+            logger.info("OCR sẵn sàng (engine: %s)", future.result())
+
+    @property
+    def ready(self) -> bool:
+        """Worker đã nạp xong model và dùng được."""
+        return self._ready is not None and self._ready.done() and self._ready.exception() is None
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Chờ worker nạp xong model (gọi lúc khởi động nếu cần OCR ngay từ account đầu)."""
+        try:
+            self.start().result(timeout)
+            return True
+        except Exception:  # Hết thời gian hoặc engine không nạp được
+            return False
+
+    @staticmethod
+    def crop_key(crop: np.ndarray) -> str:
+        """Hash của vùng ảnh (nội dung + kích thước)."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr((crop.shape, crop.dtype.str)).encode())
+        digest.update(np.ascontiguousarray(crop).data)
+        return digest.hexdigest()
+
+    def submit(self, crop: np.ndarray) -> Future:
+        """
+        Gửi một vùng ảnh BGR để đọc (dùng kết quả trong cache nếu có).
+
+        Returns:
+            Future trả về chuỗi đã đọc được.
+        """
+        key = self.crop_key(crop)
+        with self._lock:
+            self.stats['reads'] += 1
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats['cache_hits'] += 1
+                future: Future = Future()
+                future.set_result(self._cache[key])
+                return future
+            pending = self._inflight.get(key)
+            if pending is not None:
+                return pending
+        self.start()
+        # Copy: crop thường là view vào buffer dùng lại, sẽ bị ghi đè trước khi được gửi sang worker
+        future = self._executor.submit(_run_ocr, crop.copy(), self.languages)
+        started = time.perf_counter()
+        with self._lock:
+            self._inflight[key] = future
+        future.add_done_callback(lambda f: self._on_done(key, f, started))
+        return future
+
+    def _on_done(self, key: str, future: Future, started: float):
+        """Đưa kết quả vào cache (kể cả khi caller đã bỏ chờ vì quá ngân sách)."""
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                self.stats['errors'] += 1
+                return
+            self.stats['work_time'] += elapsed
+            self._cache[key] = future.result()
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        OCR_LATENCY.observe(elapsed, source='worker')
+
+    def read(self, crop: np.ndarray, timeout: Optional[float] = 1.0) -> Optional[str]:
+        """
+        Đọc chữ trong vùng ảnh BGR trong ngân sách thời gian.
+
+        Args:
+            crop: Vùng ảnh BGR (hoặc grayscale)
+            timeout: Thời gian chờ tối đa (giây). Model chưa nạp xong cũng tính là quá ngân sách;
+                     kết quả đến muộn vẫn được cache cho lần đọc sau.
+
+        Returns:
+            Chuỗi đọc được, hoặc None nếu quá ngân sách / OCR không dùng được.
+        """
+        self.start()
+        executor, ready = self._executor, self._ready
+        if ready is not None and ready.done() and ready.exception() is not None:
+            if not isinstance(ready.exception(), BrokenProcessPool):
+                return None  # Engine không nạp được (đã báo lúc khởi động)
+            self._restart(executor)
+            return None  # Model đang nạp lại ở nền
+        start = time.perf_counter()
+        try:
+            future = self.submit(crop)
+            text = future.result(timeout)
+        except BrokenProcessPool:
+            self._restart(executor)
+            return None
+        except FutureTimeout:
+            with self._lock:
+                self.stats['timeouts'] += 1
+            logger.debug("OCR quá ngân sách %ss", timeout)
+            return None
+        except Exception as e:
+            logger.warning("Lỗi OCR: %s", e)
+            return None
+        OCR_LATENCY.observe(time.perf_counter() - start, source='read')
+        return text
+
+    def shutdown(self, wait: bool = True):
+        """Dừng worker."""
+        with self._lock:
+            executor, self._executor, self._ready = self._executor, None, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        return False
+
+
+_default: Optional[OCRService] = None
+_default_lock = threading.Lock()
+
+
+def default_service() -> OCRService:
+    """Service dùng chung trong process (worker được chạy ngay khi gọi lần đầu)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = OCRService()
+            _default.start()
+        return _default
@@ -0,0 +1,67 @@
+"""
+Pixel Signature Module
+Chữ ký pixel gọn (vài chục điểm ảnh mẫu) của template, dùng để xác nhận nhanh
+"nút vẫn ở đúng chỗ lần trước" mà không cần chạy matchTemplate.
+"""
+
+import cv2
+import numpy as np
+from typing import Optional
+
+
+class PixelSignature:
+    """Tập điểm mẫu (tọa độ + màu BGR) lấy ở các vị trí đặc trưng nhất của template."""
+
+    def __init__(self, template_bgr: np.ndarray, samples: int = 36, tolerance: int = 24,
+                 min_agreement: float = 0.9):
+        """
+        Khởi tạo PixelSignature.
+
+        Args:
+            template_bgr: Ảnh mẫu BGR
+            samples: Số điểm mẫu (xấp xỉ, chia đều theo lưới)
+            tolerance: Sai khác tối đa trên mỗi kênh màu để coi một điểm là khớp
+            min_agreement: Tỉ lệ điểm khớp tối thiểu để chữ ký được chấp nhận
+        """
+        self.tolerance = tolerance
+        self.min_agreement = min_agreement
+        self.h, self.w = template_bgr.shape[:2]
+        self.ys, self.xs = self._pick_points(template_bgr, samples)
+        self.values = template_bgr[self.ys, self.xs].astype(np.int16)
+
+    @staticmethod
+    def _pick_points(template_bgr: np.ndarray, samples: int):
+        """Chia template thành lưới, lấy trong mỗi ô điểm có gradient lớn nhất (rải đều + đặc trưng)."""
+        h, w = template_bgr.shape[:2]
+        gray = cv2.cvtColor(template_bgr, cv2.COLOR_BGR2GRAY).astype(np.float32)
+        grad = np.abs(cv2.Sobel(gray, cv2.CV_32F, 1, 0)) + np.abs(cv2.Sobel(gray, cv2.CV_32F, 0, 1))
+
+        # Lưới gần vuông theo tỉ lệ khung của template
+        cols = max(1, int(round(np.sqrt(samples * w / max(h, 1)))))
+        rows = max(1, int(round(samples / cols)))
+        ys, xs = [], []
+        for r in range(rows):
+            y0, y1 = r * h // rows, max((r + 1) * h // rows, r * h // rows + 1)
+            for c in range(cols):
+                x0, x1 = c * w // cols, max((c + 1) * w // cols, c * w // cols + 1)
+                cell = grad[y0:y1, x0:x1]
+                if cell.size == 0:
+                    continue
+                cy, cx = np.unravel_index(int(np.argmax(cell)), cell.shape)
+                ys.append(y0 + cy)
+                xs.append(x0 + cx)
+        return np.asarray(ys, dtype=np.intp), np.asarray(xs, dtype=np.intp)
+
+    def compare(self, patch_bgr: np.ndarray) -> Optional[float]:
+        """
+        So chữ ký với một patch cùng kích thước template.
+
+        Returns:
+            Độ tương đồng (0.0 - 1.0) nếu chữ ký khớp, None nếu không khớp.
+        """
+        if patch_bgr.shape[0] < self.h or patch_bgr.shape[1] < self.w:
+            return None
+        diff = np.abs(patch_bgr[self.ys, self.xs].astype(np.int16) - self.values).max(axis=1)
+        if np.count_nonzero(diff <= self.tolerance) < self.min_agreement * len(diff):
+            return None
+        return 1.0 - float(diff.mean()) / 255.0
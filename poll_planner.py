@@ -0,0 +1,160 @@
+"""
+Poll Planner Module
+Học phân bố thời gian từ thao tác trước (click/nhấn phím) đến khi màn hình của mỗi
+step xuất hiện, lưu lại giữa các lần chạy, và dùng nó để lên lịch poll: ngủ thẳng
+đến gần thời điểm dự kiến, poll dày quanh khoảng thường xuất hiện, thưa dần khi đã
+quá hạn. Step hiện trong 200 ms được phản ứng nhanh hơn, còn step tải lâu (sau step 9)
+không tốn hàng chục lần chụp màn hình vô ích.
+
+Ví dụ:
+    planner = PollPlanner("data/step_timing.json")
+    delay = planner.next_delay(step_num, elapsed, fallback=2.0)
+    planner.record(step_num, appeared_after)
+    planner.save()
+"""
+
+import json
+import os
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from metrics import REGISTRY
+
+STEP_POLLS = REGISTRY.counter('wwm_step_polls_total', 'So lan poll (chup + tim template) theo step', ('step',))
+
+
+def _quantile(sorted_values, q: float) -> float:
+    """Quantile nội suy tuyến tính trên list đã sắp xếp."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    pos = q * (len(sorted_values) - 1)
+    low = int(pos)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (pos - low)
+
+
+class PollPlanner:
+    """Mô hình thời gian xuất hiện theo step và lịch poll tương ứng."""
+
+    def __init__(self, path: Optional[str] = "data/step_timing.json", window: int = 200,
+                 min_samples: int = 5, min_interval: float = 0.05, max_interval: float = 2.0):
+        """
+        Khởi tạo PollPlanner.
+
+        Args:
+            path: File JSON lưu mẫu thời gian (None = không lưu, chỉ học trong phiên chạy)
+            window: Số mẫu gần nhất giữ cho mỗi step
+            min_samples: Số mẫu tối thiểu trước khi bỏ lịch poll đều (dùng fallback)
+            min_interval: Khoảng poll nhỏ nhất quanh thời điểm dự kiến (giây)
+            max_interval: Khoảng poll lớn nhất khi đã quá hạn (giây)
+        """
+        self.path = path
+        self.window = window
+        self.min_samples = min_samples
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.samples: Dict[int, Deque[float]] = {}
+        self._plans: Dict[int, Optional[tuple]] = {}
+        self._dirty = False
+        self.load()
+
+    # ---------------------------------------------------------------- lưu / đọc
+
+    def load(self):
+        """Đọc mẫu đã lưu (file hỏng thì bắt đầu lại từ đầu)."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for step, values in data.get('steps', {}).items():
+                self.samples[int(step)] = deque((float(v) for v in values), maxlen=self.window)
+        except (OSError, ValueError) as e:
+            print(f"⚠ Không đọc được {self.path}: {e}")
+        self._plans.clear()
+
+    def save(self):
+        """Ghi mẫu ra file nếu có thay đổi (ghi file tạm rồi thay thế)."""
+        if not self.path or not self._dirty:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {'steps': {str(step): [round(v, 3) for v in values]
+                          for step, values in sorted(self.samples.items())}}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    # ---------------------------------------------------------------- học
+
+    def record(self, step: int, seconds: float):
+        """Thêm một mẫu: màn hình của step xuất hiện sau `seconds` giây kể từ thao tác trước."""
+        values = self.samples.get(step)
+        if values is None:
+            values = self.samples[step] = deque(maxlen=self.window)
+        values.append(max(0.0, seconds))
+        self._plans.pop(step, None)
+        self._dirty = True
+
+    def expected(self, step: int) -> Optional[Dict[str, float]]:
+        """Quantile thời gian xuất hiện (p05, p50, p95), None nếu chưa đủ mẫu."""
+        values = self.samples.get(step)
+        if not values or len(values) < self.min_samples:
+            return None
+        ordered = sorted(values)
+        return {'p05': _quantile(ordered, 0.05), 'p50': _quantile(ordered, 0.5),
+                'p95': _quantile(ordered, 0.95), 'samples': len(ordered)}
+
+    def _plan(self, step: int) -> Optional[tuple]:
+        """(bắt đầu poll dày, kết thúc poll dày, khoảng poll dày) - tính lại khi có mẫu mới."""
+        if step not in self._plans:
+            q = self.expected(step)
+            if q is None:
+                self._plans[step] = None
+            else:
+                # Nới khoảng dày để vẫn bắt kịp khi game nhanh/chậm hơn các mẫu cũ
+                start = q['p05'] * 0.75
+                end = q['p95'] * 1.25 + self.min_interval
+                interval = min(self.max_interval / 4, max(self.min_interval, (end - start) / 20))
+                self._plans[step] = (start, end, interval)
+        return self._plans[step]
+
+    # ---------------------------------------------------------------- lịch poll
+
+    def next_delay(self, step: int, elapsed: float, fallback: float) -> float:
+        """
+        Thời gian chờ trước lần poll tiếp theo.
+
+        Args:
+            step: Số thứ tự step
+            elapsed: Thời gian từ thao tác trước đến lúc này (giây)
+            fallback: Khoảng poll đều khi chưa đủ mẫu (retry_delay cũ)
+
+        Returns:
+            Số giây cần chờ.
+        """
+        plan = self._plan(step)
+        if plan is None:
+            return fallback
+        start, end, interval = plan
+        if elapsed < start:
+            # Chưa tới lúc màn hình thường xuất hiện: ngủ thẳng đến đầu khoảng dày
+            return max(interval, start - elapsed)
+        if elapsed <= end:
+            return interval
+        # Đã quá hạn: thưa dần theo độ trễ
+        return min(self.max_interval, max(interval, (elapsed - end) / 2))
+
+    def first_delay(self, step: int, elapsed: float) -> float:
+        """Thời gian chờ trước lần poll đầu tiên (0 nếu chưa đủ mẫu hoặc đã tới khoảng dày)."""
+        plan = self._plan(step)
+        if plan is None or elapsed >= plan[0]:
+            return 0.0
+        return plan[0] - elapsed
+
+    def summary(self) -> Dict[int, Dict[str, float]]:
+        """Quantile của các step đã đủ mẫu."""
+        return {step: q for step in sorted(self.samples) for q in [self.expected(step)] if q is not None}
@@ -1,11 +1,14 @@
 """
-Process Utilities - Quản lý process Windows
+Process Utilities - Quản lý process (Windows, có hỗ trợ Linux khi có psutil)
 Các hàm để kill, tìm, và quản lý process
 """
 
 import sys
 import subprocess
 import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 try:
     import win32api
@@ -26,77 +29,33 @@ except ImportError:
 
 def kill_process_by_name(process_name: str, force: bool = False) -> bool:
     """
-    Kill process theo tên.
+    Kill process theo tên (kèm toàn bộ process con).
+    
+    Tên được so khớp chính xác với tên image (không phân biệt hoa thường, có hay không
+    có .exe): "wwm.exe" không còn kill nhầm "wwm_launcher.exe" như khi so chuỗi con.
+    Muốn tìm theo chuỗi con thì dùng find_process().
     
     Args:
-        process_name: Tên process (ví dụ: "wwm.exe")
-        force: True để force kill, False để terminate bình thường
+        process_name: Tên image (ví dụ: "wwm.exe")
+        force: True để force kill ngay, False để terminate trước rồi mới kill nếu quá hạn
     
     Returns:
-        True nếu thành công, False nếu không tìm thấy hoặc lỗi
+        True nếu tìm thấy và tất cả đã thoát, False nếu không tìm thấy hoặc lỗi
     """
-    if sys.platform != 'win32':
-        print("Chức năng này chỉ hoạt động trên Windows")
+    report = terminate_processes(name=process_name, grace_timeout=0.0 if force else 3.0)
+    if not report['found']:
+        print(f"✗ Không tìm thấy process: {process_name}")
         return False
     
-    # Loại bỏ .exe nếu có
-    if process_name.lower().endswith('.exe'):
-        process_name = process_name[:-4]
-    
-    killed = False
-    
-    # Phương pháp 1: Sử dụng psutil (ưu tiên)
-    if PSUTIL_AVAILABLE:
-        try:
-            for proc in psutil.process_iter(['pid', 'name']):
-                try:
-                    if proc.info['name'] and process_name.lower() in proc.info['name'].lower():
-                        pid = proc.info['pid']
-                        p = psutil.Process(pid)
-                        if force:
-                            p.kill()
-                            print(f"✓ Đã force kill process: {proc.info['name']} (PID: {pid})")
-                        else:
-                            p.terminate()
-                            print(f"✓ Đã terminate process: {proc.info['name']} (PID: {pid})")
-                        killed = True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                    pass
-            if killed:
-                return True
-        except Exception as e:
-            print(f"Lỗi khi dùng psutil: {e}")
-    
-    # Phương pháp 2: Sử dụng taskkill (fallback)
-    try:
-        if force:
-            result = subprocess.run(
-                ['taskkill', '/F', '/IM', f'{process_name}.exe'],
-                capture_output=True,
-                text=True,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-        else:
-            result = subprocess.run(
-                ['taskkill', '/IM', f'{process_name}.exe'],
-                capture_output=True,
-                text=True,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-        
-        if result.returncode == 0:
-            print(f"✓ Đã kill process: {process_name}.exe")
-            print(result.stdout)
-            return True
+    action = "force kill" if force else "terminate"
+    for pid in report['found']:
+        if isinstance(pid, str):  # taskkill /IM: không biết PID
+            print(f"✓ Đã {action} process: {pid}")
+        elif pid in report['alive']:
+            print(f"✗ Không thể {action} process: {process_name} (PID: {pid})")
         else:
-            if "not found" in result.stdout.lower() or "không tìm thấy" in result.stdout.lower():
-                print(f"✗ Không tìm thấy process: {process_name}.exe")
-            else:
-                print(f"✗ Lỗi khi kill process: {result.stderr}")
-            return False
-    except Exception as e:
-        print(f"✗ Lỗi khi dùng taskkill: {e}")
-        return False
+            print(f"✓ Đã {action} process: {process_name} (PID: {pid}, thoát sau {report['exit_times'].get(pid, 0.0):.2f}s)")
+    return not report['alive']
 
 
 def find_process(process_name: str):
@@ -109,7 +68,7 @@ def find_process(process_name: str):
     Returns:
         List các process tìm thấy [(pid, name, ...), ...]
     """
-    if sys.platform != 'win32':
+    if sys.platform != 'win32' and not PSUTIL_AVAILABLE:
         return []
     
     # Loại bỏ .exe nếu có
@@ -135,7 +94,7 @@ def find_process(process_name: str):
             print(f"Lỗi khi tìm process: {e}")
     
     # Fallback: Sử dụng tasklist
-    if not processes:
+    if not processes and sys.platform == 'win32':
         try:
             result = subprocess.run(
                 ['tasklist', '/FI', f'IMAGENAME eq {process_name}.exe', '/FO', 'CSV'],
@@ -160,6 +119,389 @@ def find_process(process_name: str):
     return processes
 
 
+def normalize_image_name(process_name: str) -> str:
+    """Chuẩn hóa tên image để so sánh: chữ thường, bỏ đuôi .exe."""
+    name = process_name.strip().lower()
+    return name[:-4] if name.endswith('.exe') else name
+
+
+def _scan_pids(image_name: str) -> Dict[int, float]:
+    """Quét toàn bộ process một lần, trả về {pid: create_time} của các process đúng tên image."""
+    found = {}
+    if PSUTIL_AVAILABLE:
+        for proc in psutil.process_iter(['pid', 'name', 'create_time']):
+            try:
+                name = proc.info['name']
+                if name and normalize_image_name(name) == image_name:
+                    found[proc.info['pid']] = proc.info['create_time'] or 0.0
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+        return found
+    
+    for proc in find_process(image_name):
+        try:
+            if normalize_image_name(proc['name']) == image_name:
+                found[int(proc['pid'])] = 0.0
+        except (KeyError, ValueError):
+            pass
+    return found
+
+
+def _pid_alive(pid: int, create_time: float) -> Optional[bool]:
+    """
+    Kiểm tra nhanh một PID còn sống (và chưa bị tái sử dụng cho process khác).
+    
+    Returns:
+        True/False, hoặc None nếu không kiểm tra được riêng lẻ (cần quét toàn bộ).
+    """
+    if not PSUTIL_AVAILABLE:
+        return None
+    try:
+        proc = psutil.Process(pid)
+        if create_time and abs(proc.create_time() - create_time) > 0.01:
+            return False  # PID đã bị tái sử dụng
+        return proc.status() != psutil.STATUS_ZOMBIE
+    except (psutil.NoSuchProcess, psutil.ZombieProcess):
+        return False
+    except psutil.AccessDenied:
+        return True
+
+
+def _collect_tree(root_pids: List[int], include_children: bool = True) -> List["psutil.Process"]:
+    """Lấy process gốc + toàn bộ con cháu (lấy trước khi kill để con không bị mất dấu khi cha thoát)."""
+    procs = {}
+    for pid in root_pids:
+        try:
+            root = psutil.Process(pid)
+            procs[root.pid] = root
+            if include_children:
+                for child in root.children(recursive=True):
+                    procs[child.pid] = child
+        except (psutil.NoSuchProcess, psutil.ZombieProcess):
+            pass
+        except psutil.AccessDenied:
+            procs.setdefault(pid, None)
+    return [p for p in procs.values() if p is not None]
+
+
+def _signal_all(procs: List["psutil.Process"], kill: bool):
+    """Gửi terminate/kill cho tất cả process cùng lúc (không chờ từng cái)."""
+    for proc in procs:
+        try:
+            if kill:
+                proc.kill()
+            else:
+                proc.terminate()
+        except (psutil.NoSuchProcess, psutil.ZombieProcess):
+            pass
+        except psutil.AccessDenied as e:
+            print(f"✗ Không có quyền dừng PID {proc.pid}: {e}")
+
+
+def _taskkill(pid: Optional[int], name: Optional[str], force: bool, tree: bool) -> bool:
+    """Fallback Windows khi không có psutil."""
+    args = ['taskkill']
+    if force:
+        args.append('/F')
+    if tree:
+        args.append('/T')
+    args += ['/PID', str(pid)] if pid is not None else ['/IM', f'{normalize_image_name(name)}.exe']
+    try:
+        result = subprocess.run(args, capture_output=True, text=True,
+                                creationflags=subprocess.CREATE_NO_WINDOW)
+        return result.returncode == 0
+    except Exception as e:
+        print(f"✗ Lỗi khi dùng taskkill: {e}")
+        return False
+
+
+def terminate_processes(pid: Optional[int] = None, name: Optional[str] = None,
+                        grace_timeout: float = 3.0, kill_timeout: float = 3.0,
+                        include_children: bool = True) -> dict:
+    """
+    Dừng process theo PID hoặc theo tên image, kèm cả cây process con.
+    
+    Tất cả process được gửi terminate cùng lúc, chờ chung tối đa `grace_timeout`;
+    process nào còn sống được kill và chờ thêm tối đa `kill_timeout`.
+    
+    Args:
+        pid: PID cần dừng (ưu tiên hơn name - dùng để kill đúng một client)
+        name: Tên image (ví dụ "wwm.exe") - dừng tất cả process đúng tên này
+        grace_timeout: Thời gian chờ sau terminate (giây). 0 = kill ngay.
+        kill_timeout: Thời gian chờ sau kill (giây)
+        include_children: True để dừng cả process con
+    
+    Returns:
+        dict với các khóa:
+            'found': PID đã tìm thấy (gồm cả con); fallback taskkill /IM không biết PID
+                     nên ghi tên image (ví dụ "wwm.exe") khi kill thành công
+            'terminated': PID thoát sau terminate
+            'killed': PID phải kill
+            'alive': PID vẫn còn sống sau khi hết thời gian
+            'exit_times': {pid: số giây từ lúc bắt đầu đến khi thoát}
+            'elapsed': Tổng thời gian (giây)
+    """
+    start = time.monotonic()
+    report = {'found': [], 'terminated': [], 'killed': [], 'alive': [], 'exit_times': {}, 'elapsed': 0.0}
+    if pid is None and not name:
+        raise ValueError("Cần truyền pid hoặc name")
+    
+    if not PSUTIL_AVAILABLE:
+        if sys.platform == 'win32':
+            if _taskkill(pid, name, force=grace_timeout <= 0, tree=include_children):
+                report['found'] = [pid] if pid is not None else [f"{normalize_image_name(name)}.exe"]
+                report['killed' if grace_timeout <= 0 else 'terminated'] = list(report['found'])
+        elif pid is not None:
+            _posix_terminate(pid, grace_timeout, kill_timeout, report, start)
+        report['elapsed'] = time.monotonic() - start
+        return report
+    
+    roots = [pid] if pid is not None else list(_scan_pids(normalize_image_name(name)))
+    procs = _collect_tree(roots, include_children)
+    report['found'] = [p.pid for p in procs]
+    
+    def on_exit(proc):
+        report['exit_times'][proc.pid] = time.monotonic() - start
+    
+    alive = procs
+    if grace_timeout > 0 and alive:
+        _signal_all(alive, kill=False)
+        gone, alive = psutil.wait_procs(alive, timeout=grace_timeout, callback=on_exit)
+        report['terminated'] = [p.pid for p in gone]
+    if alive:
+        _signal_all(alive, kill=True)
+        gone, alive = psutil.wait_procs(alive, timeout=kill_timeout, callback=on_exit)
+        report['killed'] = [p.pid for p in gone]
+    
+    report['alive'] = [p.pid for p in alive]
+    report['elapsed'] = time.monotonic() - start
+    return report
+
+
+def _posix_terminate(pid: int, grace_timeout: float, kill_timeout: float, report: dict, start: float):
+    """Fallback POSIX khi không có psutil: SIGTERM, chờ, rồi SIGKILL (không xử lý cây con)."""
+    import signal
+    
+    def wait_gone(timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return True
+            time.sleep(0.02)
+        return False
+    
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return
+    report['found'] = [pid]
+    if grace_timeout > 0:
+        os.kill(pid, signal.SIGTERM)
+        if wait_gone(grace_timeout):
+            report['terminated'] = [pid]
+            report['exit_times'][pid] = time.monotonic() - start
+            return
+    os.kill(pid, signal.SIGKILL)
+    if wait_gone(kill_timeout):
+        report['killed'] = [pid]
+        report['exit_times'][pid] = time.monotonic() - start
+    else:
+        report['alive'] = [pid]
+
+
+class ProcessWatcher:
+    """
+    Theo dõi các process có cùng tên image (ví dụ "wwm.exe") với cache PID.
+    
+    PID đã biết được kiểm tra riêng lẻ (rẻ), còn quét toàn bộ danh sách process để
+    phát hiện process mới chỉ chạy mỗi `scan_interval`. Có callback khi process
+    xuất hiện/kết thúc và các hàm chờ có timeout thay cho sleep cố định.
+    """
+    
+    def __init__(self, process_name: str = "wwm.exe", poll_interval: float = 0.1,
+                 scan_interval: float = 0.5):
+        """
+        Khởi tạo ProcessWatcher.
+        
+        Args:
+            process_name: Tên image cần theo dõi (có hoặc không có .exe)
+            poll_interval: Chu kỳ kiểm tra các PID đã biết (giây)
+            scan_interval: Chu kỳ tối thiểu giữa hai lần quét toàn bộ process (giây)
+        """
+        self.process_name = process_name
+        self.poll_interval = poll_interval
+        self.scan_interval = scan_interval
+        self._image = normalize_image_name(process_name)
+        self._pids: Dict[int, float] = {}
+        self._last_scan = 0.0
+        self._refresh_lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._spawn_callbacks: List[Callable[[int], None]] = []
+        self._exit_callbacks: List[Callable[[int], None]] = []
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.refresh(full_scan=True)
+    
+    @property
+    def pids(self) -> Set[int]:
+        """Tập PID đang được theo dõi (theo cache hiện tại)."""
+        with self._changed:
+            return set(self._pids)
+    
+    def on_spawn(self, callback: Callable[[int], None]):
+        """Đăng ký callback(pid) khi có process mới xuất hiện."""
+        self._spawn_callbacks.append(callback)
+    
+    def on_exit(self, callback: Callable[[int], None]):
+        """Đăng ký callback(pid) khi một process đang theo dõi kết thúc."""
+        self._exit_callbacks.append(callback)
+    
+    def track(self, pid: int):
+        """Thêm một PID đã biết (ví dụ vừa tự khởi chạy) vào cache mà không cần quét."""
+        create_time = 0.0
+        if PSUTIL_AVAILABLE:
+            try:
+                create_time = psutil.Process(pid).create_time()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        with self._changed:
+            self._pids[pid] = create_time
+            self._changed.notify_all()
+    
+    def refresh(self, full_scan: bool = False) -> Tuple[List[int], List[int]]:
+        """
+        Cập nhật cache PID và phát sự kiện.
+        
+        Args:
+            full_scan: True để quét toàn bộ ngay (bỏ qua scan_interval)
+        
+        Returns:
+            (danh sách PID mới xuất hiện, danh sách PID đã kết thúc)
+        """
+        with self._refresh_lock:
+            now = time.monotonic()
+            with self._changed:
+                cached = dict(self._pids)
+            
+            exited = []
+            need_scan = full_scan or now - self._last_scan >= self.scan_interval
+            for pid, create_time in cached.items():
+                alive = _pid_alive(pid, create_time)
+                if alive is None:
+                    need_scan = True
+                elif not alive:
+                    exited.append(pid)
+            
+            spawned = []
+            if need_scan:
+                current = _scan_pids(self._image)
+                self._last_scan = now
+                spawned = [pid for pid in current if pid not in cached]
+                exited.extend(pid for pid in cached if pid not in current and pid not in exited)
+            
+            if spawned or exited:
+                with self._changed:
+                    for pid in exited:
+                        self._pids.pop(pid, None)
+                    for pid in spawned:
+                        self._pids[pid] = current[pid]
+                    self._changed.notify_all()
+        
+        for pid in spawned:
+            for callback in self._spawn_callbacks:
+                callback(pid)
+        for pid in exited:
+            for callback in self._exit_callbacks:
+                callback(pid)
+        return spawned, exited
+    
+    def _wait(self, predicate: Callable[[], bool], timeout: float) -> bool:
+        """Chờ đến khi predicate() đúng hoặc hết timeout (dùng thread nền nếu đang chạy)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._thread is None:
+                self.refresh()
+            with self._changed:
+                if predicate():
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if self._thread is not None:
+                    self._changed.wait(min(remaining, self.poll_interval))
+                    continue
+            time.sleep(min(remaining, self.poll_interval))
+    
+    def wait_for_exit(self, pid: Optional[int] = None, timeout: float = 10.0) -> bool:
+        """
+        Chờ một PID (hoặc tất cả process đang theo dõi nếu pid=None) kết thúc.
+        
+        Returns:
+            True nếu đã kết thúc trong timeout, False nếu hết thời gian.
+        """
+        if pid is not None and PSUTIL_AVAILABLE:
+            # psutil.wait chờ theo sự kiện (waitpid/WaitForSingleObject) thay vì quét danh sách
+            try:
+                psutil.Process(pid).wait(timeout)
+            except psutil.NoSuchProcess:
+                pass
+            except psutil.TimeoutExpired:
+                return False
+            self.refresh()
+            return True
+        
+        if pid is not None:
+            return self._wait(lambda: pid not in self._pids, timeout)
+        return self._wait(lambda: not self._pids, timeout)
+    
+    def wait_for_spawn(self, timeout: float = 60.0, exclude: Optional[Set[int]] = None) -> Optional[int]:
+        """
+        Chờ một process mới (PID chưa có trong cache hiện tại và `exclude`) xuất hiện.
+        
+        Returns:
+            PID mới, hoặc None nếu hết timeout.
+        """
+        known = self.pids | set(exclude or ())
+        found = []
+        
+        def has_new():
+            new = [p for p in self._pids if p not in known]
+            if new:
+                found.append(new[0])
+            return bool(new)
+        
+        # Quét toàn bộ theo scan_interval, không phải mỗi poll
+        if self._wait(has_new, timeout):
+            return found[0]
+        return None
+    
+    def _run(self):
+        """Vòng lặp thread nền."""
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Lỗi khi theo dõi process {self.process_name}: {e}")
+    
+    def start(self):
+        """Chạy thread nền để phát sự kiện liên tục (callback chạy trên thread này)."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f"ProcessWatcher-{self._image}", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Dừng thread nền."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=2.0)
+        self._thread = None
+
+
 def kill_wwm():
     """Kill process wwm.exe"""
     return kill_process_by_name("wwm.exe", force=True)
@@ -175,10 +517,11 @@ def main():
     print("3. Kill process wwm.exe (bình thường)")
     print("4. Tìm process khác")
     print("5. Kill process khác")
+    print("6. Kill cây process theo PID")
     print("0. Thoát")
     print("=" * 60)
     
-    choice = input("\nChọn (0-5): ").strip()
+    choice = input("\nChọn (0-6): ").strip()
     
     if choice == "1":
         processes = find_process("wwm.exe")
@@ -229,6 +572,20 @@ def main():
             else:
                 print("✗ Không thành công")
     
+    elif choice == "6":
+        pid_input = input("Nhập PID: ").strip()
+        try:
+            pid = int(pid_input)
+        except ValueError:
+            print("PID không hợp lệ!")
+            return
+        report = terminate_processes(pid=pid)
+        if not report['found']:
+            print(f"✗ Không tìm thấy PID: {pid}")
+        else:
+            print(f"✓ Đã dừng {len(report['found']) - len(report['alive'])}/{len(report['found'])} process "
+                  f"trong {report['elapsed']:.2f}s (terminate: {len(report['terminated'])}, kill: {len(report['killed'])})")
+    
     elif choice == "0":
         print("Tạm biệt!")
     else:
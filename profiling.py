@@ -0,0 +1,305 @@
+"""
+Profiling Module
+Chế độ --profile cho run.py, debug.py và quick_test.py: chạy luồng bình thường
+dưới cProfile, tách profile theo từng step và tổng hợp thời gian theo nhóm
+(chụp màn hình, cvtColor, matchTemplate, gửi input, logging, sleep) để có số liệu
+trước/sau mỗi thay đổi hiệu năng.
+
+cProfile chỉ đo thread gọi nó. Input gửi qua InputDispatcher (thread theo cửa sổ) và
+việc format/ghi log của log_pipeline (thread nền) không nằm trong profile, nên nhóm
+'input' và 'logging' thấp hơn thực tế khi bật các tính năng đó: thread chính chỉ còn
+thời gian chờ Future của dispatcher và chi phí đưa record vào queue.
+
+Cách dùng:
+    python run.py --profile                    # ghi vào profiles/<thời_gian>/
+    python quick_test.py --profile=profiles/A detect
+    python profiling.py show profiles/A        # in tóm tắt một lần chạy
+    python profiling.py compare profiles/A profiles/B
+
+Trong code:
+    import profiling
+    with profiling.step("step3"):
+        ...  # không tốn gì khi chưa bật profile
+"""
+
+import cProfile
+import contextlib
+import json
+import os
+import pstats
+import sys
+import time
+from typing import Dict, List, Optional
+
+# Nhóm thời gian: tên nhóm -> chuỗi con cần có trong tên hàm (pstats)
+CATEGORIES = {
+    'capture': ('screenshot', 'ImageGrab'),
+    'cvtColor': ('cvtColor',),
+    'matchTemplate': ('matchTemplate',),
+    # Gửi input + dựng cấu trúc ctypes cho SendInput (class MOUSEINPUT/INPUT trong input_backends)
+    'input': ('SendInput', 'PostMessage', 'mouse_event', 'SetCursorPos', 'MOUSEINPUT', ':INPUT', ':_INPUT'),
+    'logging': ('logging' + os.sep, 'logging/'),
+    'sleep': ('time.sleep',),
+}
+
+SUMMARY_FILE = 'summary.json'
+
+
+def _label(func) -> str:
+    """Tên dễ đọc của một hàm trong pstats: file:dòng(tên) hoặc tên built-in."""
+    filename, lineno, name = func
+    if filename == '~':
+        return name
+    return f"{os.path.basename(filename)}:{lineno}({name})"
+
+
+def _matches(func, patterns) -> bool:
+    filename, _, name = func
+    text = name if filename == '~' else f"{filename}:{name}"
+    return any(p in text for p in patterns)
+
+
+def category_times(stats: pstats.Stats) -> Dict[str, float]:
+    """
+    Thời gian (giây) theo nhóm. Với mỗi nhóm chỉ cộng cumtime của các hàm khớp mà
+    không được gọi bởi một hàm khớp khác cùng nhóm, để không tính trùng.
+    """
+    result = {}
+    for category, patterns in CATEGORIES.items():
+        total = 0.0
+        for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+            if not _matches(func, patterns):
+                continue
+            if any(_matches(caller, patterns) for caller in callers):
+                continue
+            total += ct
+        result[category] = round(total, 6)
+    return result
+
+
+def top_functions(stats: pstats.Stats, limit: int = 25) -> List[dict]:
+    """Các hàm tốn thời gian tự thân (tottime) nhiều nhất."""
+    rows = []
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        rows.append({'func': _label(func), 'calls': nc, 'tottime': round(tt, 6), 'cumtime': round(ct, 6)})
+    rows.sort(key=lambda r: r['tottime'], reverse=True)
+    return rows[:limit]
+
+
+class ProfileSession:
+    """Một lần chạy có profile: một cProfile cho mỗi step, cộng một cho phần ngoài step."""
+
+    def __init__(self, output_dir: Optional[str] = None):
+        """
+        Args:
+            output_dir: Thư mục ghi kết quả (None = profiles/<YYYYmmdd-HHMMSS>)
+        """
+        self.output_dir = output_dir or os.path.join('profiles', time.strftime('%Y%m%d-%H%M%S'))
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        self._wall: Dict[str, float] = {}
+        self._calls: Dict[str, int] = {}
+        self._stack: List[str] = []
+        self._started = None
+
+    def _profile(self, name: str) -> cProfile.Profile:
+        profile = self._profiles.get(name)
+        if profile is None:
+            profile = self._profiles[name] = cProfile.Profile()
+        return profile
+
+    def start(self):
+        """Bắt đầu profile phần ngoài step."""
+        self._started = time.perf_counter()
+        self._stack = ['_main']
+        self._profile('_main').enable()
+
+    @contextlib.contextmanager
+    def step(self, name: str):
+        """Chuyển sang profile riêng của step `name` trong khối with (lồng nhau được)."""
+        outer = self._stack[-1]
+        self._profiles[outer].disable()
+        self._stack.append(name)
+        profile = self._profile(name)
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._wall[name] = self._wall.get(name, 0.0) + time.perf_counter() - start
+            self._calls[name] = self._calls.get(name, 0) + 1
+            self._stack.pop()
+            self._profiles[outer].enable()
+
+    def stop(self) -> str:
+        """
+        Dừng profile và ghi kết quả.
+
+        Returns:
+            Thư mục chứa kết quả: <step>.prof, total.prof và summary.json
+        """
+        for name in self._stack:
+            self._profiles[name].disable()
+        self._stack = []
+        total_wall = time.perf_counter() - self._started if self._started else 0.0
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        summary = {'wall': round(total_wall, 6), 'steps': {}, 'categories': {}, 'top': []}
+        total_stats = None
+        for name, profile in self._profiles.items():
+            path = os.path.join(self.output_dir, f"{name}.prof")
+            profile.dump_stats(path)
+            if total_stats is None:
+                total_stats = pstats.Stats(path)
+            else:
+                total_stats.add(path)
+            if name == '_main':
+                continue
+            stats = pstats.Stats(profile)
+            summary['steps'][name] = {
+                'calls': self._calls.get(name, 0),
+                'wall': round(self._wall.get(name, 0.0), 6),
+                'categories': category_times(stats),
+            }
+        if total_stats is not None:
+            total_stats.dump_stats(os.path.join(self.output_dir, 'total.prof'))
+            summary['categories'] = category_times(total_stats)
+            summary['top'] = top_functions(total_stats)
+
+        with open(os.path.join(self.output_dir, SUMMARY_FILE), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        return self.output_dir
+
+
+_session: Optional[ProfileSession] = None
+
+
+def start(output_dir: Optional[str] = None) -> ProfileSession:
+    """Bật profile cho cả tiến trình (gọi một lần khi có --profile)."""
+    global _session
+    _session = ProfileSession(output_dir)
+    _session.start()
+    return _session
+
+
+def stop() -> Optional[str]:
+    """Tắt profile, ghi kết quả, in tóm tắt và trả về thư mục kết quả."""
+    global _session
+    session, _session = _session, None
+    if session is None:
+        return None
+    output_dir = session.stop()
+    print(f"\n✓ Đã ghi profile vào: {output_dir}")
+    print_summary(load_summary(output_dir))
+    return output_dir
+
+
+def step(name: str):
+    """Context manager đánh dấu một step; không làm gì khi chưa bật profile."""
+    if _session is None:
+        return contextlib.nullcontext()
+    return _session.step(name)
+
+
+def enabled() -> bool:
+    return _session is not None
+
+
+def profile_from_argv(argv: Optional[List[str]] = None) -> bool:
+    """
+    Tìm và gỡ cờ --profile (hoặc --profile=<thư_mục>) khỏi argv; nếu có thì bật profile.
+    Các tham số còn lại giữ nguyên vị trí cho script.
+
+    Returns:
+        True nếu đã bật profile.
+    """
+    argv = sys.argv if argv is None else argv
+    for index, arg in enumerate(argv):
+        if arg == '--profile' or arg.startswith('--profile='):
+            break
+    else:
+        return False
+    output_dir = argv.pop(index).partition('=')[2] or None
+    start(output_dir)
+    print(f"→ Đang chạy với profile (kết quả: {_session.output_dir})")
+    return True
+
+
+def run_profiled(func, *args, **kwargs):
+    """Chạy func(*args, **kwargs), luôn ghi profile khi kết thúc (kể cả Ctrl+C)."""
+    try:
+        return func(*args, **kwargs)
+    finally:
+        stop()
+
+
+# ------------------------------------------------------------------ báo cáo
+
+def load_summary(output_dir: str) -> dict:
+    with open(os.path.join(output_dir, SUMMARY_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def print_summary(summary: dict):
+    """In tóm tắt một lần chạy."""
+    print(f"\nTổng thời gian: {summary['wall']:.3f}s")
+    print("Theo nhóm:")
+    for category, seconds in summary['categories'].items():
+        print(f"  {category:<14} {seconds:>10.3f}s")
+    if summary['steps']:
+        print("Theo step:")
+        for name, info in sorted(summary['steps'].items()):
+            print(f"  {name:<14} {info['wall']:>10.3f}s  ({info['calls']} lần)")
+    print("Hàm tốn nhiều thời gian nhất (tottime):")
+    for row in summary['top'][:10]:
+        print(f"  {row['tottime']:>10.3f}s  {row['calls']:>8}  {row['func']}")
+
+
+def _delta(before: float, after: float) -> str:
+    diff = after - before
+    pct = f"{diff / before:+.0%}" if before > 0 else "   mới"
+    return f"{before:>10.3f}s {after:>10.3f}s {diff:>+10.3f}s {pct:>6}"
+
+
+def compare(dir_a: str, dir_b: str):
+    """In chênh lệch giữa hai lần chạy (A = trước, B = sau)."""
+    a, b = load_summary(dir_a), load_summary(dir_b)
+    print(f"A: {dir_a}\nB: {dir_b}")
+    print(f"\n{'':<16} {'A':>11} {'B':>11} {'B-A':>11}")
+    print(f"{'wall':<16} {_delta(a['wall'], b['wall'])}")
+
+    print("\nTheo nhóm:")
+    for category in CATEGORIES:
+        print(f"  {category:<14} {_delta(a['categories'].get(category, 0.0), b['categories'].get(category, 0.0))}")
+
+    print("\nTheo step (thời gian mỗi lần):")
+    for name in sorted(set(a['steps']) | set(b['steps'])):
+        sa, sb = a['steps'].get(name), b['steps'].get(name)
+        per_a = sa['wall'] / sa['calls'] if sa and sa['calls'] else 0.0
+        per_b = sb['wall'] / sb['calls'] if sb and sb['calls'] else 0.0
+        print(f"  {name:<14} {_delta(per_a, per_b)}")
+
+    print("\nHàm thay đổi nhiều nhất (tottime):")
+    top_a = {row['func']: row['tottime'] for row in a['top']}
+    top_b = {row['func']: row['tottime'] for row in b['top']}
+    changes = sorted(set(top_a) | set(top_b),
+                     key=lambda f: abs(top_b.get(f, 0.0) - top_a.get(f, 0.0)), reverse=True)
+    for func in changes[:15]:
+        print(f"  {_delta(top_a.get(func, 0.0), top_b.get(func, 0.0))}  {func}")
+
+
+def main():
+    """CLI: show <thư_mục> | compare <thư_mục_A> <thư_mục_B>"""
+    args = sys.argv[1:]
+    if len(args) == 2 and args[0] == 'show':
+        print_summary(load_summary(args[1]))
+    elif len(args) == 3 and args[0] == 'compare':
+        compare(args[1], args[2])
+    else:
+        print("Cách sử dụng:")
+        print("  python profiling.py show profiles/<lần_chạy>")
+        print("  python profiling.py compare profiles/<trước> profiles/<sau>")
+
+
+if __name__ == "__main__":
+    main()
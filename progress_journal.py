@@ -0,0 +1,178 @@
+"""
+Progress Journal Module
+Nhật ký tiến độ chỉ-ghi-thêm (JSON lines) cho run_loop: account nào đang chạy,
+đã tới step nào, lần thử thứ mấy. Mỗi sự kiện là một dòng append + fsync nên rẻ
+và không mất dữ liệu khi crash/mất điện; khi khởi động lại, journal cho biết
+account nào đang dở để chạy tiếp hoặc đánh dấu chạy lại mà không phải ghi lại
+data/account.csv.
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+# Trạng thái kết thúc nhưng vẫn chạy lại; mọi state khác (done, bad_password, banned, ...) là cuối cùng
+RETRYABLE_STATES = ('', 'failed', 'retry')
+
+
+class ProgressJournal:
+    """Ghi và đọc lại nhật ký tiến độ theo account."""
+
+    def __init__(self, path: str = "data/progress.jsonl", fsync: bool = True):
+        """
+        Khởi tạo ProgressJournal.
+
+        Args:
+            path: File journal (JSON lines, chỉ ghi thêm)
+            fsync: True để fsync sau mỗi sự kiện (an toàn khi mất điện, chậm hơn vài ms)
+        """
+        self.path = path
+        self.fsync = fsync
+        self._file = None
+        self.accounts: Dict[str, dict] = {}
+        self.load()
+
+    # ------------------------------------------------------------------ ghi
+
+    def _open(self):
+        """Mở file journal ở chế độ ghi thêm (mở một lần, giữ suốt phiên chạy)."""
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            torn = False
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b'\n'
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if torn:
+                # Dòng cuối bị ghi dở khi crash: xuống dòng để sự kiện mới không dính vào nó
+                self._file.write('\n')
+        return self._file
+
+    def record(self, event: str, account_id, **fields):
+        """
+        Ghi một sự kiện.
+
+        Args:
+            event: 'start', 'step', 'restart', 'finish' hoặc 'interrupted'
+            account_id: ID account
+            **fields: Dữ liệu kèm theo (step, attempt, state, ...)
+        """
+        entry = {'ts': round(time.time(), 3), 'event': event, 'account': str(account_id)}
+        entry.update(fields)
+        f = self._open()
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        self._apply(entry)
+
+    def close(self):
+        """Đóng file journal."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # ------------------------------------------------------------------ đọc
+
+    def _apply(self, entry: dict):
+        """Cập nhật trạng thái trong bộ nhớ theo một sự kiện."""
+        account_id = entry.get('account')
+        if account_id is None:
+            return
+        info = self.accounts.setdefault(account_id, {
+            'status': 'pending', 'state': '', 'last_step': None, 'attempts': 0,
+            'started_at': None, 'updated_at': None,
+        })
+        event = entry.get('event')
+        info['updated_at'] = entry.get('ts')
+        if event == 'start':
+            info['status'] = 'in_flight'
+            info['attempts'] = entry.get('attempt', info['attempts'] + 1)
+            from_step = entry.get('from_step')
+            info['last_step'] = from_step - 1 if from_step and from_step > 1 else None
+            info['started_at'] = entry.get('ts')
+        elif event == 'step':
+            info['last_step'] = entry.get('step')
+        elif event == 'finish':
+            info['status'] = 'finished'
+            info['state'] = entry.get('state', '')
+        elif event == 'interrupted':
+            info['status'] = 'interrupted'
+
+    def load(self):
+        """Đọc lại toàn bộ journal (bỏ qua dòng cuối bị ghi dở khi crash)."""
+        self.accounts = {}
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self._apply(json.loads(line))
+                except ValueError:
+                    continue
+
+    def in_flight(self) -> List[str]:
+        """Các account đã bắt đầu nhưng chưa kết thúc (runner bị dừng giữa chừng)."""
+        return [account_id for account_id, info in self.accounts.items() if info['status'] == 'in_flight']
+
+    def is_finished(self, account_id) -> bool:
+        """Account đã kết thúc với trạng thái cuối (không cần chạy lại)."""
+        info = self.accounts.get(str(account_id))
+        return bool(info) and info['status'] == 'finished' and info['state'] not in RETRYABLE_STATES
+
+    def attempts(self, account_id) -> int:
+        """Số lần account đã được bắt đầu."""
+        info = self.accounts.get(str(account_id))
+        return info['attempts'] if info else 0
+
+    def last_step(self, account_id) -> Optional[int]:
+        """Step cuối cùng đã hoàn thành của lần chạy gần nhất."""
+        info = self.accounts.get(str(account_id))
+        return info['last_step'] if info else None
+
+    def reconcile(self, policy: str = 'resume') -> List[dict]:
+        """
+        Xử lý các account đang dở khi khởi động.
+
+        Args:
+            policy: 'resume' - giữ lại để chạy tiếp trước các account khác;
+                    'retry' - đánh dấu bị gián đoạn để chạy lại từ đầu theo thứ tự thường
+
+        Returns:
+            List {'account', 'last_step', 'attempts'} của các account đang dở.
+        """
+        pending = []
+        for account_id in self.in_flight():
+            info = self.accounts[account_id]
+            pending.append({'account': account_id, 'last_step': info['last_step'],
+                            'attempts': info['attempts']})
+            if policy != 'resume':
+                self.record('interrupted', account_id, last_step=info['last_step'])
+        return pending
+
+    def compact(self):
+        """Ghi lại journal thành vài dòng tóm tắt cho mỗi account (gọi khi khởi động, file quá lớn)."""
+        self.close()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for account_id, info in self.accounts.items():
+                events = [{'ts': info['started_at'], 'event': 'start', 'attempt': info['attempts']}]
+                if info['last_step'] is not None:
+                    events.append({'ts': info['updated_at'], 'event': 'step', 'step': info['last_step']})
+                if info['status'] == 'finished':
+                    events.append({'ts': info['updated_at'], 'event': 'finish', 'state': info['state']})
+                elif info['status'] == 'interrupted':
+                    events.append({'ts': info['updated_at'], 'event': 'interrupted'})
+                for entry in events:
+                    entry['account'] = account_id
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
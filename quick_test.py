@@ -5,6 +5,8 @@ Script test nhanh 2 chức năng chính với template entergame.png
 
 from image_detector import ImageDetector
 from screen_automation import ScreenAutomation
+import profiling
+import sys
 import time
 
 def test_detect():
@@ -104,25 +106,28 @@ def test_both(window_title=None):
         return False
 
 
-if __name__ == "__main__":
-    import sys
-    
+def main():
+    """Chạy test theo tham số dòng lệnh hoặc menu"""
     if len(sys.argv) > 1:
         test_name = sys.argv[1]
         # Lấy window_title từ tham số thứ 2 (nếu có)
         window_title = sys.argv[2] if len(sys.argv) > 2 else None
         
         if test_name == "detect":
-            test_detect()
+            with profiling.step("detect"):
+                test_detect()
         elif test_name == "click":
-            test_click(window_title)
+            with profiling.step("click"):
+                test_click(window_title)
         elif test_name == "both":
-            test_both(window_title)
+            with profiling.step("both"):
+                test_both(window_title)
         else:
             print("Các test: detect, click, both")
             print("\nCách sử dụng:")
             print("  python quick_test.py both")
             print("  python quick_test.py both \"launcher.exe Properties\"")
+            print("  python quick_test.py --profile both")
     else:
         print("\n" + "=" * 60)
         print("QUICK TEST - 2 Chức năng chính")
@@ -141,13 +146,23 @@ if __name__ == "__main__":
                 window_title = None
         
         if choice == "1":
-            test_detect()
+            with profiling.step("detect"):
+                test_detect()
         elif choice == "2":
-            test_click(window_title)
+            with profiling.step("click"):
+                test_click(window_title)
         elif choice == "3":
-            test_both(window_title)
+            with profiling.step("both"):
+                test_both(window_title)
         elif choice == "0":
             print("Tạm biệt!")
         else:
             print("Lựa chọn không hợp lệ!")
 
+
+if __name__ == "__main__":
+    # python quick_test.py --profile[=thư_mục] <test>: chạy dưới cProfile
+    if profiling.profile_from_argv():
+        profiling.run_profiled(main)
+    else:
+        main()
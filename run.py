@@ -3,19 +3,40 @@ Auto Run Script - Chạy tự động các step 1-10 với retry logic
 """
 
 from image_detector import ImageDetector
+from match_strategies import STRATEGIES
 from screen_automation import ScreenAutomation
-from process_utils import kill_process_by_name
+from ocr_service import OCRService
+from process_utils import kill_process_by_name, ProcessWatcher
+from client_lifecycle import ClientLifecycleManager
+from progress_journal import ProgressJournal
+from account_scheduler import AccountScheduler
+from poll_planner import PollPlanner, STEP_POLLS
+from dashboard import Dashboard, RunnerStatus
+import profiling
+import log_pipeline
+from metrics import ACCOUNTS, STEP_LATENCY, STEP_RETRIES, RESTARTS, start_metrics_server
 import os
+import sys
 import time
-import csv
 import glob
 import re
+import contextlib
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class AutoRunner:
     """Class để tự động chạy các step với retry logic"""
     
-    def __init__(self, window_title=None, threshold=0.8, max_retries=10, retry_delay=2.0):
+    def __init__(self, window_title=None, threshold=0.8, max_retries=10, retry_delay=2.0,
+                 match_strategy='direct', step_modes=None, launch_command=None, max_clients=2,
+                 prelaunch_step=9, launch_steps=None, reuse_client=False, logout_steps=None,
+                 login_step=3, logout_timeout=15.0, journal_path="data/progress.jsonl",
+                 resume_policy="resume", metrics_port=None, account_file="data/account.csv",
+                 frame_source=None, input_backend=None, process_watcher=None, kill_process=None,
+                 negative_templates=None, max_attempts=3, retry_backoff=300.0,
+                 step_timing_path="data/step_timing.json", ocr_engine=None):
         """
         Khởi tạo AutoRunner.
         
@@ -24,15 +45,83 @@ class AutoRunner:
             threshold: Ngưỡng confidence cho template matching
             max_retries: Số lần retry tối đa cho mỗi step (0 = vô hạn)
             retry_delay: Thời gian chờ giữa các lần retry (giây)
+            match_strategy: Chiến lược matching của ImageDetector ('auto' = tự chọn theo cost model)
+            step_modes: {step_num: mode} - cách phát hiện cho từng step: 'template' (mặc định),
+                        'feature' (keypoint) hoặc 'hybrid' (template trước, trượt thì keypoint)
+            launch_command: Lệnh khởi chạy client. Khi có, client của account tiếp theo được
+                            pre-launch trong lúc account hiện tại chạy nốt các step cuối
+            max_clients: Số client tối đa chạy cùng lúc khi pre-launch
+            prelaunch_step: Step mà sau khi click xong thì bắt đầu pre-launch client tiếp theo
+            launch_steps: Các step chỉ dùng để mở client (bỏ qua khi đã có client pre-launch)
+            reuse_client: True để đăng xuất về màn hình đăng nhập thay vì kill wwm.exe sau step 11
+            logout_steps: Chuỗi thao tác đăng xuất: đường dẫn template (đợi rồi click),
+                          "key:<phím>" hoặc "wait:<giây>". None = templates/logout*.png theo thứ tự
+            login_step: Step của màn hình đăng nhập; account tiếp theo chạy từ step này khi dùng lại client
+            logout_timeout: Thời gian chờ tối đa cho mỗi template đăng xuất/màn hình đăng nhập (giây)
+            journal_path: File journal tiến độ (None = tắt). Dùng để không mất/lặp việc khi crash
+            resume_policy: Xử lý account đang dở khi khởi động: 'resume' (chạy tiếp trước tiên,
+                           từ step kế tiếp nếu client còn chạy) hoặc 'retry' (chạy lại từ đầu)
+            metrics_port: Cổng HTTP cho endpoint /metrics (định dạng Prometheus, None = tắt)
+            account_file: File CSV danh sách account (id, state, user, pass)
+            frame_source: Nguồn frame cho ImageDetector thay cho chụp màn hình (frame bus, simulator)
+            input_backend: Backend input của ScreenAutomation (tên hoặc InputBackend, vd FakeInputBackend)
+            process_watcher: ProcessWatcher cho wwm.exe (None = tạo mới; simulator truyền process giả)
+            kill_process: Hàm kill_process(name, force) thay cho kill_process_by_name
+            negative_templates: {step_num hoặc None (mọi step): [(state, template_path)]} - màn hình lỗi
+                                (sai mật khẩu, bị ban, bảo trì, xếp hàng...). Thấy là kết thúc account
+                                ngay với state tương ứng. None = đọc từ templates/negative
+            max_attempts: Số lần chạy thất bại tối đa của một account trước khi đánh dấu 'failed'
+                          (0 = không giới hạn)
+            retry_backoff: Thời gian chờ trước khi chạy lại account thất bại (giây), nhân đôi mỗi lần
+            step_timing_path: File lưu thời gian xuất hiện đã học của từng step, dùng để lên lịch poll
+                              (None = chỉ học trong phiên chạy)
+            ocr_engine: Engine OCR cho read_text() ('auto', 'easyocr', 'tesseract') - chỉ bật khi có step
+                        đọc chữ. Worker được chạy và nạp model ngay khi khởi tạo, không phải ở lần đọc
+                        đầu trong vòng lặp. None (mặc định) = không chạy OCR (không nạp model lúc khởi động)
         """
         self.window_title = window_title
         self.threshold = threshold
         self.max_retries = max_retries
         self.retry_delay = retry_delay
-        self.detector = ImageDetector(threshold=threshold)
-        self.automation = ScreenAutomation(detection_threshold=threshold)
+        self.detector = ImageDetector(threshold=threshold, strategy=match_strategy, frame_source=frame_source)
+        self.ocr = OCRService(engine=ocr_engine) if ocr_engine else None
+        self.automation = ScreenAutomation(detection_threshold=threshold, detector=self.detector,
+                                           input_backend=input_backend, ocr=self.ocr)
         self.steps = self._discover_steps()
         self.current_account = None
+        self.process_watcher = process_watcher or ProcessWatcher("wwm.exe")
+        self.kill_process = kill_process or kill_process_by_name
+        self.lifecycle = None
+        if launch_command:
+            self.lifecycle = ClientLifecycleManager(launch_command, max_clients=max_clients,
+                                                    watcher=self.process_watcher)
+        self.prelaunch_step = prelaunch_step
+        self.launch_steps = set(launch_steps or ())
+        self.reuse_client = reuse_client
+        self.logout_steps = logout_steps if logout_steps is not None else self._discover_logout_steps()
+        self.login_step = login_step
+        self.logout_timeout = logout_timeout
+        self._resume_from_step = None  # Step bắt đầu của account tiếp theo khi client được dùng lại
+        self.journal = ProgressJournal(journal_path) if journal_path else None
+        self.resume_policy = resume_policy
+        self._resume_queue = []  # Account đang dở từ lần chạy trước, ưu tiên chạy tiếp
+        self.metrics_port = metrics_port
+        self._metrics_server = None
+        self.account_file = account_file
+        self.scheduler = AccountScheduler(account_file, max_attempts=max_attempts, retry_backoff=retry_backoff)
+        # Trạng thái cho dashboard (chỉ gán thuộc tính, không chặn vòng lặp)
+        self.status = RunnerStatus(window_title or "runner")
+        self.negative_templates = (negative_templates if negative_templates is not None
+                                   else self._discover_negative_templates())
+        self._abort_state = None  # State của account khi gặp màn hình lỗi
+        self.poll_planner = PollPlanner(step_timing_path)
+        self._last_action_at = None  # Thời điểm thao tác cuối (mốc đo thời gian xuất hiện của step sau)
+        
+        # Cách phát hiện theo từng step (descriptor keypoint được tính sẵn ở đây)
+        for step_num, mode in (step_modes or {}).items():
+            step_info = self._get_step_info(step_num)
+            if step_info:
+                self.detector.set_template_mode(step_info[2], mode)
     
     def _discover_steps(self):
         """Tự động phát hiện các file step*.png trong thư mục templates"""
@@ -59,31 +148,190 @@ class AutoRunner:
         
         return steps
     
-    def _load_next_account(self):
-        """Đọc account tiếp theo có state trống từ account.csv"""
-        account_file = "data/account.csv"
-        if not os.path.exists(account_file):
-            print(f"✗ Không tìm thấy file: {account_file}")
+    def _discover_logout_steps(self):
+        """Phát hiện các file logout*.png trong thư mục templates (theo số thứ tự)"""
+        logout_files = glob.glob(os.path.join("templates", "logout*.png"))
+        
+        def get_number(filename):
+            match = re.search(r'logout(\d+)', filename, re.IGNORECASE)
+            return int(match.group(1)) if match else 0
+        
+        return sorted(logout_files, key=get_number)
+    
+    def _discover_negative_templates(self):
+        """
+        Đọc các template màn hình lỗi trong templates/negative:
+        <state>.png áp dụng cho mọi step, stepN/<state>.png chỉ cho step N.
+        Hậu tố _số được bỏ khỏi tên state (banned_2.png -> banned).
+        """
+        negative_dir = os.path.join("templates", "negative")
+        negatives = {}
+        for filepath in sorted(glob.glob(os.path.join(negative_dir, "*.png")) +
+                               glob.glob(os.path.join(negative_dir, "step*", "*.png"))):
+            folder = os.path.basename(os.path.dirname(filepath))
+            match = re.fullmatch(r'step(\d+)', folder, re.IGNORECASE)
+            step_num = int(match.group(1)) if match else None
+            state = re.sub(r'_\d+$', '', os.path.splitext(os.path.basename(filepath))[0])
+            negatives.setdefault(step_num, []).append((state, filepath))
+        return negatives
+    
+    def _detect(self, step_num, filepath):
+        """
+        Tìm template của step, cùng lần chụp với các template màn hình lỗi (kiểm tra trước).
+        
+        Returns:
+            (x, y, confidence), None nếu không thấy, hoặc "abort" nếu gặp màn hình lỗi
+            (state lưu ở self._abort_state).
+        """
+        negatives = self.negative_templates.get(None, []) + self.negative_templates.get(step_num, [])
+        if not negatives:
+            return self.detector.find_template(filepath)
+        
+        # Màn hình lỗi thường che lên nút, nút vẫn có thể khớp: kiểm tra màn hình lỗi trước
+        hit = self.detector.find_first([path for _, path in negatives] + [filepath])
+        if hit is None:
             return None
+        path, result = hit
+        if path == filepath:
+            return result
+        self._abort_state = next(state for state, negative_path in negatives if negative_path == path)
+        print(f"✗ Phát hiện màn hình lỗi '{self._abort_state}' ({os.path.basename(path)}), "
+              f"confidence: {result[2]:.2%}")
+        return "abort"
+    
+    def _poll_step(self, step_num, filepath, learn=True):
+        """
+        Poll template của step theo lịch của poll_planner (dày quanh thời điểm thường xuất hiện,
+        thưa khi còn sớm hoặc đã quá hạn) cho đến khi thấy hoặc hết thời gian chờ:
+        max_retries x retry_delay như trước (step 8: 10 x retry_delay, max_retries=0: không giới hạn).
         
-        try:
-            # Đọc tất cả dòng
-            accounts = []
-            with open(account_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    accounts.append(row)
-            
-            # Tìm dòng có state trống
-            for account in accounts:
-                if not account.get('state', '').strip():
-                    self.current_account = account
-                    return account
+        Args:
+            step_num: Số thứ tự step
+            filepath: Đường dẫn template
+            learn: Ghi thời gian xuất hiện vào poll_planner (False khi retry sau click hụt:
+                   màn hình đã hiện sẵn, thời gian đo được không có ý nghĩa)
+        
+        Returns:
+            (x, y, confidence), None nếu hết thời gian chờ, hoặc "abort" nếu gặp màn hình lỗi.
+        """
+        limit = 10 if step_num == 8 else self.max_retries
+        budget = limit * self.retry_delay if limit else None
+        action_at = self._last_action_at if self._last_action_at is not None else time.monotonic()
+        poll_start = time.monotonic()
+        
+        delay = self.poll_planner.first_delay(step_num, poll_start - action_at)
+        if budget is not None:
+            delay = min(delay, budget)
+        if delay > 0:
+            expected = self.poll_planner.expected(step_num)
+            print(f"→ Step {step_num} thường xuất hiện sau ~{expected['p50']:.1f}s, chờ {delay:.1f}s rồi mới poll")
+            self.status.phase = "chờ màn hình"
+            time.sleep(delay)
+        
+        polls = 0
+        last_miss = None
+        self.status.phase = "tìm template"
+        while True:
+            poll_at = time.monotonic()
+            result = self._detect(step_num, filepath)
+            self.status.observe_detect(time.monotonic() - poll_at)
+            polls += 1
+            STEP_POLLS.inc(step=step_num)
+            if result == "abort":
+                return result
+            if result:
+                if not learn:
+                    return result
+                # Màn hình xuất hiện trong khoảng giữa lần poll trượt cuối và lần poll này
+                appeared_at = poll_at if last_miss is None else (last_miss + poll_at) / 2
+                self.poll_planner.record(step_num, appeared_at - action_at)
+                if polls > 1:
+                    print(f"  (thấy sau {polls} lần poll, {poll_at - poll_start:.1f}s)")
+                return result
+            last_miss = poll_at
             
+            now = time.monotonic()
+            if budget is not None and now - poll_start >= budget:
+                logger.info("✗ Không phát hiện được sau %d lần poll (%.1fs)", polls, now - poll_start)
+                return None
+            delay = self.poll_planner.next_delay(step_num, now - action_at, fallback=self.retry_delay)
+            if budget is not None:
+                delay = min(delay, budget - (now - poll_start))
+            time.sleep(max(0.0, delay))
+    
+    def _logout_to_login(self):
+        """
+        Đưa client đang chạy về màn hình đăng nhập bằng chuỗi logout_steps.
+        
+        Returns:
+            True nếu đã thấy màn hình đăng nhập (login_step), False nếu thất bại.
+        """
+        login_info = self._get_step_info(self.login_step)
+        if not login_info or not self.logout_steps:
+            print("✗ Chưa cấu hình logout steps hoặc login step")
+            return False
+        
+        for item in self.logout_steps:
+            if item.startswith("key:"):
+                self.automation.press_key(item[4:], window_title=self.window_title)
+            elif item.startswith("wait:"):
+                time.sleep(float(item[5:]))
+            else:
+                if not self.automation.wait_for_image(item, timeout=self.logout_timeout):
+                    print(f"✗ Không thấy {os.path.basename(item)} khi đăng xuất")
+                    return False
+                if not self.automation.click_at_image(item, window_title=self.window_title):
+                    print(f"✗ Không click được {os.path.basename(item)} khi đăng xuất")
+                    return False
+            time.sleep(0.5)
+        
+        if not self.automation.wait_for_image(login_info[2], timeout=self.logout_timeout):
+            print(f"✗ Không thấy màn hình đăng nhập (step {self.login_step}) sau khi đăng xuất")
+            return False
+        return True
+    
+    def _load_next_account(self):
+        """Lấy account tiếp theo từ scheduler (account đang dở từ lần chạy trước được ưu tiên)"""
+        if not self.scheduler.load():
             return None
-        except Exception as e:
-            print(f"✗ Lỗi khi đọc account.csv: {e}")
-            return None
+        
+        # Ưu tiên account đang dở từ lần chạy trước (journal)
+        while self._resume_queue:
+            item = self._resume_queue.pop(0)
+            account = self.scheduler.get(item['account'])
+            if account is None or not self.scheduler.is_pending(account):
+                continue
+            if item['last_step'] and self.process_watcher.pids:
+                # Client vẫn còn chạy: tiếp tục từ step kế tiếp
+                self._resume_from_step = item['last_step'] + 1
+            print(f"→ Chạy tiếp account {item['account']} đang dở "
+                  f"(step cuối: {item['last_step'] or 'chưa có'}, lần thử: {item['attempts']})")
+            self.current_account = account
+            return account
+        
+        account = self.scheduler.next_account(skip=self.journal.is_finished if self.journal else None)
+        if account is not None:
+            self.current_account = account
+        return account
+    
+    def _journal(self, event, **fields):
+        """Ghi sự kiện tiến độ của account hiện tại (nếu bật journal)."""
+        if self.journal and self.current_account:
+            self.journal.record(event, self.current_account.get('id', ''), **fields)
+    
+    def _reconcile_journal(self):
+        """Khi khởi động: xử lý các account đang dở trong journal của lần chạy trước."""
+        if not self.journal:
+            return
+        if os.path.exists(self.journal.path) and os.path.getsize(self.journal.path) > 1024 * 1024:
+            self.journal.compact()
+        
+        pending = self.journal.reconcile(self.resume_policy)
+        for item in pending:
+            action = "sẽ chạy tiếp" if self.resume_policy == 'resume' else "sẽ chạy lại từ đầu"
+            print(f"⚠ Account {item['account']} bị gián đoạn ở step {item['last_step'] or 0}, {action}")
+        if self.resume_policy == 'resume':
+            self._resume_queue = pending
     
     def run_step(self, step_num, retry_count=0):
         """
@@ -102,42 +350,34 @@ class AutoRunner:
             return False
         
         step_num, filename, filepath = step_info
+        self.status.start_step(step_num, retry_count)
         
         print(f"\n{'='*60}")
         print(f"BƯỚC {step_num}: {filename}")
         if retry_count > 0:
             print(f"(Retry lần {retry_count})")
+            STEP_RETRIES.inc(step=step_num)
         print(f"{'='*60}")
         
-        # Detect
-        result = self.detector.find_template(filepath)
+        # Detect (poll theo thời gian xuất hiện đã học của step)
+        result = self._poll_step(step_num, filepath, learn=retry_count == 0)
+        if result == "abort":
+            print(f"→ Kết thúc account với state '{self._abort_state}', không retry")
+            return "abort"
         
         if not result:
-            # Không phát hiện được, retry
-            # Step 8: Nếu retry quá 10 lần thì chuyển sang step 9
-            if step_num == 8 and retry_count >= 10:
-                print(f"✗ Step 8 không phát hiện được sau 10 lần retry")
-                print(f"→ Tự động chuyển sang step 9")
+            # Step 8: Không xuất hiện trong thời gian chờ thì chuyển sang step 9
+            if step_num == 8:
+                print(f"→ Step 8 không xuất hiện, tự động chuyển sang step 9")
                 return "skip"  # Trả về signal để skip và chuyển sang step 9
-            
-            if self.max_retries == 0 or retry_count < self.max_retries:
-                print(f"✗ Không phát hiện được, đợi {self.retry_delay}s và retry...")
-                time.sleep(self.retry_delay)
-                return self.run_step(step_num, retry_count + 1)
-            else:
-                print(f"✗ Không phát hiện được sau {retry_count} lần retry")
-                # Step 8: Bỏ qua nếu vượt quá retry (fallback, nhưng đã xử lý ở trên)
-                if step_num == 8:
-                    print(f"→ Step 8 vượt quá retry, sẽ bỏ qua và tiếp tục")
-                    return "skip"  # Trả về signal để skip
-                else:
-                    print(f"→ Vượt quá số lần retry, sẽ kill wwm.exe và chạy lại từ step 1")
-                    return "restart"  # Trả về signal để restart
+            print(f"→ Vượt quá thời gian chờ, sẽ kill wwm.exe và chạy lại từ step 1")
+            return "restart"  # Trả về signal để restart
         
         x, y, confidence = result
         print(f"✓ Phát hiện tại ({x}, {y}), confidence: {confidence:.2%}")
         
         # Click
+        self.status.phase = "click"
         time.sleep(0.5)  # Chờ một chút trước khi click
         success = self.automation.click_at_image(
             filepath,
@@ -153,7 +393,8 @@ class AutoRunner:
                 return "skip"  # Trả về signal để skip và chuyển sang step 9
             
             if self.max_retries == 0 or retry_count < self.max_retries:
-                print(f"✗ Click không thành công, đợi {self.retry_delay}s và retry...")
+                # Qua logger (không phải print) để các dòng retry giống hệt được log_pipeline gộp lại
+                logger.info("✗ Click không thành công, đợi %ss và retry...", self.retry_delay)
                 time.sleep(self.retry_delay)
                 return self.run_step(step_num, retry_count + 1)
             else:
@@ -168,6 +409,11 @@ class AutoRunner:
         
         print(f"✓ Đã click thành công")
         
+        # Bắt đầu mở client cho account tiếp theo, chồng lên phần cuối của account hiện tại
+        # (không cần khi client được dùng lại cho account tiếp theo)
+        if self.lifecycle and not self.reuse_client and step_num == self.prelaunch_step:
+            self.lifecycle.prelaunch()
+        
         # Paste dữ liệu cho step4 và step6
         if step_num == 4 and self.current_account:
             # Step4: Paste user
@@ -207,14 +453,78 @@ class AutoRunner:
             print(f"\n{'='*60}")
             print("SAU STEP 11: KẾT THÚC VÒNG LẶP")
             print(f"{'='*60}")
+            if self.reuse_client:
+                print("→ Đang đăng xuất để dùng lại client cho account tiếp theo...")
+                if self._logout_to_login():
+                    self._resume_from_step = self.login_step
+                    print(f"✓ Đã về màn hình đăng nhập, account tiếp theo bắt đầu từ step {self.login_step}")
+                    return "end_loop"
+                print("→ Đăng xuất thất bại, chuyển sang kill và mở lại client")
             print("→ Đang kill process wwm.exe...")
-            kill_process_by_name("wwm.exe", force=True)
-            time.sleep(2)  # Chờ sau khi kill
+            self._kill_client()
             print(f"✓ Đã kill wwm.exe")
             return "end_loop"  # Trả về signal để kết thúc vòng lặp
         
         return True
     
+    def _save_learned(self):
+        """Ghi các số liệu học được trong lúc chạy (lịch poll, cost model) - gọi giữa hai account."""
+        self.poll_planner.save()
+        self.detector.maintain_cost_model()
+        if self.detector.cost_model is not None:
+            self.detector.cost_model.save_if_dirty()
+    
+    def _kill_client(self, timeout=10.0):
+        """Kill wwm.exe và chờ đến khi process thực sự kết thúc (thay cho sleep cố định)."""
+        self.status.phase = "kill client"
+        if self.lifecycle and self.lifecycle.current_pid is not None:
+            # Chỉ kill client của account hiện tại, giữ nguyên client đã pre-launch
+            pid = self.lifecycle.current_pid
+            report = self.lifecycle.retire_current()
+            if report['alive']:
+                print(f"⚠ Client PID {pid} vẫn còn sau khi kill")
+            else:
+                print(f"✓ Client PID {pid} đã thoát sau {report['elapsed']:.2f}s")
+            return
+        if self.lifecycle:
+            # Pre-launch thất bại nên các step đã tự mở client: kill theo PID, giữ client đang pre-launch
+            report = self.lifecycle.retire_unmanaged()
+            if not report['found']:
+                print("→ Không còn client nào của account hiện tại")
+            elif report['alive']:
+                print(f"⚠ Client PID {report['alive']} vẫn còn sau khi kill")
+            else:
+                print(f"✓ Client PID {report['found']} đã thoát sau {report['elapsed']:.2f}s")
+            return
+        
+        self.kill_process("wwm.exe", force=True)
+        start = time.time()
+        if self.process_watcher.wait_for_exit(timeout=timeout):
+            print(f"✓ wwm.exe đã thoát sau {time.time() - start:.2f}s")
+        else:
+            print(f"⚠ wwm.exe vẫn còn sau {timeout}s")
+    
+    def _prepare_client(self):
+        """
+        Lấy client cho lần chạy này: client cũ đã đăng xuất, hoặc client pre-launch nếu đã sẵn sàng.
+        
+        Returns:
+            Tập step được bỏ qua vì client đã được mở sẵn.
+        """
+        if self._resume_from_step is not None:
+            # Client cũ đã về màn hình đăng nhập: bỏ qua các step trước login_step
+            resume_from, self._resume_from_step = self._resume_from_step, None
+            return {step_num for step_num, _, _ in self.steps if step_num < resume_from}
+        if not self.lifecycle:
+            return set()
+        start = time.time()
+        pid = self.lifecycle.take_next()
+        if pid is None:
+            print("→ Không có client pre-launch, chạy đủ các step mở client")
+            return set()
+        print(f"✓ Client sẵn sàng (PID: {pid}), chờ {time.time() - start:.2f}s")
+        return self.launch_steps
+    
     def _get_step_info(self, step_num):
         """Lấy thông tin của một bước"""
         for step_info in self.steps:
@@ -241,33 +551,50 @@ class AutoRunner:
                 print(f"{'='*60}")
                 time.sleep(2)  # Chờ một chút trước khi restart
             
+            skip_steps = self._prepare_client()
+            
             print(f"\n{'='*60}")
             print(f"BẮT ĐẦU CHẠY {len(sorted_steps)} BƯỚC")
             print(f"{'='*60}")
             
             all_steps_completed = True
+            self._last_action_at = time.monotonic()
             for step_num, filename, filepath in sorted_steps:
-                result = self.run_step(step_num)
+                if step_num in skip_steps:
+                    continue
+                
+                step_start = time.perf_counter()
+                with profiling.step(f"step{step_num}"):
+                    result = self.run_step(step_num)
+                STEP_LATENCY.observe(time.perf_counter() - step_start, step=step_num)
+                self._last_action_at = time.monotonic()
                 
                 if result == "restart":
                     # Vượt quá retry, kill wwm.exe và restart
                     print(f"\n{'='*60}")
                     print("KILL PROCESS wwm.exe (do vượt quá retry)")
                     print(f"{'='*60}")
-                    kill_process_by_name("wwm.exe", force=True)
-                    time.sleep(3)  # Chờ sau khi kill
+                    self._kill_client()
                     restart_count += 1
+                    RESTARTS.inc()
+                    self._journal('restart', step=step_num, restart=restart_count)
                     all_steps_completed = False
                     break  # Break khỏi vòng lặp step, quay lại đầu vòng lặp restart
                 
+                elif result == "abort":
+                    # Màn hình lỗi (sai mật khẩu, bị ban...): account không thể thành công
+                    return "abort"
+                
                 elif result == "skip":
                     # Step 8: Bỏ qua và tiếp tục
+                    self._journal('step', step=step_num, skipped=True)
                     print(f"\n→ Đã bỏ qua step {step_num}, tiếp tục với step tiếp theo")
                     time.sleep(0.5)
                     continue
                 
                 elif result == "end_loop":
                     # Step 11: Đã hoàn thành (đã kill wwm.exe), trả về để cập nhật state và tiếp tục account tiếp theo
+                    self._journal('step', step=step_num)
                     print(f"\n→ Step 11 đã hoàn thành (đã kill wwm.exe)")
                     return "end_loop"
                 
@@ -275,6 +602,8 @@ class AutoRunner:
                     print(f"\n✗ Dừng lại ở step {step_num}")
                     return False
                 
+                self._journal('step', step=step_num)
+                
                 # Chờ một chút giữa các step
                 time.sleep(0.5)
             
@@ -297,43 +626,31 @@ class AutoRunner:
             account_id: ID của account cần cập nhật
             state: State mới (mặc định: "done")
         """
-        account_file = "data/account.csv"
-        if not os.path.exists(account_file):
-            print(f"✗ Không tìm thấy file: {account_file}")
+        try:
+            if self.scheduler.set_state(account_id, state):
+                print(f"✓ Đã cập nhật state của account {account_id} thành '{state}'")
+                return True
+            return False
+        except Exception as e:
+            print(f"✗ Lỗi khi cập nhật account.csv: {e}")
             return False
+    
+    def _record_outcome(self, account_id, outcome):
+        """
+        Ghi kết quả một lần chạy: journal trước, rồi account.csv qua scheduler.
         
+        Returns:
+            State mới của account ('done', 'retry', 'failed' hoặc state màn hình lỗi).
+        """
+        state = self.scheduler.outcome_state(account_id, outcome)
+        # Journal ghi trước CSV: crash giữa hai lần ghi vẫn không chạy lại account đã xong
+        self._journal('finish', state=state)
+        ACCOUNTS.inc(result=state)
         try:
-            # Đọc tất cả dòng
-            accounts = []
-            with open(account_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                fieldnames = reader.fieldnames
-                for row in reader:
-                    accounts.append(row)
-            
-            # Cập nhật state cho account có ID tương ứng
-            updated = False
-            for account in accounts:
-                if account.get('id', '') == str(account_id):
-                    account['state'] = state
-                    updated = True
-                    break
-            
-            if not updated:
-                print(f"✗ Không tìm thấy account với ID: {account_id}")
-                return False
-            
-            # Ghi lại file
-            with open(account_file, 'w', encoding='utf-8', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(accounts)
-            
-            print(f"✓ Đã cập nhật state của account {account_id} thành '{state}'")
-            return True
+            self.scheduler.record(account_id, state)
         except Exception as e:
             print(f"✗ Lỗi khi cập nhật account.csv: {e}")
-            return False
+        return state
     
     def run_loop(self, num_iterations):
         """
@@ -343,6 +660,13 @@ class AutoRunner:
             num_iterations: Số vòng lặp (0 = vô hạn cho đến khi hết account)
         """
         iteration = 0
+        self._reconcile_journal()
+        if self.metrics_port is not None and self._metrics_server is None:
+            try:
+                self._metrics_server = start_metrics_server(self.metrics_port)
+                print(f"✓ Metrics: http://127.0.0.1:{self._metrics_server.server_address[1]}/metrics")
+            except OSError as e:
+                print(f"⚠ Không mở được cổng metrics {self.metrics_port} ({e}), chạy tiếp không có metrics")
         
         while True:
             iteration += 1
@@ -353,50 +677,87 @@ class AutoRunner:
                 print(f"{'='*60}")
                 break
             
-            # Clear màn hình trước mỗi vòng lặp
-            os.system('cls')
-            
             print(f"\n{'='*60}")
             print(f"VÒNG LẶP {iteration}")
             print(f"{'='*60}")
             
-            # Tải account tiếp theo
+            # Tải account tiếp theo (account đang chờ backoff thì đợi đến lượt)
             account = self._load_next_account()
+            while not account:
+                skip = self.journal.is_finished if self.journal else None
+                wait = self.scheduler.seconds_until_next(skip=skip) if self.scheduler.accounts else None
+                if wait is None:
+                    break
+                print(f"→ Chưa account nào đến lượt, chờ {wait:.0f}s để chạy lại account lỗi...")
+                self.status.phase = f"chờ account lỗi ({wait:.0f}s)"
+                time.sleep(wait + 0.5)
+                account = self._load_next_account()
             if not account:
-                print("\n✗ Không còn account nào có state trống")
+                print("\n✗ Không còn account nào cần chạy")
+                summary = self.scheduler.summary()
+                if summary:
+                    print("  " + ", ".join(f"{state}: {count}" for state, count in sorted(summary.items())))
                 break
             
             account_id = account.get('id', '')
+            self.status.start_account(account_id)
             print(f"\n✓ Đã tải account ID: {account_id}")
             print(f"  User: {account.get('user', 'N/A')}")
             print(f"  Pass: {'*' * len(account.get('pass', '')) if account.get('pass') else 'N/A'}")
             
+            attempt = self.journal.attempts(account_id) + 1 if self.journal else 1
+            previous = self.scheduler.attempts(account)
+            if previous:
+                print(f"  Lần thử: {previous + 1} (trước đó: {account.get('state') or 'chưa xong'})")
+            self._journal('start', attempt=attempt, from_step=self._resume_from_step or 1)
+            
             # Chạy tất cả các step
+            self._abort_state = None
             result = self.run_all_steps()
+            outcome = self._abort_state if result == "abort" else ("done" if result else "failed")
+            state = self._record_outcome(account_id, outcome)
+            self.status.finish_account(state)
+            self._save_learned()
             
-            if result == "end_loop":
-                # Step 11 đã kill wwm.exe, cập nhật state và tiếp tục với account tiếp theo
-                self.update_account_state(account_id, "done")
+            if result == "abort":
+                # Client đang kẹt ở màn hình lỗi: mở lại từ đầu cho account tiếp theo
+                self._kill_client()
+                print(f"\n✗ Vòng lặp {iteration}: account {account_id} kết thúc với state '{state}'")
+            elif result == "end_loop":
+                # Step 11 đã kill wwm.exe, tiếp tục với account tiếp theo
                 print(f"\n✓ Hoàn tất vòng lặp {iteration} (step 11 đã kill wwm.exe)")
                 # Tiếp tục vòng lặp để xử lý account tiếp theo (không break)
             elif result:
                 # Các step đã hoàn thành thành công (trường hợp này không xảy ra vì step 11 sẽ trả về "end_loop")
-                # Nhưng để an toàn, vẫn cập nhật state
-                self.update_account_state(account_id, "done")
-                
                 # Kill wwm.exe (phòng trường hợp không phải step 11)
                 print(f"\n{'='*60}")
                 print("KILL PROCESS wwm.exe")
                 print(f"{'='*60}")
-                kill_process_by_name("wwm.exe", force=True)
-                time.sleep(2)  # Chờ một chút sau khi kill
+                self._kill_client()
                 
                 print(f"\n✓ Hoàn tất vòng lặp {iteration}")
             else:
-                print(f"\n✗ Vòng lặp {iteration} không thành công, bỏ qua account này")
+                if state == "retry":
+                    print(f"\n✗ Vòng lặp {iteration} không thành công, account {account_id} sẽ chạy lại "
+                          f"sau {self.scheduler.get(account_id).get('next_try')}")
+                else:
+                    print(f"\n✗ Vòng lặp {iteration} không thành công, account {account_id} đã thử "
+                          f"{self.scheduler.max_attempts} lần, đánh dấu 'failed'")
             
             # Chờ một chút trước vòng lặp tiếp theo
             time.sleep(1)
+        
+        # Dừng client pre-launch không còn account để dùng
+        if self.lifecycle:
+            self.lifecycle.shutdown()
+        if self.journal:
+            self.journal.close()
+        if self.ocr:
+            self.ocr.shutdown(wait=False)
+        self._save_learned()
+        if self._metrics_server:
+            self._metrics_server.shutdown()
+            self._metrics_server = None
 
 
 def main():
@@ -419,12 +780,53 @@ def main():
     num_iterations_input = input("Số vòng lặp (0 = vô hạn cho đến khi hết account, mặc định 1): ").strip()
     num_iterations = int(num_iterations_input) if num_iterations_input else 1
     
+    strategies = sorted(STRATEGIES) + ['auto']
+    while True:
+        match_strategy = input(f"Chiến lược matching ({'/'.join(strategies)}, mặc định direct): ").strip().lower() or 'direct'
+        if match_strategy in strategies:
+            break
+        print(f"✗ Chiến lược không hợp lệ: {match_strategy}")
+    
+    launch_command = input("Lệnh khởi chạy client để pre-launch (Enter để bỏ qua): ").strip() or None
+    launch_steps = set()
+    if launch_command:
+        launch_steps_input = input("Các step chỉ dùng để mở client, bỏ qua khi đã pre-launch (vd: 1,2): ").strip()
+        launch_steps = {int(n) for n in re.findall(r'\d+', launch_steps_input)}
+    
+    reuse_input = input("Dùng lại client (đăng xuất thay vì kill wwm.exe)? (y/n, mặc định n): ").strip().lower()
+    reuse_client = reuse_input == 'y'
+    login_step = 3
+    if reuse_client:
+        login_step_input = input("Step của màn hình đăng nhập (mặc định 3): ").strip()
+        login_step = int(login_step_input) if login_step_input else 3
+    
+    max_attempts_input = input("Số lần chạy tối đa cho account bị lỗi (0 = vô hạn, mặc định 3): ").strip()
+    max_attempts = int(max_attempts_input) if max_attempts_input else 3
+    
+    metrics_port_input = input("Cổng metrics HTTP (vd: 9108; Enter để tắt): ").strip()
+    metrics_port = int(metrics_port_input) if metrics_port_input else None
+    
+    default_dashboard = 'y' if sys.stdout.isatty() else 'n'
+    dashboard_input = input(f"Hiện bảng trạng thái trực tiếp thay cho log cuộn? (y/n, mặc định {default_dashboard}): ")
+    show_dashboard = (dashboard_input.strip().lower() or default_dashboard) == 'y'
+    
+    feature_steps_input = input("Các step dùng thêm keypoint khi template trượt (vd: 8,11; Enter để bỏ qua): ").strip()
+    step_modes = {int(n): 'hybrid' for n in re.findall(r'\d+', feature_steps_input)}
+    
     # Tạo runner
     runner = AutoRunner(
         window_title=window_title,
         threshold=threshold,
         max_retries=max_retries,
-        retry_delay=retry_delay
+        retry_delay=retry_delay,
+        match_strategy=match_strategy,
+        step_modes=step_modes,
+        launch_command=launch_command,
+        launch_steps=launch_steps,
+        reuse_client=reuse_client,
+        login_step=login_step,
+        metrics_port=metrics_port,
+        max_attempts=max_attempts
     )
     
     # Hiển thị thông tin
@@ -435,6 +837,25 @@ def main():
     print(f"Threshold: {threshold}")
     print(f"Max retries: {max_retries if max_retries > 0 else 'Vô hạn'}")
     print(f"Retry delay: {retry_delay}s")
+    print(f"Matching: {match_strategy}")
+    if launch_command:
+        print(f"Pre-launch: {launch_command} (bỏ qua step: {', '.join(str(n) for n in sorted(launch_steps)) or 'không'})")
+    if reuse_client:
+        print(f"Dùng lại client: có (logout: {len(runner.logout_steps)} thao tác, đăng nhập từ step {login_step})")
+    if runner.negative_templates:
+        total = sum(len(items) for items in runner.negative_templates.values())
+        states = sorted({state for items in runner.negative_templates.values() for state, _ in items})
+        print(f"Màn hình lỗi: {total} template ({', '.join(states)})")
+    if step_modes:
+        print(f"Step dùng keypoint: {', '.join(str(n) for n in sorted(step_modes))}")
+    if metrics_port is not None:
+        print(f"Metrics: http://127.0.0.1:{metrics_port}/metrics")
+    print(f"Dashboard: {'có' if show_dashboard else 'không'}")
+    learned = runner.poll_planner.summary()
+    if learned:
+        timings = ", ".join(f"step {step}: ~{q['p50']:.1f}s" for step, q in learned.items())
+        print(f"Poll theo thời gian đã học: {timings}")
+    print(f"Số lần chạy tối đa mỗi account: {max_attempts if max_attempts > 0 else 'Vô hạn'}")
     print(f"Số vòng lặp: {num_iterations if num_iterations > 0 else 'Vô hạn'}")
     print(f"Số step: {len(runner.steps)}")
     print(f"{'='*60}")
@@ -444,10 +865,19 @@ def main():
         print("Đã hủy")
         return
     
-    # Chạy vòng lặp
-    runner.run_loop(num_iterations)
+    # Chạy vòng lặp (print đi qua queue log, không ghi console trong vòng lặp chính;
+    # có dashboard thì log hiện ở phần dưới bảng trạng thái)
+    board = Dashboard([runner.status]) if show_dashboard else contextlib.nullcontext()
+    with log_pipeline.capture_prints(), board:
+        runner.run_loop(num_iterations)
 
 
 if __name__ == "__main__":
-    main()
+    # python run.py --log-file=... --log-json=... --log-level=...: ghi log nền ra file / JSON lines
+    log_pipeline.setup_from_argv()
+    # python run.py --profile[=thư_mục]: chạy dưới cProfile, ghi profile theo step
+    if profiling.profile_from_argv():
+        profiling.run_profiled(main)
+    else:
+        main()
 
@@ -3,16 +3,18 @@ Screen Automation Module
 Tích hợp các chức năng: phát hiện ảnh, click, paste dữ liệu.
 """
 
-import pyautogui
 import time
 import sys
-from typing import Optional, Tuple
+from concurrent.futures import Future
+from typing import Dict, Optional, Set, Tuple
 import logging
 from image_detector import ImageDetector
+from input_backends import InputBackend, find_window, load_pyautogui, select_backend, DEFAULT_PREFERENCE
+from input_dispatcher import InputDispatcher, default_dispatcher
+from ocr_service import OCRService, default_service
 
-# Thử import win32api cho Windows
+# Thử import pywin32 cho Windows (focus cửa sổ)
 try:
-    import win32api
     import win32con
     import win32gui
     WIN32_AVAILABLE = True
@@ -26,18 +28,99 @@ logger = logging.getLogger(__name__)
 class ScreenAutomation:
     """Class chính để tự động hóa các tác vụ trên màn hình."""
     
-    def __init__(self, detection_threshold: float = 0.8, click_delay: float = 0.5):
+    def __init__(self, detection_threshold: float = 0.8, click_delay: float = 0.5,
+                 detector: Optional[ImageDetector] = None, dispatcher: Optional[InputDispatcher] = None,
+                 background_input: bool = False, input_backend=None, ocr: Optional[OCRService] = None):
         """
         Khởi tạo ScreenAutomation.
         
         Args:
             detection_threshold: Ngưỡng confidence cho template matching (0.0 - 1.0)
             click_delay: Thời gian chờ sau mỗi lần click (giây)
+            detector: ImageDetector dùng chung (ví dụ với AutoRunner). None = tạo mới.
+            dispatcher: InputDispatcher dùng chung giữa các instance (nhiều client trong một process).
+                        None = thực hiện input ngay trên thread gọi như trước.
+            background_input: True để click vào cửa sổ bằng PostMessage mà không focus
+                              (không giữ khóa focus, chạy song song giữa các cửa sổ)
+            input_backend: Cách gửi input: None = tự chọn cho từng cửa sổ (PostMessage → SendInput
+                           → pyautogui), tên backend ưu tiên ('postmessage', 'sendinput',
+                           'pyautogui', 'fake') hoặc một InputBackend dùng cho mọi cửa sổ
+            ocr: OCRService cho read_text(); worker được chạy và nạp model ngay tại đây.
+                 None = dùng service chung của process khi read_text() được gọi lần đầu
         """
-        self.detector = ImageDetector(threshold=detection_threshold)
+        self.detector = detector or ImageDetector(threshold=detection_threshold)
         self.click_delay = click_delay
-        pyautogui.FAILSAFE = True
-        pyautogui.PAUSE = 0.1  # Pause ngắn giữa các action
+        self.dispatcher = dispatcher
+        self.background_input = background_input
+        self.input_backend = input_backend
+        self._backends: Dict[Optional[str], InputBackend] = {}
+        self._failed_backends: Dict[Optional[str], Set[str]] = {}
+        self.ocr = ocr
+        if ocr is not None:
+            ocr.start()
+        if dispatcher is not None and dispatcher.focus is None:
+            dispatcher.focus = self.focus_window
+    
+    def focus_window(self, window_title: Optional[str]) -> bool:
+        """
+        Đưa cửa sổ lên foreground (quan trọng cho game).
+        
+        Returns:
+            True nếu đã focus được cửa sổ.
+        """
+        if not window_title or sys.platform != 'win32' or not WIN32_AVAILABLE:
+            return False
+        try:
+            hwnd = find_window(window_title)
+            if hwnd != 0:
+                win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
+                win32gui.SetForegroundWindow(hwnd)
+                win32gui.BringWindowToTop(hwnd)
+                time.sleep(0.2)  # Chờ cửa sổ focus
+                logger.info("Đã focus cửa sổ: %s", window_title)
+                return True
+        except Exception as e:
+            logger.warning("Không thể focus cửa sổ %s: %s", window_title, e)
+        return False
+    
+    def _dispatch(self, window_title: Optional[str], fn, *args, needs_focus: bool = True, name: Optional[str] = None):
+        """
+        Thực hiện một thao tác input: qua dispatcher (hàng đợi theo cửa sổ) nếu có,
+        nếu không thì focus (khi cần) và chạy ngay trên thread hiện tại. Chờ đến khi xong.
+        """
+        if self.dispatcher is not None:
+            return self.dispatcher.submit(window_title, fn, *args, needs_focus=needs_focus, name=name).result()
+        if needs_focus and window_title:
+            self.focus_window(window_title)
+        return fn(*args)
+    
+    def backend_for(self, window_title: Optional[str]) -> InputBackend:
+        """Backend input của cửa sổ (chọn một lần, chọn lại khi backend hiện tại hỏng)."""
+        backend = self._backends.get(window_title)
+        if backend is None:
+            if isinstance(self.input_backend, InputBackend):
+                backend = self.input_backend
+            else:
+                preference = DEFAULT_PREFERENCE
+                if self.input_backend:
+                    preference = (self.input_backend,) + tuple(n for n in DEFAULT_PREFERENCE if n != self.input_backend)
+                backend = select_backend(window_title, preference, background=self.background_input,
+                                         exclude=self._failed_backends.get(window_title, ()))
+            self._backends[window_title] = backend
+        return backend
+    
+    def _run_backend(self, window_title: Optional[str], op: str, *args) -> bool:
+        """Gọi thao tác `op` của backend; lỗi thì bỏ backend đó cho cửa sổ, lần sau chọn backend khác."""
+        backend = self.backend_for(window_title)
+        try:
+            getattr(backend, op)(*args)
+            return True
+        except Exception as e:
+            logger.warning("Backend %s lỗi khi %s: %s. Lần sau sẽ chọn backend khác", backend.name, op, e)
+            if backend is not self.input_backend:
+                self._failed_backends.setdefault(window_title, set()).add(backend.name)
+                self._backends.pop(window_title, None)
+            return False
     
     def click_at_image(self, template_path: str, region: Optional[Tuple[int, int, int, int]] = None, 
                       button: str = 'left', clicks: int = 1, interval: float = 0.0,
@@ -61,256 +144,77 @@ class ScreenAutomation:
             
             if result:
                 x, y, confidence = result
-                logger.info(f"Click vào vị trí ({x}, {y}) với confidence: {confidence:.2f}")
-                
-                # Focus cửa sổ nếu có window_title (quan trọng cho game)
-                if window_title and sys.platform == 'win32' and WIN32_AVAILABLE:
-                    try:
-                        hwnd = win32gui.FindWindow(None, window_title)
-                        if hwnd == 0:
-                            # Thử tìm theo partial match
-                            def callback(hwnd, windows):
-                                if win32gui.IsWindowVisible(hwnd):
-                                    title = win32gui.GetWindowText(hwnd)
-                                    if window_title.lower() in title.lower():
-                                        windows.append(hwnd)
-                                return True
-                            windows = []
-                            win32gui.EnumWindows(callback, windows)
-                            if windows:
-                                hwnd = windows[0]
-                        
-                        if hwnd != 0:
-                            # Focus cửa sổ
-                            win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
-                            win32gui.SetForegroundWindow(hwnd)
-                            win32gui.BringWindowToTop(hwnd)
-                            time.sleep(0.2)  # Chờ cửa sổ focus
-                            logger.info(f"Đã focus cửa sổ: {window_title}")
-                    except Exception as e:
-                        logger.warning(f"Không thể focus cửa sổ {window_title}: {e}")
-                
-                # Sử dụng win32api trên Windows nếu có (ổn định hơn)
-                if sys.platform == 'win32' and WIN32_AVAILABLE:
-                    try:
-                        # Nếu có window_title, thử dùng PostMessage (mạnh nhất cho game)
-                        if window_title:
-                            hwnd = win32gui.FindWindow(None, window_title)
-                            if hwnd == 0:
-                                def callback(hwnd, windows):
-                                    if win32gui.IsWindowVisible(hwnd):
-                                        title = win32gui.GetWindowText(hwnd)
-                                        if window_title.lower() in title.lower():
-                                            windows.append(hwnd)
-                                    return True
-                                windows = []
-                                win32gui.EnumWindows(callback, windows)
-                                if windows:
-                                    hwnd = windows[0]
-                            
-                            if hwnd != 0:
-                                try:
-                                    # Lấy vị trí cửa sổ
-                                    rect = win32gui.GetWindowRect(hwnd)
-                                    left, top, right, bottom = rect
-                                    
-                                    # Chuyển đổi tọa độ màn hình sang tọa độ cửa sổ
-                                    rel_x = x - left
-                                    rel_y = y - top
-                                    
-                                    # Tạo lparam
-                                    lparam = win32api.MAKELONG(rel_x, rel_y)
-                                    
-                                    # Click bằng PostMessage (trực tiếp vào cửa sổ)
-                                    for i in range(clicks):
-                                        if button == 'left':
-                                            win32gui.PostMessage(hwnd, win32con.WM_LBUTTONDOWN, win32con.MK_LBUTTON, lparam)
-                                            time.sleep(0.05)
-                                            win32gui.PostMessage(hwnd, win32con.WM_LBUTTONUP, 0, lparam)
-                                        elif button == 'right':
-                                            win32gui.PostMessage(hwnd, win32con.WM_RBUTTONDOWN, win32con.MK_RBUTTON, lparam)
-                                            time.sleep(0.05)
-                                            win32gui.PostMessage(hwnd, win32con.WM_RBUTTONUP, 0, lparam)
-                                        
-                                        if interval > 0 and i < clicks - 1:
-                                            time.sleep(interval)
-                                    
-                                    time.sleep(self.click_delay)
-                                    logger.info("Đã click bằng PostMessage (trực tiếp vào cửa sổ)")
-                                    return True
-                                except Exception as e:
-                                    logger.warning(f"PostMessage không hoạt động, thử SendInput: {e}")
-                        
-                        # Thử SendInput (mạnh hơn mouse_event)
-                        try:
-                            import ctypes
-                            from ctypes import wintypes
-                            
-                            # Cấu trúc cho SendInput
-                            class MOUSEINPUT(ctypes.Structure):
-                                _fields_ = [
-                                    ("dx", wintypes.LONG),
-                                    ("dy", wintypes.LONG),
-                                    ("mouseData", wintypes.DWORD),
-                                    ("dwFlags", wintypes.DWORD),
-                                    ("time", wintypes.DWORD),
-                                    ("dwExtraInfo", ctypes.POINTER(wintypes.ULONG))
-                                ]
-                            
-                            class INPUT(ctypes.Structure):
-                                class _INPUT(ctypes.Union):
-                                    _fields_ = [("mi", MOUSEINPUT)]
-                                _anonymous_ = ("_input",)
-                                _fields_ = [
-                                    ("type", wintypes.DWORD),
-                                    ("_input", _INPUT)
-                                ]
-                            
-                            user32 = ctypes.windll.user32
-                            screen_width = win32api.GetSystemMetrics(0)
-                            screen_height = win32api.GetSystemMetrics(1)
-                            
-                            # Chuyển đổi tọa độ
-                            abs_x = int((x * 65535) / screen_width)
-                            abs_y = int((y * 65535) / screen_height)
-                            
-                            MOUSEEVENTF_ABSOLUTE = 0x8000
-                            MOUSEEVENTF_MOVE = 0x0001
-                            MOUSEEVENTF_LEFTDOWN = 0x0002
-                            MOUSEEVENTF_LEFTUP = 0x0004
-                            MOUSEEVENTF_RIGHTDOWN = 0x0008
-                            MOUSEEVENTF_RIGHTUP = 0x0010
-                            
-                            # Di chuyển chuột
-                            move_input = INPUT()
-                            move_input.type = 0  # INPUT_MOUSE
-                            move_input.mi.dx = abs_x
-                            move_input.mi.dy = abs_y
-                            move_input.mi.dwFlags = MOUSEEVENTF_ABSOLUTE | MOUSEEVENTF_MOVE
-                            user32.SendInput(1, ctypes.byref(move_input), ctypes.sizeof(INPUT))
-                            time.sleep(0.05)
-                            
-                            # Click
-                            for i in range(clicks):
-                                if button == 'left':
-                                    down_flag = MOUSEEVENTF_LEFTDOWN
-                                    up_flag = MOUSEEVENTF_LEFTUP
-                                elif button == 'right':
-                                    down_flag = MOUSEEVENTF_RIGHTDOWN
-                                    up_flag = MOUSEEVENTF_RIGHTUP
-                                else:
-                                    down_flag = MOUSEEVENTF_LEFTDOWN
-                                    up_flag = MOUSEEVENTF_LEFTUP
-                                
-                                # Mouse down
-                                down_input = INPUT()
-                                down_input.type = 0
-                                down_input.mi.dx = abs_x
-                                down_input.mi.dy = abs_y
-                                down_input.mi.dwFlags = MOUSEEVENTF_ABSOLUTE | down_flag
-                                user32.SendInput(1, ctypes.byref(down_input), ctypes.sizeof(INPUT))
-                                time.sleep(0.05)
-                                
-                                # Mouse up
-                                up_input = INPUT()
-                                up_input.type = 0
-                                up_input.mi.dx = abs_x
-                                up_input.mi.dy = abs_y
-                                up_input.mi.dwFlags = MOUSEEVENTF_ABSOLUTE | up_flag
-                                user32.SendInput(1, ctypes.byref(up_input), ctypes.sizeof(INPUT))
-                                
-                                if interval > 0 and i < clicks - 1:
-                                    time.sleep(interval)
-                            
-                            time.sleep(self.click_delay)
-                            logger.info("Đã click bằng SendInput")
-                            return True
-                        except Exception as e:
-                            logger.warning(f"SendInput không hoạt động, thử mouse_event: {e}")
-                        
-                        # Fallback: mouse_event (phương pháp cũ)
-                        win32api.SetCursorPos((x, y))
-                        time.sleep(0.05)
-                        
-                        if button == 'left':
-                            down_code = win32con.MOUSEEVENTF_LEFTDOWN
-                            up_code = win32con.MOUSEEVENTF_LEFTUP
-                        elif button == 'right':
-                            down_code = win32con.MOUSEEVENTF_RIGHTDOWN
-                            up_code = win32con.MOUSEEVENTF_RIGHTUP
-                        elif button == 'middle':
-                            down_code = win32con.MOUSEEVENTF_MIDDLEDOWN
-                            up_code = win32con.MOUSEEVENTF_MIDDLEUP
-                        else:
-                            down_code = win32con.MOUSEEVENTF_LEFTDOWN
-                            up_code = win32con.MOUSEEVENTF_LEFTUP
-                        
-                        for i in range(clicks):
-                            win32api.mouse_event(down_code, x, y, 0, 0)
-                            time.sleep(0.05)
-                            win32api.mouse_event(up_code, x, y, 0, 0)
-                            if interval > 0 and i < clicks - 1:
-                                time.sleep(interval)
-                        
-                        time.sleep(self.click_delay)
-                        logger.info("Đã click bằng mouse_event")
-                        return True
-                    except Exception as e:
-                        logger.warning(f"Lỗi khi dùng win32api, thử PyAutoGUI: {e}")
-                        # Fallback về PyAutoGUI
-                
-                # Fallback: Sử dụng PyAutoGUI
-                pyautogui.moveTo(x, y, duration=0.1)
-                time.sleep(0.05)
-                
-                # Click bằng mouseDown/mouseUp
-                for i in range(clicks):
-                    pyautogui.mouseDown(button=button)
-                    time.sleep(0.05)
-                    pyautogui.mouseUp(button=button)
-                    # Chờ interval giữa các lần click (nếu có nhiều clicks)
-                    if interval > 0 and i < clicks - 1:
-                        time.sleep(interval)
+                logger.info("Click vào vị trí (%s, %s) với confidence: %.2f", x, y, confidence)
                 
-                time.sleep(self.click_delay)
-                
-                return True
+                backend = self.backend_for(window_title)
+                success = self._dispatch(window_title, self._run_backend, window_title, 'click',
+                                         x, y, button, clicks, interval,
+                                         needs_focus=backend.needs_focus('click'), name='click')
+                if success:
+                    logger.info("Đã click bằng %s", backend.name)
+                    # Chờ ngoài khóa focus: client khác không phải đợi
+                    time.sleep(self.click_delay)
+                return success
             else:
-                logger.warning(f"Không tìm thấy template: {template_path}")
+                logger.warning("Không tìm thấy template: %s", template_path)
                 return False
                 
         except Exception as e:
-            logger.error(f"Lỗi khi click tại image: {str(e)}")
+            logger.error("Lỗi khi click tại image: %s", e)
             return False
     
-    def paste_data(self, text: str, clear_first: bool = False) -> bool:
+    def submit_click(self, x: int, y: int, button: str = 'left', clicks: int = 1, interval: float = 0.0,
+                     window_title: Optional[str] = None) -> Future:
+        """
+        Đưa một click vào hàng đợi của cửa sổ mà không chờ (dùng khi điều khiển nhiều client song song).
+        
+        Returns:
+            Future trả về True/False khi click xong.
+        """
+        if self.dispatcher is None:
+            self.dispatcher = default_dispatcher(self.focus_window)
+        backend = self.backend_for(window_title)
+        return self.dispatcher.submit(window_title, self._run_backend, window_title, 'click',
+                                      x, y, button, clicks, interval,
+                                      needs_focus=backend.needs_focus('click'), name='click')
+    
+    def paste_data(self, text: str, clear_first: bool = False, window_title: Optional[str] = None) -> bool:
         """
         Paste dữ liệu vào vị trí hiện tại của con trỏ.
         
         Args:
             text: Nội dung text cần paste
             clear_first: Nếu True, sẽ xóa nội dung hiện tại trước khi paste (Ctrl+A, Delete)
+            window_title: Cửa sổ đích (xếp hàng cùng các thao tác khác của cửa sổ đó khi có dispatcher)
         
         Returns:
             True nếu paste thành công.
         """
         try:
-            if clear_first:
-                # Xóa nội dung hiện tại
-                pyautogui.hotkey('ctrl', 'a')
-                time.sleep(0.1)
-                pyautogui.press('delete')
-                time.sleep(0.1)
-            
-            # Paste dữ liệu
-            pyautogui.write(text, interval=0.01)
-            logger.info(f"Đã paste dữ liệu: {text[:50]}...")
-            return True
-            
+            backend = self.backend_for(window_title)
+            return self._dispatch(window_title, self._type_text, window_title, text, clear_first,
+                                  needs_focus=backend.needs_focus('write'), name='paste')
         except Exception as e:
-            logger.error(f"Lỗi khi paste dữ liệu: {str(e)}")
+            logger.error("Lỗi khi paste dữ liệu: %s", e)
             return False
     
+    def _type_text(self, window_title: Optional[str], text: str, clear_first: bool) -> bool:
+        """Gõ text qua backend của cửa sổ (đã có focus nếu backend cần); backend lỗi bị loại như với click."""
+        if clear_first:
+            # Xóa nội dung hiện tại
+            if not self._run_backend(window_title, 'hotkey', 'ctrl', 'a'):
+                return False
+            time.sleep(0.1)
+            if not self._run_backend(window_title, 'press', 'delete'):
+                return False
+            time.sleep(0.1)
+        
+        # Paste dữ liệu
+        if not self._run_backend(window_title, 'write', text, 0.01):
+            return False
+        logger.info("Đã paste dữ liệu: %s...", text[:50])
+        return True
+    
     def paste_data_clipboard(self, text: str, clear_first: bool = False) -> bool:
         """
         Paste dữ liệu sử dụng clipboard (Ctrl+V).
@@ -324,6 +228,7 @@ class ScreenAutomation:
         """
         try:
             import pyperclip
+            pyautogui = load_pyautogui()
             
             if clear_first:
                 pyautogui.hotkey('ctrl', 'a')
@@ -339,14 +244,14 @@ class ScreenAutomation:
             pyautogui.hotkey('ctrl', 'v')
             time.sleep(0.2)
             
-            logger.info(f"Đã paste dữ liệu từ clipboard: {text[:50]}...")
+            logger.info("Đã paste dữ liệu từ clipboard: %s...", text[:50])
             return True
             
         except ImportError:
             logger.warning("pyperclip không được cài đặt. Sử dụng phương thức write() thay thế.")
             return self.paste_data(text, clear_first)
         except Exception as e:
-            logger.error(f"Lỗi khi paste dữ liệu từ clipboard: {str(e)}")
+            logger.error("Lỗi khi paste dữ liệu từ clipboard: %s", e)
             return False
     
     def click_and_paste(self, template_path: str, text: str, 
@@ -379,7 +284,7 @@ class ScreenAutomation:
                 return self.paste_data(text, clear_first)
                 
         except Exception as e:
-            logger.error(f"Lỗi trong click_and_paste: {str(e)}")
+            logger.error("Lỗi trong click_and_paste: %s", e)
             return False
     
     def wait_for_image(self, template_path: str, timeout: float = 10.0, 
@@ -398,19 +303,19 @@ class ScreenAutomation:
             Tuple (x, y, confidence) nếu tìm thấy, None nếu timeout.
         """
         start_time = time.time()
-        logger.info(f"Đang đợi template xuất hiện: {template_path} (timeout: {timeout}s)")
+        logger.info("Đang đợi template xuất hiện: %s (timeout: %ss)", template_path, timeout)
         
         while time.time() - start_time < timeout:
             result = self.detector.find_template(template_path, region)
             if result:
                 x, y, confidence = result
                 elapsed = time.time() - start_time
-                logger.info(f"Tìm thấy template sau {elapsed:.2f}s tại ({x}, {y})")
+                logger.info("Tìm thấy template sau %.2fs tại (%s, %s)", elapsed, x, y)
                 return result
             
             time.sleep(check_interval)
         
-        logger.warning(f"Timeout: Không tìm thấy template sau {timeout}s")
+        logger.warning("Timeout: Không tìm thấy template sau %ss", timeout)
         return None
     
     def double_click_at_image(self, template_path: str, 
@@ -441,6 +346,26 @@ class ScreenAutomation:
         """
         return self.click_at_image(template_path, region, button='right')
     
+    def read_text(self, region: Tuple[int, int, int, int], timeout: float = 1.0) -> Optional[str]:
+        """
+        Đọc chữ trong một vùng màn hình (thông báo lỗi, id account, ...).
+        
+        Args:
+            region: (x, y, width, height) - Vùng chứa chữ (càng nhỏ càng nhanh)
+            timeout: Ngân sách thời gian (giây); quá hạn thì trả về None và không chặn runner
+        
+        Returns:
+            Chuỗi đọc được, hoặc None nếu quá ngân sách / OCR không dùng được.
+        """
+        if self.ocr is None:
+            self.ocr = default_service()
+        try:
+            crop = self.detector._capture(region)
+        except Exception as e:
+            logger.error("Lỗi khi chụp vùng để đọc chữ: %s", e)
+            return None
+        return self.ocr.read(crop, timeout=timeout)
+    
     def set_detection_threshold(self, threshold: float):
         """Thay đổi threshold cho template matching."""
         self.detector.set_threshold(threshold)
@@ -448,7 +373,7 @@ class ScreenAutomation:
     def set_click_delay(self, delay: float):
         """Thay đổi thời gian chờ sau mỗi lần click."""
         self.click_delay = delay
-        logger.info(f"Đã đặt click delay: {delay}s")
+        logger.info("Đã đặt click delay: %ss", delay)
     
     def press_key(self, key: str, times: int = 1, interval: float = 0.0, window_title: Optional[str] = None) -> bool:
         """
@@ -464,42 +389,18 @@ class ScreenAutomation:
             True nếu thành công
         """
         try:
-            # Focus cửa sổ nếu có window_title
-            if window_title and sys.platform == 'win32' and WIN32_AVAILABLE:
-                try:
-                    hwnd = win32gui.FindWindow(None, window_title)
-                    if hwnd == 0:
-                        def callback(hwnd, windows):
-                            if win32gui.IsWindowVisible(hwnd):
-                                title = win32gui.GetWindowText(hwnd)
-                                if window_title.lower() in title.lower():
-                                    windows.append(hwnd)
-                            return True
-                        windows = []
-                        win32gui.EnumWindows(callback, windows)
-                        if windows:
-                            hwnd = windows[0]
-                    
-                    if hwnd != 0:
-                        win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
-                        win32gui.SetForegroundWindow(hwnd)
-                        win32gui.BringWindowToTop(hwnd)
-                        time.sleep(0.2)
-                        logger.info(f"Đã focus cửa sổ: {window_title}")
-                except Exception as e:
-                    logger.warning(f"Không thể focus cửa sổ {window_title}: {e}")
-            
-            # Nhấn phím
             for i in range(times):
-                pyautogui.press(key)
-                logger.info(f"Đã nhấn phím '{key}' (lần {i+1}/{times})")
+                # Mỗi lần nhấn là một thao tác riêng trên dispatcher: chờ interval ngoài khóa focus,
+                # client khác được gửi input xen vào giữa hai lần nhấn
+                if not self._dispatch(window_title, self._run_backend, window_title, 'press', key,
+                                      needs_focus=self.backend_for(window_title).needs_focus('press'),
+                                      name='press_key'):
+                    return False
+                logger.info("Đã nhấn phím '%s' (lần %s/%s)", key, i + 1, times)
                 
                 if interval > 0 and i < times - 1:
                     time.sleep(interval)
-            
             return True
-            
         except Exception as e:
-            logger.error(f"Lỗi khi nhấn phím '{key}': {str(e)}")
+            logger.error("Lỗi khi nhấn phím '%s': %s", key, e)
             return False
-
@@ -0,0 +1,553 @@
+"""
+Game Simulator Module
+Giả lập game client không cần Windows/wwm.exe để chạy thử toàn bộ AutoRunner.run_loop
+trên hàng nghìn account và đo số account mỗi giờ trước khi đưa thay đổi vào máy thật.
+
+Game giả là một state machine theo các templates/step*.png: mỗi màn hình ghép template
+của step hiện tại lên một frame tổng hợp, xuất hiện sau một độ trễ ngẫu nhiên; click
+đúng vào nút thì chuyển sang step kế tiếp. Có thể cấu hình click bị bỏ qua, dialog che
+nút, client crash, step không xuất hiện (step 8) và step chỉ mở sau khi nhấn phím
+(sau step 9 phải nhấn R 4 lần). Game cung cấp:
+    - frame source cho ImageDetector (grab(region))
+    - listener cho input_backends.FakeInputBackend
+    - SimProcessWatcher / kill_process thay cho wwm.exe thật
+SimClock thay time.sleep bằng việc cộng thời gian ảo nên các lần chờ 20 giây không
+tốn thời gian thật, còn chi phí chụp/matching vẫn được tính như thật.
+
+Ví dụ:
+    python simulator.py --accounts 500 --seed 1 --dialog-rate 0.05 --crash-rate 0.002
+"""
+
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import cv2
+import numpy as np
+
+from metrics import STEP_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Độ trễ xuất hiện mặc định của mỗi màn hình (giây, khoảng ngẫu nhiên đều)
+DEFAULT_APPEAR_DELAY = (0.5, 2.0)
+
+
+class SimClock:
+    """
+    Đồng hồ ảo: sleep() không ngủ mà cộng dồn vào độ lệch, time()/monotonic()/perf_counter()
+    = thời gian thật + độ lệch. Thời gian xử lý thật (chụp, matching) vẫn được tính.
+    """
+
+    def __init__(self):
+        self._real = {name: getattr(time, name) for name in ('sleep', 'time', 'monotonic', 'perf_counter')}
+        self._offset = 0.0
+        self._lock = threading.Lock()
+        self._installed = False
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            with self._lock:
+                self._offset += seconds
+
+    def time(self) -> float:
+        return self._real['time']() + self._offset
+
+    def monotonic(self) -> float:
+        return self._real['monotonic']() + self._offset
+
+    def perf_counter(self) -> float:
+        return self._real['perf_counter']() + self._offset
+
+    @property
+    def skipped(self) -> float:
+        """Tổng thời gian sleep đã bỏ qua (giây)."""
+        return self._offset
+
+    @contextlib.contextmanager
+    def install(self):
+        """Thay các hàm của module time trong lúc chạy (mọi module gọi time.sleep/time.time)."""
+        if self._installed:
+            yield self
+            return
+        self._installed = True
+        for name in self._real:
+            setattr(time, name, getattr(self, name))
+        try:
+            yield self
+        finally:
+            for name, fn in self._real.items():
+                setattr(time, name, fn)
+            self._installed = False
+
+
+class SimGame:
+    """State machine của game giả: render frame theo step hiện tại và phản ứng với input."""
+
+    def __init__(self, steps: Sequence[Tuple[int, str]], screen_size: Tuple[int, int] = (1280, 720),
+                 clock: Optional[SimClock] = None, seed: Optional[int] = None,
+                 appear_delay: Tuple[float, float] = DEFAULT_APPEAR_DELAY,
+                 step_delays: Optional[Dict[int, Tuple[float, float]]] = None,
+                 click_fail_rate: float = 0.0, dialog_rate: float = 0.0,
+                 dialog_duration: Tuple[float, float] = (2.0, 6.0), crash_rate: float = 0.0,
+                 absent_steps: Optional[Dict[int, float]] = None,
+                 key_gates: Optional[Dict[int, Tuple[str, int]]] = None,
+                 launch_step: Optional[int] = None, relaunch_delay: float = 1.0,
+                 negative_screens: Optional[Dict[int, Sequence[Tuple[str, float]]]] = None):
+        """
+        Khởi tạo SimGame.
+
+        Args:
+            steps: [(step_num, template_path)] theo thứ tự chạy
+            screen_size: (width, height) của màn hình giả
+            clock: Đồng hồ dùng cho độ trễ (None = đồng hồ thật)
+            seed: Seed cho vị trí nút, nền và các sự kiện ngẫu nhiên
+            appear_delay: Khoảng độ trễ (min, max) trước khi màn hình của step xuất hiện
+            step_delays: {step_num: (min, max)} độ trễ riêng cho từng step
+            click_fail_rate: Xác suất click đúng nút nhưng game bỏ qua
+            dialog_rate: Xác suất một dialog che nút khi màn hình mới xuất hiện
+            dialog_duration: Khoảng thời gian dialog che nút (giây)
+            crash_rate: Xác suất client crash sau mỗi click (quay về launcher)
+            absent_steps: {step_num: xác suất} step có thể không xuất hiện (game đi thẳng sang step sau)
+            key_gates: {step_num: (phím, số lần)} màn hình sau step này chỉ xuất hiện khi đã nhấn đủ phím
+            launch_step: Step mà click vào sẽ khởi chạy client (None = step đầu tiên)
+            relaunch_delay: Thời gian từ khi client bị kill đến khi launcher hiện lại (giây)
+            negative_screens: {step_num: [(template_path, xác suất)]} màn hình lỗi (sai mật khẩu, ban...)
+                              hiện đè lên step đó và kẹt lại cho đến khi client bị kill
+        """
+        if not steps:
+            raise ValueError("Cần ít nhất một step")
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.width, self.height = screen_size
+        self.appear_delay = appear_delay
+        self.step_delays = dict(step_delays or {})
+        self.click_fail_rate = click_fail_rate
+        self.dialog_rate = dialog_rate
+        self.dialog_duration = dialog_duration
+        self.crash_rate = crash_rate
+        self.absent_steps = dict(absent_steps or {})
+        self.key_gates = dict(key_gates or {})
+        self.relaunch_delay = relaunch_delay
+
+        # Nền nhiễu: không template nào khớp nhầm vào nền
+        np_rng = np.random.default_rng(seed)
+        self.background = np_rng.integers(0, 256, (self.height, self.width, 3), dtype=np.uint8)
+        self.steps: List[Tuple[int, np.ndarray, Tuple[int, int]]] = []
+        for step_num, path in steps:
+            template = cv2.imread(path, cv2.IMREAD_COLOR)
+            if template is None:
+                raise ValueError(f"Không thể đọc template: {path}")
+            th, tw = template.shape[:2]
+            if tw > self.width or th > self.height:
+                raise ValueError(f"Template {path} lớn hơn màn hình giả {self.width}x{self.height}")
+            position = (self.rng.randint(0, self.width - tw), self.rng.randint(0, self.height - th))
+            self.steps.append((step_num, template, position))
+        self.launch_step = launch_step if launch_step is not None else self.steps[0][0]
+        self.negative_screens: Dict[int, List[Tuple[np.ndarray, float]]] = {}
+        for step_num, items in (negative_screens or {}).items():
+            for path, probability in items:
+                template = cv2.imread(path, cv2.IMREAD_COLOR)
+                if template is None:
+                    raise ValueError(f"Không thể đọc template: {path}")
+                self.negative_screens.setdefault(step_num, []).append((template, probability))
+
+        self._lock = threading.RLock()
+        self._frame = np.empty_like(self.background)
+        self._rendered = None  # Trạng thái của frame đang render (index, hiện nút, hiện dialog)
+        self.running = False
+        self.pid = 0
+        self.typed: List[str] = []
+        self._gate_key: Optional[str] = None
+        self._keys_left: Optional[int] = None
+        self.negative: Optional[np.ndarray] = None
+        self.stats = {'clicks': 0, 'missed_clicks': 0, 'ignored_clicks': 0, 'dialogs': 0, 'negatives': 0,
+                      'crashes': 0, 'kills': 0, 'launches': 0, 'completed': 0, 'frames': 0}
+        self.index: Optional[int] = None
+        self._show(0, delay=0.0)
+
+    # ---------------------------------------------------------------- thời gian / trạng thái
+
+    def _now(self) -> float:
+        return self.clock.monotonic() if self.clock is not None else time.monotonic()
+
+    def _show(self, index: Optional[int], delay: Optional[float] = None):
+        """Chuyển sang màn hình của steps[index] (None = không có nút nào, vd sau step cuối)."""
+        while index is not None and index < len(self.steps):
+            step_num = self.steps[index][0]
+            if self.rng.random() < self.absent_steps.get(step_num, 0.0):
+                index += 1
+                continue
+            break
+        if index is not None and index >= len(self.steps):
+            index = None
+        self.index = index
+        self._keys_left = None
+        if index is None:
+            return
+        if delay is None:
+            low, high = self.step_delays.get(self.steps[index][0], self.appear_delay)
+            delay = self.rng.uniform(low, high)
+        self.visible_at = self._now() + delay
+        self.dialog_until = 0.0
+        self.negative = None
+        for template, probability in self.negative_screens.get(self.steps[index][0], ()):
+            if self.rng.random() < probability:
+                self.negative = template
+                self.stats['negatives'] += 1
+                break
+        if self.rng.random() < self.dialog_rate:
+            self.dialog_until = self.visible_at + self.rng.uniform(*self.dialog_duration)
+            self.stats['dialogs'] += 1
+
+    def _state(self) -> Tuple[Optional[int], bool, bool]:
+        now = self._now()
+        if self.index is None:
+            return None, False, False
+        visible = self._keys_left is None and now >= self.visible_at
+        return self.index, visible, visible and now < self.dialog_until
+
+    @property
+    def current_step(self) -> Optional[int]:
+        """Step đang hiển thị (đã xuất hiện và không bị dialog che), None nếu chưa có."""
+        with self._lock:
+            index, visible, dialog = self._state()
+            return self.steps[index][0] if visible and not dialog else None
+
+    # ---------------------------------------------------------------- frame source
+
+    def grab(self, region: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+        """Frame BGR hiện tại (hoặc một vùng) - interface frame source của ImageDetector."""
+        with self._lock:
+            state = self._state()
+            if state != self._rendered:
+                self._render(*state)
+            self.stats['frames'] += 1
+            if region:
+                x, y, w, h = region
+                return self._frame[y:y + h, x:x + w]
+            return self._frame
+
+    def _render(self, index: Optional[int], visible: bool, dialog: bool):
+        np.copyto(self._frame, self.background)
+        if index is not None and visible:
+            _, template, (x, y) = self.steps[index]
+            th, tw = template.shape[:2]
+            self._frame[y:y + th, x:x + tw] = template
+            if dialog:
+                # Dialog che nút (và tràn ra xung quanh)
+                x0, y0 = max(0, x - 40), max(0, y - 30)
+                self._frame[y0:y + th + 30, x0:x + tw + 40] = (60, 60, 60)
+            if self.negative is not None:
+                # Màn hình lỗi ở giữa màn hình, nút phía sau vẫn có thể lộ ra
+                nh, nw = self.negative.shape[:2]
+                nx, ny = (self.width - nw) // 2, (self.height - nh) // 2
+                self._frame[ny:ny + nh, nx:nx + nw] = self.negative
+        self._rendered = (index, visible, dialog)
+
+    # ---------------------------------------------------------------- input
+
+    def on_input(self, event: dict):
+        """Listener cho FakeInputBackend."""
+        with self._lock:
+            if event['op'] == 'click':
+                self._on_click(event['x'], event['y'])
+            elif event['op'] == 'press':
+                self._on_key(event['key'])
+            elif event['op'] == 'write':
+                self.typed.append(event['text'])
+
+    def _on_click(self, x: int, y: int):
+        self.stats['clicks'] += 1
+        index, visible, dialog = self._state()
+        if index is None or not visible or dialog or self.negative is not None:
+            self.stats['missed_clicks'] += 1
+            return
+        step_num, template, (bx, by) = self.steps[index]
+        th, tw = template.shape[:2]
+        if not (bx <= x < bx + tw and by <= y < by + th):
+            self.stats['missed_clicks'] += 1
+            return
+        if self.rng.random() < self.click_fail_rate:
+            self.stats['ignored_clicks'] += 1
+            return
+
+        if step_num == self.launch_step and not self.running:
+            self.running = True
+            self.pid += 1
+            self.stats['launches'] += 1
+        elif not self.running:
+            # Click vào client đã chết (không xảy ra trừ launch step)
+            self.stats['missed_clicks'] += 1
+            return
+        if self.running and self.rng.random() < self.crash_rate:
+            self.stats['crashes'] += 1
+            self._stop_client()
+            return
+
+        if index == len(self.steps) - 1:
+            self.stats['completed'] += 1
+        self._show(index + 1)
+        gate = self.key_gates.get(step_num)
+        if gate is not None and self.index is not None:
+            self._gate_key, self._keys_left = gate[0].lower(), gate[1]
+
+    def _on_key(self, key: str):
+        if self._keys_left is None or key.lower() != self._gate_key:
+            return
+        self._keys_left -= 1
+        if self._keys_left <= 0:
+            # Đã nhấn đủ phím: màn hình tiếp theo bắt đầu xuất hiện từ bây giờ
+            index = self.index
+            self._show(index)
+
+    # ---------------------------------------------------------------- process
+
+    def _stop_client(self):
+        self.running = False
+        self._show(0, delay=self.relaunch_delay)
+
+    def kill(self) -> bool:
+        """Kill client (launcher hiện lại sau relaunch_delay). False nếu client không chạy."""
+        with self._lock:
+            was_running = self.running
+            self.stats['kills'] += int(was_running)
+            self._stop_client()
+            return was_running
+
+
+class SimProcessWatcher:
+    """Thay cho process_utils.ProcessWatcher: process giả của SimGame."""
+
+    def __init__(self, game: SimGame, process_name: str = "wwm.exe"):
+        self.game = game
+        self.process_name = process_name
+
+    @property
+    def pids(self) -> Set[int]:
+        return {self.game.pid} if self.game.running else set()
+
+    def on_spawn(self, callback: Callable[[int], None]):
+        pass
+
+    def on_exit(self, callback: Callable[[int], None]):
+        pass
+
+    def track(self, pid: int):
+        pass
+
+    def refresh(self, full_scan: bool = False) -> Tuple[List[int], List[int]]:
+        return [], []
+
+    def wait_for_exit(self, pid: Optional[int] = None, timeout: float = 10.0) -> bool:
+        return not self.game.running or (pid is not None and pid != self.game.pid)
+
+    def wait_for_spawn(self, timeout: float = 60.0, exclude: Optional[Set[int]] = None) -> Optional[int]:
+        pids = self.pids - set(exclude or ())
+        return next(iter(pids), None)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def kill_process(self, process_name: str, force: bool = False) -> bool:
+        """Thay cho process_utils.kill_process_by_name."""
+        return self.game.kill()
+
+
+def discover_steps(templates_dir: str = "templates") -> List[Tuple[int, str]]:
+    """[(step_num, path)] của các step*.png theo số thứ tự (cùng quy ước với AutoRunner)."""
+    steps = []
+    for path in glob.glob(os.path.join(templates_dir, "step*.png")):
+        match = re.search(r'step(\d+)', os.path.basename(path), re.IGNORECASE)
+        if match:
+            steps.append((int(match.group(1)), path))
+    return sorted(steps)
+
+
+def write_accounts(path: str, count: int, seed: Optional[int] = None):
+    """Tạo file account giả (id, state, user, pass) với `count` account chưa chạy."""
+    rng = random.Random(seed)
+    alphabet = 'abcdefghijklmnopqrstuvwxyz0123456789'
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'state', 'user', 'pass'])
+        for i in range(1, count + 1):
+            user = ''.join(rng.choice(alphabet) for _ in range(12))
+            password = ''.join(rng.choice(alphabet) for _ in range(9))
+            writer.writerow([i, '', user, password])
+
+
+def simulate(accounts: int = 100, seed: Optional[int] = None, templates_dir: str = "templates",
+             game_options: Optional[dict] = None, runner_options: Optional[dict] = None,
+             workdir: Optional[str] = None, quiet: bool = True, max_iterations: Optional[int] = None) -> dict:
+    """
+    Chạy AutoRunner.run_loop trên game giả cho đến khi hết account.
+
+    Args:
+        accounts: Số account giả
+        seed: Seed cho game và account
+        templates_dir: Thư mục templates/step*.png
+        game_options: Tham số thêm cho SimGame (độ trễ, tỉ lệ lỗi, ...)
+        runner_options: Tham số thêm cho AutoRunner (threshold, max_retries, match_strategy, ...)
+        workdir: Thư mục ghi account.csv/journal giả (None = thư mục tạm)
+        quiet: Ẩn output của runner
+        max_iterations: Số vòng lặp tối đa của runner (None = accounts x số lần thử tối đa)
+
+    Returns:
+        dict kết quả: số account done/failed, thời gian ảo/thật, account mỗi giờ,
+        thống kê của game và thời gian trung bình mỗi step (giây ảo).
+    """
+    from input_backends import FakeInputBackend
+    from run import AutoRunner
+
+    clock = SimClock()
+    game = SimGame(discover_steps(templates_dir), clock=clock, seed=seed, **(game_options or {}))
+    watcher = SimProcessWatcher(game)
+    steps_before = {step_num: STEP_LATENCY.snapshot(step=step_num) for step_num, _ in discover_steps(templates_dir)}
+
+    with contextlib.ExitStack() as stack:
+        if workdir is None:
+            workdir = stack.enter_context(tempfile.TemporaryDirectory(prefix="wwm_sim_"))
+        account_file = os.path.join(workdir, "account.csv")
+        write_accounts(account_file, accounts, seed)
+
+        options = {'max_retries': 10, 'retry_delay': 2.0}
+        options.update(runner_options or {})
+        options.setdefault('step_timing_path', os.path.join(workdir, "step_timing.json"))
+        runner = AutoRunner(account_file=account_file, journal_path=os.path.join(workdir, "progress.jsonl"),
+                            frame_source=game, input_backend=FakeInputBackend(listener=game.on_input),
+                            process_watcher=watcher, kill_process=watcher.kill_process, **options)
+
+        if quiet:
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            for name in ('run', 'image_detector', 'screen_automation', 'input_backends'):
+                logging.getLogger(name).setLevel(logging.WARNING)
+        stack.enter_context(clock.install())
+
+        real_start = clock._real['perf_counter']()
+        sim_start = clock.monotonic()
+        runner.run_loop(max_iterations or accounts * max(1, runner.scheduler.max_attempts))
+        sim_elapsed = clock.monotonic() - sim_start
+        real_elapsed = clock._real['perf_counter']() - real_start
+
+        with open(account_file, 'r', encoding='utf-8') as f:
+            states = [row.get('state', '') for row in csv.DictReader(f)]
+
+    done = sum(1 for state in states if state == 'done')
+    state_counts: Dict[str, int] = {}
+    for state in states:
+        state_counts[state or 'pending'] = state_counts.get(state or 'pending', 0) + 1
+    step_times = {}
+    for step_num, (total_before, count_before) in steps_before.items():
+        total, count = STEP_LATENCY.snapshot(step=step_num)
+        if count > count_before:
+            step_times[step_num] = (total - total_before) / (count - count_before)
+    return {
+        'accounts': accounts,
+        'done': done,
+        'failed': len(states) - done,  # Gồm cả account còn chờ chạy lại và màn hình lỗi
+        'states': state_counts,
+        'sim_seconds': sim_elapsed,
+        'real_seconds': real_elapsed,
+        'accounts_per_hour': done / sim_elapsed * 3600.0 if sim_elapsed > 0 else 0.0,
+        'speedup': sim_elapsed / real_elapsed if real_elapsed > 0 else 0.0,
+        'game': dict(game.stats),
+        'step_seconds': step_times,
+    }
+
+
+def print_report(report: dict):
+    """In kết quả simulate()."""
+    print(f"\n{'='*60}")
+    print("KẾT QUẢ MÔ PHỎNG")
+    print(f"{'='*60}")
+    print(f"Account: {report['done']}/{report['accounts']} done, {report['failed']} failed")
+    print(f"Thời gian ảo: {report['sim_seconds'] / 3600.0:.2f} giờ "
+          f"(thật: {report['real_seconds']:.1f}s, nhanh hơn {report['speedup']:.0f}x)")
+    print(f"→ {report['accounts_per_hour']:.1f} account/giờ")
+    print("State: " + ", ".join(f"{state}={count}" for state, count in sorted(report['states'].items())))
+    game = report['game']
+    print(f"Game: {game['clicks']} click ({game['missed_clicks']} trượt, {game['ignored_clicks']} bị bỏ qua), "
+          f"{game['dialogs']} dialog, {game['negatives']} màn hình lỗi, {game['crashes']} crash, {game['kills']} kill, {game['frames']} frame")
+    if report['step_seconds']:
+        print("Thời gian trung bình mỗi step (giây ảo):")
+        for step_num, seconds in sorted(report['step_seconds'].items()):
+            print(f"  step{step_num}: {seconds:.2f}s")
+
+
+def _parse_delays(items: Sequence[str]) -> Dict[int, Tuple[float, float]]:
+    """'9=20:25' -> {9: (20.0, 25.0)}; '3=1.5' -> {3: (1.5, 1.5)}."""
+    delays = {}
+    for item in items:
+        step, _, value = item.partition('=')
+        low, _, high = value.partition(':')
+        delays[int(step)] = (float(low), float(high or low))
+    return delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy AutoRunner trên game giả và đo số account mỗi giờ")
+    parser.add_argument('--accounts', type=int, default=100, help="Số account giả")
+    parser.add_argument('--seed', type=int, default=None, help="Seed ngẫu nhiên (lặp lại được kết quả)")
+    parser.add_argument('--templates', default="templates", help="Thư mục templates/step*.png")
+    parser.add_argument('--screen', default="1280x720", help="Kích thước màn hình giả (WxH)")
+    parser.add_argument('--delay', default="0.5:2.0", help="Độ trễ xuất hiện mặc định min:max (giây)")
+    parser.add_argument('--step-delay', action='append', default=[], metavar="STEP=MIN:MAX",
+                        help="Độ trễ riêng cho step, vd 2=5:10 (lặp lại được)")
+    parser.add_argument('--click-fail-rate', type=float, default=0.02, help="Xác suất click bị game bỏ qua")
+    parser.add_argument('--dialog-rate', type=float, default=0.02, help="Xác suất dialog che nút")
+    parser.add_argument('--crash-rate', type=float, default=0.001, help="Xác suất client crash sau mỗi click")
+    parser.add_argument('--step8-absent', type=float, default=0.3, help="Xác suất step 8 không xuất hiện")
+    parser.add_argument('--negative', action='append', default=[], metavar="STEP=PROB",
+                        help="Xác suất một màn hình lỗi trong templates/negative/*.png hiện ở step, vd 6=0.05")
+    parser.add_argument('--threshold', type=float, default=0.8, help="Ngưỡng confidence của runner")
+    parser.add_argument('--strategy', default="direct", help="Chiến lược matching của runner")
+    parser.add_argument('--workdir', default=None, help="Giữ account.csv/journal giả ở thư mục này")
+    parser.add_argument('--verbose', action='store_true', help="Hiện output của runner")
+    args = parser.parse_args()
+
+    width, _, height = args.screen.lower().partition('x')
+    low, _, high = args.delay.partition(':')
+    game_options = {
+        'screen_size': (int(width), int(height)),
+        'appear_delay': (float(low), float(high or low)),
+        'step_delays': _parse_delays(args.step_delay),
+        'click_fail_rate': args.click_fail_rate,
+        'dialog_rate': args.dialog_rate,
+        'crash_rate': args.crash_rate,
+        'absent_steps': {8: args.step8_absent},
+        'key_gates': {9: ('r', 4)},
+    }
+    negative_paths = sorted(glob.glob(os.path.join(args.templates, "negative", "*.png")))
+    if args.negative and negative_paths:
+        game_options['negative_screens'] = {}
+        for item in args.negative:
+            step, _, probability = item.partition('=')
+            # Chia đều xác suất cho các màn hình lỗi
+            share = float(probability) / len(negative_paths)
+            game_options['negative_screens'][int(step)] = [(path, share) for path in negative_paths]
+    runner_options = {'threshold': args.threshold, 'match_strategy': args.strategy}
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+
+    print(f"→ Mô phỏng {args.accounts} account trên màn hình {args.screen}...")
+    report = simulate(args.accounts, seed=args.seed, templates_dir=args.templates, game_options=game_options,
+                      runner_options=runner_options, workdir=args.workdir, quiet=not args.verbose)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
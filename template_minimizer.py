@@ -0,0 +1,284 @@
+"""
+Template Minimizer Module
+Thu nhỏ template về vùng con nhỏ nhất vẫn khớp duy nhất với biên an toàn trên một
+tập frame (ảnh chụp các màn hình của game): chi phí matchTemplate tỉ lệ với diện
+tích template, còn template cắt tay thường có viền rộng không giúp gì cho việc nhận
+diện. Template mới được ghi kèm file JSON chứa click_offset để ImageDetector vẫn
+click đúng điểm cũ (tâm template gốc) - runner không cần sửa gì.
+
+Frame chứa template gốc (score >= threshold) được coi là frame "có", các frame khác
+là frame "không". Vùng con hợp lệ khi:
+    - frame "có": khớp đúng vị trí của template gốc với score >= threshold + margin,
+      mọi vị trí khác < threshold - margin
+    - frame "không": mọi vị trí < threshold - margin
+
+Việc tìm là tham lam: mỗi cạnh tìm nhị phân độ dài cắt, giả định rằng cắt được n pixel
+thì cũng cắt được mọi độ dài nhỏ hơn. Giả định này không luôn đúng, nên kết quả là một
+vùng con nhỏ và hợp lệ chứ không chắc là vùng con nhỏ nhất.
+
+Cạnh mặc định tối thiểu là 24 pixel: template nhỏ hơn thì match_pyramid không thu nhỏ
+được (pyramid_scale_for trả về 1.0) và chạy như direct.
+
+Cách dùng:
+    python template_minimizer.py templates/step1.png --frames screenshots/
+    python template_minimizer.py templates/step11.png --frames screenshots/ --margin 0.15 --out templates/minimized
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from match_strategies import sidecar_path
+
+OUTPUT_DIR = os.path.join("templates", "minimized")
+FRAME_PATTERNS = ("*.png", "*.jpg", "*.jpeg", "*.bmp")
+
+
+def load_frames(paths: List[str]) -> List[Tuple[str, np.ndarray]]:
+    """Đọc frame BGR từ danh sách file hoặc thư mục."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in FRAME_PATTERNS:
+                files.extend(glob.glob(os.path.join(path, pattern)))
+        else:
+            files.append(path)
+    frames = []
+    for path in sorted(set(files)):
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        if frame is None:
+            print(f"⚠ Bỏ qua file không đọc được: {path}")
+            continue
+        frames.append((path, frame))
+    return frames
+
+
+def _scores(frame: np.ndarray, patch: np.ndarray) -> Optional[np.ndarray]:
+    if frame.shape[0] < patch.shape[0] or frame.shape[1] < patch.shape[1]:
+        return None
+    scores = cv2.matchTemplate(frame, patch, cv2.TM_CCOEFF_NORMED)
+    return np.nan_to_num(scores, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+class TemplateMinimizer:
+    """Tìm (tham lam) vùng con nhỏ của một template vẫn khớp duy nhất trên tập frame."""
+
+    def __init__(self, template: np.ndarray, frames: List[Tuple[str, np.ndarray]], threshold: float = 0.8,
+                 margin: float = 0.1, min_side: int = 24, tolerance: int = 2, workers: Optional[int] = None):
+        """
+        Khởi tạo TemplateMinimizer.
+
+        Args:
+            template: Template gốc (BGR)
+            frames: List (tên, frame BGR) - nên có mọi màn hình runner sẽ gặp
+            threshold: Threshold của runner
+            margin: Biên an toàn yêu cầu quanh threshold
+            min_side: Cạnh nhỏ nhất của vùng con (pixel); dưới 24 thì match_pyramid chạy như direct
+            tolerance: Sai lệch vị trí cho phép so với vị trí của template gốc (pixel)
+            workers: Số thread kiểm tra frame song song (None = số CPU; OpenCV nhả GIL khi matching)
+        """
+        self.template = template
+        self.threshold = threshold
+        self.margin = margin
+        self.min_side = min_side
+        self.tolerance = tolerance
+        self.evaluations = 0
+        # Vị trí của template gốc trong các frame "có"
+        self.positives: List[Tuple[str, np.ndarray, Tuple[int, int]]] = []
+        self.negatives: List[Tuple[str, np.ndarray]] = []
+        for name, frame in frames:
+            scores = _scores(frame, template)
+            if scores is None:
+                continue
+            _, max_val, _, max_loc = cv2.minMaxLoc(scores)
+            if max_val >= threshold:
+                self.positives.append((name, frame, max_loc))
+            else:
+                self.negatives.append((name, frame))
+        self._order: Dict[str, int] = {}  # Frame hay làm hỏng ứng viên được thử trước
+        self._cache: Dict[Tuple[int, int, int, int], Tuple[bool, float, Optional[str]]] = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+
+    def close(self):
+        """Dừng các thread kiểm tra."""
+        self._pool.shutdown()
+
+    def _frame_margin(self, patch: np.ndarray, crop: Tuple[int, int, int, int], frame: np.ndarray,
+                      loc: Optional[Tuple[int, int]]) -> float:
+        """Biên của vùng con trên một frame (loc = vị trí template gốc nếu là frame "có")."""
+        x, y, w, h = crop
+        scores = _scores(frame, patch)
+        if scores is None:
+            return 1.0
+        margin = 1.0
+        if loc is not None:
+            ex, ey = loc[0] + x, loc[1] + y
+            t = self.tolerance
+            window = scores[max(0, ey - t):ey + t + 1, max(0, ex - t):ex + t + 1]
+            hit = float(window.max()) if window.size else 0.0
+            # Vị trí khác: che vùng quanh vị trí đúng (các vị trí chồng lên nó)
+            scores[max(0, ey - h + 1):ey + h, max(0, ex - w + 1):ex + w] = -1.0
+            margin = hit - self.threshold
+        return min(margin, self.threshold - float(scores.max()))
+
+    def check(self, crop: Tuple[int, int, int, int]) -> Tuple[bool, float, Optional[str]]:
+        """
+        Kiểm tra một vùng con (x, y, w, h) của template.
+
+        Returns:
+            (hợp lệ, biên nhỏ nhất, frame làm hỏng đầu tiên). Biên là khoảng cách nhỏ nhất tới
+            threshold (score đúng vị trí - threshold, hoặc threshold - score sai vị trí).
+        """
+        if crop in self._cache:
+            return self._cache[crop]
+        x, y, w, h = crop
+        patch = np.ascontiguousarray(self.template[y:y + h, x:x + w])
+        self.evaluations += 1
+        jobs = [(name, frame, loc) for name, frame, loc in self.positives] + \
+               [(name, frame, None) for name, frame in self.negatives]
+        jobs.sort(key=lambda job: -self._order.get(job[0], 0))
+        # Frame hay làm hỏng nhất kiểm tra trước (ứng viên hỏng thì dừng sớm), còn lại song song
+        margins = [self._frame_margin(patch, crop, jobs[0][1], jobs[0][2])]
+        if margins[0] >= self.margin:
+            margins += self._pool.map(lambda job: self._frame_margin(patch, crop, job[1], job[2]), jobs[1:])
+        worst = min(margins)
+        failed = next((job[0] for job, margin in zip(jobs, margins) if margin < self.margin), None)
+        if failed is not None:
+            self._order[failed] = self._order.get(failed, 0) + 1
+        result = (failed is None, worst, failed)
+        self._cache[crop] = result
+        return result
+
+    @staticmethod
+    def _trim(crop: Tuple[int, int, int, int], side: str, amount: int) -> Tuple[int, int, int, int]:
+        x, y, w, h = crop
+        if side == 'left':
+            return x + amount, y, w - amount, h
+        if side == 'right':
+            return x, y, w - amount, h
+        if side == 'top':
+            return x, y + amount, w, h - amount
+        return x, y, w, h - amount
+
+    def minimize(self) -> Dict:
+        """
+        Thu nhỏ từ template gốc: lần lượt từng cạnh, tìm nhị phân độ dài cắt lớn nhất còn hợp lệ;
+        lặp lại các vòng cho đến khi không cạnh nào cắt thêm được. Tìm nhị phân giả định tính hợp lệ
+        đơn điệu theo độ dài cắt nên đây là tìm tham lam: kết quả không chắc là vùng con nhỏ nhất.
+
+        Returns:
+            dict: crop (x, y, w, h), margin, area_ratio, click_offset, evaluations, ok, failed_frame
+            (ok = False nếu không có frame "có" hoặc chính template gốc đã không đạt biên an toàn).
+        """
+        height, width = self.template.shape[:2]
+        crop = (0, 0, width, height)
+        ok, margin, failed = self.check(crop) if self.positives else (False, 0.0, None)
+        if not ok:
+            return {'crop': crop, 'margin': margin, 'area_ratio': 1.0, 'click_offset': (0, 0),
+                    'evaluations': self.evaluations, 'ok': False, 'failed_frame': failed}
+
+        improved = True
+        while improved:
+            improved = False
+            for side in ('left', 'right', 'top', 'bottom'):
+                size = crop[2] if side in ('left', 'right') else crop[3]
+                low, high = 0, size - self.min_side
+                while low < high:
+                    mid = (low + high + 1) // 2
+                    if self.check(self._trim(crop, side, mid))[0]:
+                        low = mid
+                    else:
+                        high = mid - 1
+                if low > 0:
+                    crop = self._trim(crop, side, low)
+                    improved = True
+        margin = self.check(crop)[1]
+
+        x, y, w, h = crop
+        # Giữ điểm click cũ: tâm template gốc tính từ tâm vùng con
+        click_offset = (width // 2 - (x + w // 2), height // 2 - (y + h // 2))
+        return {'crop': crop, 'margin': margin, 'area_ratio': (w * h) / float(width * height),
+                'click_offset': click_offset, 'evaluations': self.evaluations, 'ok': True, 'failed_frame': None}
+
+
+def minimize_template(template_path: str, frame_paths: List[str], output_dir: str = OUTPUT_DIR,
+                      threshold: float = 0.8, margin: float = 0.1, min_side: int = 24) -> Optional[Dict]:
+    """
+    Thu nhỏ một template và ghi template mới + file JSON (click_offset) vào output_dir.
+
+    Returns:
+        Kết quả của TemplateMinimizer.minimize (thêm output, positives, negatives, seconds),
+        None nếu không đọc được template/frame.
+    """
+    template = cv2.imread(template_path, cv2.IMREAD_COLOR)
+    if template is None:
+        print(f"✗ Không đọc được template: {template_path}")
+        return None
+    frames = load_frames(frame_paths)
+    if not frames:
+        print("✗ Không có frame nào để kiểm tra")
+        return None
+
+    start = time.perf_counter()
+    minimizer = TemplateMinimizer(template, frames, threshold=threshold, margin=margin, min_side=min_side)
+    try:
+        result = minimizer.minimize()
+    finally:
+        minimizer.close()
+    result.update(positives=len(minimizer.positives), negatives=len(minimizer.negatives),
+                  seconds=time.perf_counter() - start, output=None)
+    if not result['ok']:
+        return result
+
+    x, y, w, h = result['crop']
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, os.path.basename(template_path))
+    cv2.imwrite(output_path, template[y:y + h, x:x + w])
+    with open(sidecar_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump({'click_offset': list(result['click_offset']), 'source': template_path,
+                   'crop': [x, y, w, h], 'threshold': threshold, 'margin': round(result['margin'], 4),
+                   'frames': len(frames)}, f, ensure_ascii=False, indent=2)
+    result['output'] = output_path
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thu nhỏ template về vùng con nhỏ vẫn khớp duy nhất")
+    parser.add_argument('templates', nargs='+', help="Template cần thu nhỏ")
+    parser.add_argument('--frames', nargs='+', required=True, help="Frame hoặc thư mục frame của các màn hình")
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--margin', type=float, default=0.1, help="Biên an toàn quanh threshold")
+    parser.add_argument('--min-side', type=int, default=24,
+                        help="Cạnh nhỏ nhất của template mới (pixel); dưới 24 thì pyramid chạy như direct")
+    parser.add_argument('--out', default=OUTPUT_DIR, help="Thư mục ghi template mới")
+    args = parser.parse_args()
+
+    for template_path in args.templates:
+        print(f"\n→ {template_path}")
+        result = minimize_template(template_path, args.frames, output_dir=args.out, threshold=args.threshold,
+                                   margin=args.margin, min_side=args.min_side)
+        if result is None:
+            continue
+        if not result['positives']:
+            print(f"✗ Không frame nào chứa template (score >= {args.threshold}), cần chụp thêm màn hình của step này")
+            continue
+        if not result['ok']:
+            print(f"✗ Template gốc chưa đạt biên an toàn {args.margin} (biên {result['margin']:+.3f} "
+                  f"ở {result['failed_frame']}), không thu nhỏ")
+            continue
+        x, y, w, h = result['crop']
+        print(f"✓ Vùng ({x}, {y}, {w}x{h}), còn {result['area_ratio']:.0%} diện tích, biên {result['margin']:.3f}")
+        print(f"  click_offset: {tuple(result['click_offset'])}, {result['positives']} frame có / "
+              f"{result['negatives']} frame không, {result['evaluations']} lần thử, {result['seconds']:.1f}s")
+        print(f"  Đã ghi: {result['output']} (+ {os.path.basename(sidecar_path(result['output']))})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import csv
+import os
+import time
+
+import pytest
+
+import account_scheduler
+from account_scheduler import TIME_FORMAT, AccountScheduler
+
+
+def _write_accounts(path, rows, fieldnames=('id', 'state', 'user', 'pass')):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(fieldnames))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _read_accounts(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def _stamp(offset):
+    return time.strftime(TIME_FORMAT, time.localtime(time.time() + offset))
+
+
+@pytest.fixture
+def account_file(tmp_path):
+    path = str(tmp_path / "account.csv")
+    _write_accounts(path, [{'id': '1', 'state': '', 'user': 'a', 'pass': 'x'},
+                           {'id': '2', 'state': '', 'user': 'b', 'pass': 'y'}])
+    return path
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(account_scheduler.random, 'uniform', lambda low, high: 1.0)
+
+
+def test_failed_becomes_retry_until_max_attempts(account_file, no_jitter):
+    scheduler = AccountScheduler(account_file, max_attempts=3)
+    assert scheduler.load()
+    states = []
+    for _ in range(3):
+        state = scheduler.outcome_state(1, 'failed')
+        scheduler.record(1, state)
+        states.append(state)
+    assert states == ['retry', 'retry', 'failed']
+    assert scheduler.attempts(scheduler.get(1)) == 3
+    assert not scheduler.is_pending(scheduler.get(1))
+    assert scheduler.get(1)['next_try'] == ''
+
+
+def test_unlimited_attempts_always_retry(account_file, no_jitter):
+    scheduler = AccountScheduler(account_file, max_attempts=0, max_backoff=1.0)
+    scheduler.load()
+    for _ in range(10):
+        scheduler.record(1, scheduler.outcome_state(1, 'failed'))
+    assert scheduler.get(1)['state'] == 'retry'
+
+
+def test_terminal_outcome_is_kept(account_file):
+    scheduler = AccountScheduler(account_file, max_attempts=1)
+    scheduler.load()
+    assert scheduler.outcome_state(1, 'done') == 'done'
+    assert scheduler.outcome_state(1, 'bad_password') == 'bad_password'
+
+
+def test_backoff_doubles_and_is_capped(account_file, no_jitter):
+    scheduler = AccountScheduler(account_file, max_attempts=0, retry_backoff=100.0, max_backoff=350.0)
+    scheduler.load()
+    waits = []
+    for _ in range(4):
+        scheduler.record(1, 'retry')
+        waits.append(scheduler._next_try(scheduler.get(1)) - time.time())
+    for wait, expected in zip(waits, (100.0, 200.0, 350.0, 350.0)):
+        assert expected - 2.0 <= wait <= expected + 1.0
+
+
+def test_next_account_skips_backoff_and_orders_by_attempts(account_file):
+    _write_accounts(account_file, [
+        {'id': '1', 'state': 'retry', 'attempts': '1', 'next_try': _stamp(-60)},
+        {'id': '2', 'state': 'retry', 'attempts': '1', 'next_try': _stamp(3600)},
+        {'id': '3', 'state': '', 'attempts': ''},
+        {'id': '4', 'state': 'done', 'attempts': '1'},
+    ], fieldnames=('id', 'state', 'attempts', 'next_try'))
+    scheduler = AccountScheduler(account_file)
+    assert scheduler.next_account()['id'] == '3'
+    assert scheduler.next_account(skip=lambda account_id: account_id == '3')['id'] == '1'
+    assert scheduler.next_account(skip=lambda account_id: account_id in ('1', '3')) is None
+    wait = scheduler.seconds_until_next(skip=lambda account_id: account_id in ('1', '3'))
+    assert 3500.0 < wait <= 3600.0
+
+
+def test_priority_wins_over_attempts(account_file):
+    _write_accounts(account_file, [
+        {'id': '1', 'state': '', 'attempts': '0', 'priority': ''},
+        {'id': '2', 'state': 'retry', 'attempts': '2', 'priority': '5'},
+    ], fieldnames=('id', 'state', 'attempts', 'priority'))
+    assert AccountScheduler(account_file).next_account()['id'] == '2'
+
+
+def test_save_adds_columns_and_keeps_other_fields(account_file, no_jitter):
+    scheduler = AccountScheduler(account_file)
+    scheduler.load()
+    scheduler.record(2, 'retry')
+    rows = _read_accounts(account_file)
+    assert list(rows[0]) == ['id', 'state', 'user', 'pass', 'attempts', 'next_try']
+    assert rows[1]['state'] == 'retry' and rows[1]['attempts'] == '1' and rows[1]['pass'] == 'y'
+    assert rows[0]['attempts'] == '' and rows[0]['user'] == 'a'
+    assert not os.path.exists(account_file + '.tmp')
+
+
+def test_failed_save_leaves_original_file(account_file, monkeypatch):
+    with open(account_file, 'rb') as f:
+        original = f.read()
+    scheduler = AccountScheduler(account_file)
+    scheduler.load()
+
+    def crash(self, rows):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(csv.DictWriter, 'writerows', crash)
+    with pytest.raises(OSError):
+        scheduler.record(1, 'done')
+    with open(account_file, 'rb') as f:
+        assert f.read() == original
+
+
+def test_missing_account_is_reported(account_file):
+    scheduler = AccountScheduler(account_file)
+    scheduler.load()
+    assert not scheduler.record(99, 'done')
+    assert not scheduler.set_state(99, 'done')
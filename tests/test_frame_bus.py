@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason="resource_tracker chỉ có trên POSIX")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(code):
+    return subprocess.run([sys.executable, '-c', textwrap.dedent(code)], cwd=ROOT,
+                          capture_output=True, text=True, timeout=30)
+
+
+def test_consumer_in_producer_process_leaves_tracker_clean():
+    result = _run(f"""
+        import numpy as np
+        from frame_bus import FrameBusProducer, FrameBusConsumer
+        producer = FrameBusProducer(name="wwm_test_{os.getpid()}", fps=0,
+                                    capture=lambda: np.zeros((20, 30, 3), np.uint8))
+        consumer = FrameBusConsumer(producer.name)
+        consumer.close()
+        producer.close()
+    """)
+    assert result.returncode == 0, result.stderr
+    assert 'KeyError' not in result.stderr
+    assert 'leaked' not in result.stderr
+
+
+def test_stale_segment_is_replaced_cleanly():
+    result = _run(f"""
+        import numpy as np
+        from multiprocessing import shared_memory
+        from frame_bus import FrameBusProducer
+        name = "wwm_test_stale_{os.getpid()}"
+        stale = shared_memory.SharedMemory(name=name, create=True, size=4096)
+        producer = FrameBusProducer(name=name, fps=0, capture=lambda: np.zeros((20, 30, 3), np.uint8))
+        producer.close()
+        stale.close()
+    """)
+    assert result.returncode == 0, result.stderr
+    assert 'KeyError' not in result.stderr
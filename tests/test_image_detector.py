@@ -0,0 +1,14 @@
+import pytest
+
+from image_detector import ImageDetector
+
+
+def test_invalid_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        ImageDetector(strategy='Direct')
+
+
+def test_set_strategy_keeps_previous_on_invalid_name():
+    detector = ImageDetector(strategy='grayscale')
+    detector.set_strategy('Direct')
+    assert detector.strategy == 'grayscale'
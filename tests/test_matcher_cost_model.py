@@ -0,0 +1,54 @@
+import pytest
+
+import matcher_cost_model
+from matcher_cost_model import MatcherCostModel, _features
+
+
+def _fake_cost(name, fw, fh, tw, th):
+    """Chi phí giả (ms) theo kích thước, đúng dạng tuyến tính của mô hình."""
+    weight = {'direct': 1.0, 'grayscale': 0.4, 'pyramid': 0.2, 'fft': 0.6}[name]
+    return 0.1 + weight * _features(fw, fh, tw, th)[3] * 1e-6
+
+
+@pytest.fixture
+def model(tmp_path, monkeypatch):
+    model = MatcherCostModel(str(tmp_path / "cost.json"))
+
+    def time_strategy(self, name, frame, template):
+        fh, fw = frame.shape[:2]
+        return _fake_cost(name, fw, fh, template.w, template.h)
+
+    monkeypatch.setattr(MatcherCostModel, '_time_strategy', time_strategy)
+    model.load_or_calibrate()
+    return model
+
+
+def test_revalidate_skipped_without_drift_or_interval(model):
+    version = model.version
+    assert model.maybe_revalidate() is False
+    assert model.version == version
+
+
+def test_live_drift_outside_grid_adds_calibration_point(model, tmp_path):
+    size = (1920, 1080, 120, 48)
+    for _ in range(matcher_cost_model.MIN_DRIFT_SAMPLES):
+        model.observe('direct', *size, elapsed_ms=model.predict('direct', *size) * 5.0)
+    assert model.drifted() == ['direct']
+
+    assert model.maybe_revalidate() is True
+    assert model.extra_points == [size]
+    assert model.drifted() == []
+    model.save_if_dirty()
+
+    reloaded = MatcherCostModel(str(tmp_path / "cost.json"))
+    assert reloaded.load()
+    assert reloaded.extra_points == [size]
+
+
+def test_drift_on_grid_point_does_not_grow_grid(model):
+    size = (800, 600, 120, 48)
+    for _ in range(matcher_cost_model.MIN_DRIFT_SAMPLES):
+        model.observe('fft', *size, elapsed_ms=model.predict('fft', *size) * 5.0)
+    assert model.maybe_revalidate() is False
+    assert model.extra_points == []
+    assert model.drifted() == []
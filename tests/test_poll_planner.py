@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from poll_planner import PollPlanner, _quantile
+
+
+def _planner(samples=(), step=3, **kwargs):
+    planner = PollPlanner(None, **kwargs)
+    for value in samples:
+        planner.record(step, value)
+    return planner
+
+
+def test_quantile_interpolates():
+    assert _quantile([4.0], 0.95) == 4.0
+    assert _quantile([0.0, 10.0], 0.5) == 5.0
+    assert _quantile([0.0, 10.0], 0.05) == pytest.approx(0.5)
+    assert _quantile([1.0, 2.0, 3.0, 4.0, 5.0], 0.0) == 1.0
+    assert _quantile([1.0, 2.0, 3.0, 4.0, 5.0], 1.0) == 5.0
+
+
+def test_fallback_until_min_samples():
+    planner = _planner([1.0] * 4, min_samples=5)
+    assert planner.expected(3) is None
+    assert planner.next_delay(3, 0.0, fallback=2.0) == 2.0
+    assert planner.first_delay(3, 0.0) == 0.0
+    planner.record(3, 1.0)
+    assert planner.next_delay(3, 0.0, fallback=2.0) != 2.0
+
+
+def test_next_delay_boundaries():
+    # p05 = p95 = 1.0 -> khoảng dày [0.75, 1.30], khoảng poll dày = min_interval
+    planner = _planner([1.0] * 5)
+    start, end, interval = planner._plan(3)
+    assert start == pytest.approx(0.75)
+    assert end == pytest.approx(1.30)
+    assert interval == pytest.approx(0.05)
+
+    assert planner.first_delay(3, 0.0) == pytest.approx(0.75)
+    assert planner.next_delay(3, 0.0, fallback=2.0) == pytest.approx(0.75)
+    # Sát đầu khoảng dày: không ngủ ít hơn khoảng poll dày
+    assert planner.next_delay(3, 0.74, fallback=2.0) == pytest.approx(0.05)
+    assert planner.next_delay(3, start, fallback=2.0) == pytest.approx(interval)
+    assert planner.next_delay(3, end, fallback=2.0) == pytest.approx(interval)
+    # Vừa quá hạn: vẫn poll dày, rồi thưa dần theo độ trễ đến max_interval
+    assert planner.next_delay(3, end + 0.01, fallback=2.0) == pytest.approx(interval)
+    assert planner.next_delay(3, end + 3.0, fallback=2.0) == pytest.approx(1.5)
+    assert planner.next_delay(3, end + 100.0, fallback=2.0) == pytest.approx(2.0)
+
+
+def test_dense_interval_is_capped():
+    planner = _planner([0.0] * 5 + [100.0] * 5, max_interval=2.0)
+    start, end, interval = planner._plan(3)
+    assert interval == pytest.approx(0.5)
+    assert planner.next_delay(3, (start + end) / 2, fallback=2.0) == pytest.approx(0.5)
+
+
+def test_record_invalidates_plan_and_clamps_negative():
+    planner = _planner([1.0] * 5)
+    assert planner._plan(3)[0] == pytest.approx(0.75)
+    for _ in range(20):
+        planner.record(3, -1.0)
+    assert min(planner.samples[3]) == 0.0
+    assert planner._plan(3)[0] == pytest.approx(0.0)
+    assert planner.first_delay(3, 0.0) == 0.0
+
+
+def test_window_keeps_latest_samples():
+    planner = _planner([5.0] * 10 + [1.0] * 5, window=5)
+    assert list(planner.samples[3]) == [1.0] * 5
+    assert planner.expected(3)['p95'] == 1.0
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "data" / "step_timing.json")
+    planner = PollPlanner(path)
+    planner.save()
+    assert not (tmp_path / "data").exists()
+    for value in (0.5, 0.6, 0.7, 0.8, 0.9):
+        planner.record(9, value)
+    planner.save()
+    assert json.loads(open(path, encoding='utf-8').read()) == {'steps': {'9': [0.5, 0.6, 0.7, 0.8, 0.9]}}
+    assert PollPlanner(path).expected(9) == planner.expected(9)
+
+
+def test_corrupt_file_starts_empty(tmp_path):
+    path = tmp_path / "step_timing.json"
+    path.write_text("{not json", encoding='utf-8')
+    planner = PollPlanner(str(path))
+    assert planner.samples == {}
+    assert planner.next_delay(1, 0.0, fallback=1.5) == 1.5
@@ -0,0 +1,163 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+psutil = pytest.importorskip("psutil")
+
+from process_utils import ProcessWatcher, terminate_processes
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason="process giả dùng symlink tới python")
+
+SLEEP = "import time; time.sleep(30)"
+# Cha mở một process con cùng image rồi in PID của con
+PARENT = ("import subprocess, sys, time; "
+          "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); "
+          "print(child.pid, flush=True); time.sleep(30)")
+# Bỏ qua SIGTERM: chỉ SIGKILL dừng được
+STUBBORN = ("import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+            "print('ready', flush=True); time.sleep(30)")
+
+
+@pytest.fixture
+def dummy(tmp_path):
+    """Chạy process giả có tên image riêng (symlink tới python) và dọn sạch sau test."""
+    exe = tmp_path / "wwm_dummy"
+    os.symlink(sys.executable, exe)
+    children = []
+
+    def spawn(code=SLEEP, name=None):
+        path = exe if name is None else tmp_path / name
+        if not path.exists():
+            os.symlink(sys.executable, path)
+        proc = subprocess.Popen([str(path), '-c', code], stdout=subprocess.PIPE, text=True)
+        children.append(proc)
+        return proc
+
+    spawn.name = exe.name
+    yield spawn
+    for proc in children:
+        try:
+            for child in psutil.Process(proc.pid).children(recursive=True):
+                child.kill()
+        except psutil.Error:
+            pass
+        proc.kill()
+        proc.wait()
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_wait_for_spawn_skips_excluded(dummy):
+    watcher = ProcessWatcher(dummy.name, poll_interval=0.02, scan_interval=0.05)
+    first = dummy()
+    assert watcher.wait_for_spawn(timeout=0.5, exclude={first.pid}) is None
+    second = dummy()
+    assert watcher.wait_for_spawn(timeout=5.0, exclude={first.pid}) == second.pid
+    assert watcher.pids == {first.pid, second.pid}
+
+
+def test_wait_for_exit_timeout_and_success(dummy):
+    watcher = ProcessWatcher(dummy.name, poll_interval=0.02, scan_interval=0.05)
+    proc = dummy()
+    watcher.track(proc.pid)
+    start = time.monotonic()
+    assert watcher.wait_for_exit(proc.pid, timeout=0.2) is False
+    assert time.monotonic() - start < 1.0
+    proc.terminate()
+    assert watcher.wait_for_exit(proc.pid, timeout=5.0) is True
+    assert proc.pid not in watcher.pids
+
+
+def test_wait_for_exit_all_tracked(dummy):
+    watcher = ProcessWatcher(dummy.name, poll_interval=0.02, scan_interval=0.05)
+    procs = [dummy(), dummy()]
+
+    def tracked_both():
+        watcher.refresh(full_scan=True)
+        return len(watcher.pids) == 2
+
+    assert _wait_until(tracked_both)
+    assert watcher.wait_for_exit(timeout=0.2) is False
+    for proc in procs:
+        proc.kill()
+        proc.wait()
+    assert watcher.wait_for_exit(timeout=5.0) is True
+
+
+def test_spawn_and_exit_callbacks_fire(dummy):
+    watcher = ProcessWatcher(dummy.name, poll_interval=0.02, scan_interval=0.05)
+    spawned, exited = [], []
+    watcher.on_spawn(spawned.append)
+    watcher.on_exit(exited.append)
+    watcher.start()
+    try:
+        proc = dummy()
+        assert _wait_until(lambda: proc.pid in spawned)
+        proc.kill()
+        proc.wait()
+        assert _wait_until(lambda: proc.pid in exited)
+    finally:
+        watcher.stop()
+    assert spawned.count(proc.pid) == 1 and exited.count(proc.pid) == 1
+
+
+def _gone(pid):
+    try:
+        return psutil.Process(pid).status() == psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return True
+
+
+def test_terminate_kills_parent_and_child_tree(dummy):
+    parent = dummy(PARENT)
+    child_pid = int(parent.stdout.readline())
+    report = terminate_processes(pid=parent.pid, grace_timeout=3.0)
+    assert set(report['found']) == {parent.pid, child_pid}
+    assert set(report['terminated']) == {parent.pid, child_pid}
+    assert report['killed'] == [] and report['alive'] == []
+    assert _wait_until(lambda: _gone(child_pid))
+
+
+def test_terminate_escalates_to_kill(dummy):
+    proc = dummy(STUBBORN)
+    assert proc.stdout.readline().strip() == 'ready'
+    report = terminate_processes(pid=proc.pid, grace_timeout=0.3, kill_timeout=3.0)
+    assert report['terminated'] == []
+    assert report['killed'] == [proc.pid]
+    assert report['alive'] == []
+    # Bị kill sau khi hết thời gian chờ terminate, không chờ hết kill_timeout
+    assert 0.3 <= report['exit_times'][proc.pid] < 0.3 + 1.0
+
+
+def test_exit_time_bounded_by_deadline(dummy):
+    procs = [dummy(), dummy(STUBBORN)]
+    assert procs[1].stdout.readline().strip() == 'ready'
+    grace, kill = 0.5, 2.0
+    start = time.monotonic()
+    report = terminate_processes(name=dummy.name, grace_timeout=grace, kill_timeout=kill)
+    elapsed = time.monotonic() - start
+    assert sorted(report['found']) == sorted(proc.pid for proc in procs)
+    assert report['alive'] == []
+    # Process nghe SIGTERM thoát trong thời gian chờ terminate (sai số bằng chu kỳ kiểm tra của wait_procs)
+    assert report['exit_times'][procs[0].pid] <= grace + 0.1
+    assert report['killed'] == [procs[1].pid]
+    assert all(t <= grace + kill for t in report['exit_times'].values())
+    assert report['elapsed'] <= elapsed < grace + kill
+
+
+def test_terminate_by_name_is_exact(dummy):
+    target = dummy()
+    other = dummy(name="wwm_dummy_launcher")
+    report = terminate_processes(name=dummy.name + ".exe", grace_timeout=3.0)
+    assert report['found'] == [target.pid]
+    assert other.poll() is None
@@ -0,0 +1,115 @@
+import os
+
+from progress_journal import ProgressJournal
+
+
+def _journal(tmp_path, **kwargs):
+    return ProgressJournal(str(tmp_path / "progress.jsonl"), fsync=False, **kwargs)
+
+
+def test_crash_mid_account_is_in_flight_after_restart(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record('start', 1, attempt=1)
+    journal.record('finish', 1, state='done')
+    journal.record('start', 2, attempt=1)
+    journal.record('step', 2, step=1)
+    journal.record('step', 2, step=2)
+    journal.close()
+    # Crash trong lúc đang ghi sự kiện step 3: dòng cuối bị cắt, không có '\n'
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"ts": 1.0, "event": "step", "account": "2", "st')
+
+    restarted = _journal(tmp_path)
+    assert restarted.in_flight() == ['2']
+    assert restarted.last_step(2) == 2
+    assert restarted.is_finished(1)
+    assert not restarted.is_finished(2)
+
+
+def test_event_after_torn_line_is_not_lost(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record('start', 7, attempt=1)
+    journal.close()
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"ts": 1.0, "event": "ste')
+
+    restarted = _journal(tmp_path)
+    restarted.record('step', 7, step=4)
+    restarted.close()
+    assert _journal(tmp_path).last_step(7) == 4
+
+
+def test_reconcile_resume_keeps_account_in_flight(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record('start', 3, attempt=2)
+    journal.record('step', 3, step=5)
+    journal.close()
+
+    restarted = _journal(tmp_path)
+    assert restarted.reconcile('resume') == [{'account': '3', 'last_step': 5, 'attempts': 2}]
+    restarted.close()
+    assert _journal(tmp_path).in_flight() == ['3']
+
+
+def test_reconcile_retry_marks_interrupted_durably(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record('start', 3, attempt=1)
+    journal.record('step', 3, step=5)
+    journal.close()
+
+    restarted = _journal(tmp_path)
+    pending = restarted.reconcile('retry')
+    restarted.close()
+    assert [item['account'] for item in pending] == ['3']
+    reloaded = _journal(tmp_path)
+    assert reloaded.in_flight() == []
+    assert reloaded.accounts['3']['status'] == 'interrupted'
+    assert not reloaded.is_finished(3)
+
+
+def test_resume_from_step_sets_last_step(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record('start', 4, attempt=2, from_step=6)
+    assert journal.last_step(4) == 5
+    journal.record('start', 4, attempt=3, from_step=1)
+    assert journal.last_step(4) is None
+
+
+def test_retryable_finish_state_is_not_finished(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record('start', 5, attempt=1)
+    journal.record('finish', 5, state='failed')
+    journal.record('start', 6, attempt=1)
+    journal.record('finish', 6, state='banned')
+    assert not journal.is_finished(5)
+    assert journal.is_finished(6)
+
+
+def test_compact_preserves_state(tmp_path):
+    journal = _journal(tmp_path)
+    for attempt in (1, 2):
+        journal.record('start', 1, attempt=attempt)
+        journal.record('step', 1, step=3)
+    journal.record('finish', 1, state='done')
+    journal.record('start', 2, attempt=1)
+    journal.record('step', 2, step=8)
+    journal.record('start', 3, attempt=1)
+    journal.record('interrupted', 3, last_step=None)
+    before = {account_id: dict(info) for account_id, info in journal.accounts.items()}
+    size = os.path.getsize(journal.path)
+
+    journal.compact()
+    assert not os.path.exists(journal.path + '.tmp')
+    assert os.path.getsize(journal.path) < size
+    compacted = _journal(tmp_path)
+    assert compacted.accounts == before
+    assert compacted.in_flight() == ['2']
+
+
+def test_compact_then_record_appends(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record('start', 1, attempt=1)
+    journal.compact()
+    journal.record('step', 1, step=2)
+    journal.close()
+    assert _journal(tmp_path).last_step(1) == 2
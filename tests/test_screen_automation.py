@@ -0,0 +1,33 @@
+import threading
+import time
+
+from image_detector import ImageDetector
+from input_backends import FakeInputBackend
+from input_dispatcher import InputDispatcher
+from screen_automation import ScreenAutomation
+
+
+class FocusKeyboardBackend(FakeInputBackend):
+    """Backend giả mà bàn phím cần focus (như PostMessage background: chỉ click không cần focus)."""
+
+    focus_free_ops = ('click',)
+
+
+def test_press_key_releases_focus_between_presses():
+    dispatcher = InputDispatcher(focus=lambda window: True)
+    backend = FocusKeyboardBackend()
+    automation = ScreenAutomation(detector=ImageDetector(), dispatcher=dispatcher, input_backend=backend)
+    try:
+        presser = threading.Thread(target=automation.press_key, args=('r',),
+                                   kwargs={'times': 3, 'interval': 0.3, 'window_title': 'A'})
+        presser.start()
+        time.sleep(0.1)
+        # Thao tác cần focus của client khác không phải chờ hết chuỗi nhấn phím (~0.6s)
+        start = time.monotonic()
+        dispatcher.submit('B', backend.press, 'x', needs_focus=True).result(timeout=5.0)
+        waited = time.monotonic() - start
+        presser.join()
+    finally:
+        dispatcher.shutdown()
+    assert waited < 0.2
+    assert [event['key'] for event in backend.events] == ['r', 'x', 'r', 'r']
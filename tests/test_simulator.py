@@ -0,0 +1,11 @@
+import sys
+
+from simulator import simulate
+
+
+def test_simulate_runs_all_accounts_headless():
+    result = simulate(accounts=3, seed=1)
+    assert result['done'] == 3
+    assert result['failed'] == 0
+    # Game giả và FakeInputBackend không cần pyautogui (import cần display)
+    assert 'pyautogui' not in sys.modules